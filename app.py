@@ -1,22 +1,34 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, Response
-import ollama
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, stream_with_context, session
 import subprocess
 import time
 import psutil
 import os
 import signal
+import sys
 import threading
+import json
 
 # Import our new modules
 from src.rag.vector_store import VectorStore
 from src.rag.ingestor import Ingestor
 from src.rag.watcher import FileWatcher
 from src.mcp.tools import ToolSet
+from src.rag.reranker import CrossEncoderReranker
+from src.rag.context_packer import ContextPacker
 from src.mcp.server import MCPServer
+from src.mcp.executor import ToolExecutor
+from src.mcp.router import IntentRouter, INVENTORY_MARKERS, CONTENT_MARKERS, is_followup
+from src.rag.answer_cache import AnswerCache, ALL_FILES
 from src.utils.status import StatusManager
+from src.utils.scheduler import ResourceScheduler
+from src.utils.uploads import UploadManager, UploadError
+from src.llm.stream import stream_chat, StreamMetrics
+from src.llm.model_manager import ModelManager
+from src.llm.session import ConversationStore
+from src.llm.history import HistoryManager, SOURCE_PATTERN
 
 app = Flask(__name__)
-chat_hist = []
+app.secret_key = os.getenv("FLASK_SECRET_KEY") or os.urandom(24)
 
 import requests
 
@@ -26,12 +38,65 @@ ingestor = None
 file_watcher = None
 tool_set = None
 mcp_server = None
+tool_executor = None
+intent_router = None
+answer_cache = None
+upload_manager = None
 ollama_process = None
 status_manager = None
 INTERNET_AVAILABLE = False
 
 MODEL_NAME = "llama3.1:8b-instruct-q4_K_M"
 
+# Per-session chat histories and a cap on concurrent ollama.chat calls
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "2"))
+conversations = ConversationStore()
+llm_slots = threading.BoundedSemaphore(MAX_CONCURRENT_LLM_CALLS)
+
+# Token budget for the messages sent to Ollama (system prompt + compacted history)
+CONTEXT_TOKEN_LIMIT = int(os.getenv("CONTEXT_TOKEN_LIMIT", "8192"))
+history_manager = HistoryManager(context_limit=CONTEXT_TOKEN_LIMIT)
+
+# Chat turns are interactive work, ingestion (parsing, embedding) yields to them
+resource_scheduler = ResourceScheduler(max_wait=float(os.getenv("INGEST_MAX_YIELD", "30")))
+
+# Keeps MODEL_NAME loaded: num_ctx pinned to the same budget, kept in memory for MODEL_KEEP_ALIVE
+MODEL_KEEP_ALIVE = os.getenv("MODEL_KEEP_ALIVE", "30m")
+OLLAMA_READY_TIMEOUT = float(os.getenv("OLLAMA_READY_TIMEOUT", "30"))
+model_manager = ModelManager(MODEL_NAME, num_ctx=CONTEXT_TOKEN_LIMIT, keep_alive=MODEL_KEEP_ALIVE)
+
+# Cross-encoder rerank of search_notes hits, falls back to retrieval order past the budget
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "1") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BUDGET_MS = int(os.getenv("RERANK_BUDGET_MS", "300"))
+
+# Token budget for the notes search_notes hands to the model per call
+TOOL_CONTEXT_TOKENS = int(os.getenv("TOOL_CONTEXT_TOKENS", "1500"))
+
+# Obvious list_notes / search_notes intents are routed locally, without the planning LLM call
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") == "1"
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", "0.55"))
+
+# Answers to repeated questions against unchanged notes come from a semantic cache
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_MAX_AGE = int(os.getenv("ANSWER_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Uploads are streamed to data/uploads in parts of UPLOAD_PART_MB, files over UPLOAD_MAX_MB are refused
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "512"))
+UPLOAD_PART_MB = int(os.getenv("UPLOAD_PART_MB", "8"))
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_MB * 1024 * 1024
+
+# Tool calls of one turn run in parallel, each with its own timeout (seconds)
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "4"))
+TOOL_TIMEOUTS = {
+    "search_notes": 20,
+    "list_notes": 10,
+    "search_internet": 60,
+    "ingest_file": 300
+}
+
 def check_internet():
     try:
         requests.get("https://www.google.com", timeout=3)
@@ -40,12 +105,16 @@ def check_internet():
         return False
 
 def get_system_prompt():
-    internet_status = "ONLINE" if INTERNET_AVAILABLE else "OFFLINE"
-
-    prompt = f"""
+    """
+    The system prompt is static (no runtime state in it), so every conversation and every turn
+    starts with the same prefix and Ollama can reuse its evaluated KV cache.
+    Runtime state goes into the notices of get_status_notice / Conversation.add_notice.
+    """
+    prompt = """
 You are ChatRTX, a helpful AI assistant that answers questions using local knowledge from uploaded documents.
 
-SYSTEM STATUS: {internet_status}
+The current SYSTEM STATUS (internet ONLINE or OFFLINE) and other notices are given in
+system messages during the conversation. The latest one applies.
 
 ═══════════════════════════════════════════════════════════════════════════════
 AVAILABLE TOOLS
@@ -72,8 +141,9 @@ AVAILABLE TOOLS
    • "teach me X from my notes" → DO NOT use list_notes, use search_notes instead
    • "explain Y according to my notes" → DO NOT use list_notes, use search_notes instead
 
-🔧 TOOL 2: search_notes(query)
+🔧 TOOL 2: search_notes(query, filename?, page_start?, page_end?, chapter?)
    Parameter: query (string) - the topic/concept to search for
+   Optional: filename, page_start/page_end, chapter - only search that part of the notes
    Returns: Relevant text chunks from uploaded documents
    
    USE THIS TOOL WHEN:
@@ -86,6 +156,8 @@ AVAILABLE TOOLS
    Query construction:
    • For topic: search_notes("depreciation")
    • For chapter: search_notes("chapter 5") or search_notes("module 2")
+   • For a topic inside a chapter: search_notes("topic X", chapter="module 3")
+   • For one document: search_notes("BFS", filename="graphs.pdf")
    • For teaching: search_notes("impairment")
    
    Examples of CORRECT usage:
@@ -93,12 +165,12 @@ AVAILABLE TOOLS
    • "explain hashing" → search_notes("hashing")
    • "teach me impairment from my notes" → search_notes("impairment")
    • "summarize chapter 5" → search_notes("chapter 5")
+   • "explain hashing from module 3" → search_notes("hashing", chapter="module 3")
    • "what is depreciation according to my notes?" → search_notes("depreciation")
 """
 
-    if INTERNET_AVAILABLE:
-        prompt += """
-🔧 TOOL 3: search_internet(query)
+    prompt += """
+🔧 TOOL 3: search_internet(query) - ONLY when SYSTEM STATUS is ONLINE
    Parameter: query (string) - the topic to generate teaching notes for
    Returns: Comprehensive teaching content from external AI model
    
@@ -114,7 +186,7 @@ AVAILABLE TOOLS
    • User asks: "explain something not in my notes" → search_internet(topic)
 """
 
-    prompt += f"""
+    prompt += """
 
 ═══════════════════════════════════════════════════════════════════════════════
 DECISION LOGIC (Follow this EXACTLY)
@@ -128,7 +200,7 @@ Is the user asking WHICH files exist?
 
 STEP 2: Does the user want CONTENT/information about a topic?
 ├─ YES → Call search_notes("topic name")
-│   └─ If result is empty and internet is {internet_status}:
+│   └─ If result is empty and SYSTEM STATUS is ONLINE:
 │       └─ Call search_internet("topic name") for external help
 └─ NO → Answer directly without tools
 
@@ -175,8 +247,16 @@ DO NOT describe your process. Just answer the question using tool results.
         "content": prompt
     }
 
+def get_status_notice():
+    """
+    Runtime status for the dynamic tail of the prompt, only sent again when it changes.
+    """
+    if INTERNET_AVAILABLE:
+        return "SYSTEM STATUS: ONLINE (search_internet is available)"
+    return "SYSTEM STATUS: OFFLINE (search_internet is not available, answer from the notes only)"
+
 def init_system():
-    global vector_store, ingestor, file_watcher, tool_set, mcp_server, status_manager, INTERNET_AVAILABLE
+    global vector_store, ingestor, file_watcher, tool_set, mcp_server, tool_executor, intent_router, answer_cache, upload_manager, status_manager, INTERNET_AVAILABLE
     
     print("Checking internet connectivity...")
     INTERNET_AVAILABLE = check_internet()
@@ -188,7 +268,7 @@ def init_system():
     os.makedirs("notes", exist_ok=True)
     
     status_manager = StatusManager()
-    vector_store = VectorStore(persistence_path="data/chroma_db")
+    vector_store = VectorStore(persistence_path="data/chroma_db", scheduler=resource_scheduler)
     ingestor = Ingestor(status_manager=status_manager)
     
     # Start file watcher
@@ -196,10 +276,32 @@ def init_system():
     file_watcher.start()
     
     # Setup MCP
-    tool_set = ToolSet(vector_store, ingestor)
+    reranker = None
+    if RERANK_ENABLED:
+        reranker = CrossEncoderReranker(model_name=RERANK_MODEL, latency_budget_ms=RERANK_BUDGET_MS)
+    tool_set = ToolSet(vector_store, ingestor, reranker=reranker,
+                       context_packer=ContextPacker(token_budget=TOOL_CONTEXT_TOKENS))
     mcp_server = MCPServer(tool_set, internet_enabled=INTERNET_AVAILABLE)
+    tool_executor = ToolExecutor(mcp_server.call_tool, max_workers=TOOL_WORKERS, timeouts=TOOL_TIMEOUTS)
+    if ROUTER_ENABLED:
+        intent_router = IntentRouter(vector_store.embedder, threshold=ROUTER_THRESHOLD)
+    if ANSWER_CACHE_ENABLED:
+        answer_cache = AnswerCache(vector_store, db_path="data/index.db", threshold=ANSWER_CACHE_THRESHOLD,
+                                   max_entries=ANSWER_CACHE_SIZE, max_age=ANSWER_CACHE_MAX_AGE)
+    upload_manager = UploadManager(upload_dir="data/uploads", target_dir="notes",
+                                   max_size=UPLOAD_MAX_MB * 1024 * 1024, part_size=UPLOAD_PART_MB * 1024 * 1024,
+                                   is_indexed=indexed_copy)
     print("System initialized.")
 
+def indexed_copy(file_hash):
+    """
+    Filename of an indexed note with this content (still in notes/), None if there is none.
+    """
+    filename = vector_store.manifest.filename_for_hash(file_hash)
+    if filename and os.path.exists(os.path.join("notes", filename)):
+        return filename
+    return None
+
 def kill_llama():
     global ollama_process
     print("Attempting to kill Ollama...")
@@ -230,23 +332,20 @@ def index():
     if request.method == "POST":
         user_message = request.form.get("main", "").strip()
         if user_message:
-            process_message(user_message)
+            process_message(user_message, get_conversation())
         return redirect(url_for('index'))
 
-    return render_template("index.html", chat_hist=chat_hist)
+    return render_template("index.html", chat_hist=get_conversation().history)
 
 @app.route('/api/status/stream')
 def stream_status():
-    def event_stream():
-        q = status_manager.listen()
-        try:
-            while True:
-                data = q.get()
-                yield data
-        except GeneratorExit:
-            status_manager.listeners.remove(q)
-            
-    return Response(event_stream(), mimetype="text/event-stream")
+    # current state first, then coalesced updates and heartbeats;
+    # the subscription is dropped in the generator's finally when the client goes away
+    return Response(
+        status_manager.stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.route('/api/message', methods=['POST'])
 def api_message():
@@ -255,141 +354,356 @@ def api_message():
     if not user_message:
         return jsonify({"ok": False, "error": "empty message"}), 400
 
-    ai_response = process_message(user_message)
+    ai_response = process_message(user_message, get_conversation())
     return jsonify({"ok": True, "assistant": ai_response})
 
+@app.route('/api/message/stream', methods=['POST'])
+def api_message_stream():
+    data = request.get_json(silent=True) or {}
+    user_message = (data.get('message') or "").strip()
+    if not user_message:
+        return jsonify({"ok": False, "error": "empty message"}), 400
+
+    conversation = get_conversation()
+
+    def event_stream():
+        for event in process_message_stream(user_message, conversation):
+            yield sse_event(event)
+
+    return Response(
+        stream_with_context(event_stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route('/api/clear', methods=['POST'])
 def api_clear():
-    global chat_hist
-    chat_hist = []
-    # Re-initialize with system prompt
-    chat_hist.append(get_system_prompt())
+    conversation = get_conversation()
+    with conversation.lock:
+        # Re-initialize with system prompt
+        conversation.reset([get_system_prompt()])
     return jsonify({"ok": True})
 
 @app.route('/api/upload', methods=['POST'])
 def api_upload():
-    if 'file' not in request.files:
-        return jsonify({"ok": False, "error": "No file part"}), 400
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"ok": False, "error": "No selected file"}), 400
-    
-    if file:
-        filename = file.filename
-        # Secure filename is good practice, but for local personal use, we might want to keep original names
-        # from werkzeug.utils import secure_filename
-        # filename = secure_filename(file.filename)
-        save_path = os.path.join("notes", filename)
-        
-        # Update status to uploading
-        status_manager.update(mode="processing", message=f"Uploading {filename}...", progress=0, step="upload")
-        
-        file.save(save_path)
-        
-        # Notify the chat history about the new file
-        global chat_hist
-        chat_hist.append({
-            "role": "system", 
-            "content": f"System Notification: User has uploaded '{filename}'. It is currently being indexed and will be available for search shortly."
-        })
-        
-        return jsonify({"ok": True, "message": f"File {filename} uploaded successfully. Indexing will start shortly."})
-
-def process_message(user_message):
-    global chat_hist
+    """
+    One-shot upload: the raw file as the request body, ?filename= for its name.
+    The body is streamed into place like the chunked uploads. Multipart forms are refused,
+    Werkzeug would parse and buffer the whole body before this code runs.
+    """
+    if request.mimetype == "multipart/form-data":
+        return jsonify({"ok": False, "error": "Send the file as the raw request body with ?filename=, "
+                                              "or use /api/upload/init for chunked uploads"}), 415
+    filename = request.args.get("filename", "")
+    try:
+        filename = UploadManager.clean_filename(filename)
+        status_manager.update(mode="processing", message=f"Uploading {filename}...", progress=0, step="upload",
+                              channel=Ingestor.status_channel(filename))
+        result = upload_manager.save_stream(filename, request.stream)
+    except UploadError as e:
+        return upload_error(e, filename)
+    return upload_finished(result)
+
+@app.route('/api/upload/init', methods=['POST'])
+def api_upload_init():
+    """
+    Start a chunked upload: {"filename", "size"} -> upload id and the part size to send.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        meta = upload_manager.start(data.get("filename"), data.get("size"))
+    except (UploadError, TypeError) as e:
+        return upload_error(e if isinstance(e, UploadError) else UploadError("Invalid file size"), data.get("filename"))
+    status_manager.update(mode="processing", message=f"Uploading {meta['filename']}...", progress=0, step="upload",
+                          channel=Ingestor.status_channel(meta["filename"]))
+    return jsonify({"ok": True, "upload_id": meta["id"], "part_size": meta["part_size"], "received": 0})
+
+@app.route('/api/upload/<upload_id>', methods=['GET'])
+def api_upload_status(upload_id):
+    """
+    How much of an upload the server has, the client resumes from "received".
+    """
+    try:
+        meta = upload_manager.status(upload_id)
+    except UploadError as e:
+        return upload_error(e)
+    return jsonify({"ok": True, "upload_id": meta["id"], "filename": meta["filename"], "size": meta["size"],
+                    "received": meta["received"], "part_size": meta["part_size"]})
+
+@app.route('/api/upload/<upload_id>', methods=['PUT'])
+def api_upload_part(upload_id):
+    """
+    One part of a chunked upload, the raw bytes as the body, ?offset= where it starts.
+    """
+    try:
+        meta = upload_manager.write(upload_id, request.args.get("offset", -1, type=int), request.stream,
+                                    request.content_length)
+    except UploadError as e:
+        return upload_error(e)
+    progress = int(meta["received"] * 100 / meta["size"]) if meta["size"] else 100
+    status_manager.update(mode="processing", message=f"Uploading {meta['filename']}... {progress}%",
+                          progress=progress, step="upload", channel=Ingestor.status_channel(meta["filename"]))
+    return jsonify({"ok": True, "received": meta["received"]})
+
+@app.route('/api/upload/<upload_id>/complete', methods=['POST'])
+def api_upload_complete(upload_id):
+    try:
+        result = upload_manager.complete(upload_id)
+    except UploadError as e:
+        return upload_error(e)
+    return upload_finished(result)
+
+def upload_error(error, filename=None):
+    if filename and error.status != 404:
+        try:
+            ingestor.finish_status(UploadManager.clean_filename(filename), mode="error",
+                                   message=f"Upload failed: {error}")
+        except UploadError:
+            pass
+    return jsonify({"ok": False, "error": str(error), **error.extra}), error.status
+
+def upload_finished(result):
+    filename = result["filename"]
+    if result["duplicate_of"]:
+        # same content is indexed already, nothing to parse or embed
+        ingestor.finish_status(filename, mode="complete",
+                               message=f"{filename} is already indexed as {result['duplicate_of']}")
+        print(f"Status: Upload of {filename} skipped, same content as {result['duplicate_of']}")
+        return jsonify({"ok": True, "duplicate": True,
+                        "message": f"{filename} has the same content as {result['duplicate_of']}, which is already indexed."})
+
+    # Tell the model about the new file with the next message
+    conversation = get_conversation()
+    conversation.add_notice(
+        f"System Notification: User has uploaded '{filename}'. It is currently being indexed and will be available for search shortly."
+    )
+    return jsonify({"ok": True, "duplicate": False,
+                    "message": f"File {filename} uploaded successfully. Indexing will start shortly."})
+
+def infer_tool_call(user_raw, arguments):
+    """
+    Pick a tool for a malformed tool call (empty name) from the user's wording.
+    """
+    user_msg = user_raw.lower()
+
+    # 1) Explicit inventory requests ONLY -> list_notes
+    # Must be asking WHICH files exist, not CONTENT from files (markers shared with the IntentRouter)
+    is_inventory = any(m in user_msg for m in INVENTORY_MARKERS)
+    is_content = any(m in user_msg for m in CONTENT_MARKERS)
+
+    if is_inventory and not is_content:
+        print("Warning: Empty tool name. Inferring 'list_notes' from inventory request")
+        return "list_notes", {}
+
+    # 2) Teaching/explanation requests -> search_notes (or search_internet as fallback)
+    if is_content:
+        print("Warning: Empty tool name. Inferring 'search_notes' from content request")
+    # 3) Default -> search_notes
+    else:
+        print("Warning: Empty tool name. Defaulting to 'search_notes'")
+
+    # Keep an existing query if provided, otherwise use the user message as query
+    if isinstance(arguments, dict) and arguments.get("query"):
+        return "search_notes", arguments
+    return "search_notes", {"query": user_raw}
+
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+def get_conversation():
+    """
+    Conversation of the current browser session (cookie based).
+    """
+    if "sid" not in session:
+        session["sid"] = ConversationStore.new_session_id()
+    return conversations.get(session["sid"])
+
+def llm_stream(chat_hist, tools=None, metrics=None, turn_stats=None, prompt_state=None):
+    """
+    stream_chat over the token-budgeted view of chat_hist,
+    limited to MAX_CONCURRENT_LLM_CALLS calls in flight across all sessions.
+    """
+    messages = history_manager.build(chat_hist, turn_stats, state=prompt_state)
+    if turn_stats is not None:
+        turn_stats["llm_calls"] = turn_stats.get("llm_calls", 0) + 1
+    metrics = metrics or StreamMetrics()
+    with llm_slots:
+        yield from stream_chat(MODEL_NAME, messages, tools=tools, metrics=metrics, **model_manager.request_kwargs())
+    model_manager.record(metrics.done_chunk)
+
+def stream_reply(chat_hist, conversation, metrics, turn_stats, tools=None, first_token_at=None):
+    """
+    One LLM call of a turn: yields a {"type": "token"} event per piece of text and
+    returns (final message, time of the turn's first token).
+    """
+    message = {}
+    for kind, value in llm_stream(chat_hist, tools=tools, metrics=metrics, turn_stats=turn_stats,
+                                  prompt_state=conversation.prompt_state):
+        if kind == "token":
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            yield {"type": "token", "content": value}
+        else:
+            message = value
+    return message, first_token_at
+
+def process_message_stream(user_message, conversation):
+    """
+    Run one chat turn and yield events as they happen:
+    {"type": "token"} for each piece of the answer, {"type": "tool"} when a tool runs
+    and a final {"type": "done"} with the full answer and latency metrics.
+    Turns of the same session run one at a time, other sessions run in parallel.
+    While a turn runs, ingestion pauses at its yield points (resource_scheduler).
+    A turn that never gets to "done" (client disconnected, unexpected error) is taken back
+    out of the history before the lock is released.
+    """
+    channel = f"chat:{conversation.session_id[:8]}"
+    with conversation.lock, resource_scheduler.interactive():
+        conversation.touch()
+        history_len = len(conversation.history)
+        finished = False
+        try:
+            for event in _run_turn(user_message, conversation, channel):
+                if event["type"] == "done":
+                    finished = True
+                yield event
+        finally:
+            if not finished:
+                _rollback_turn(conversation, history_len, channel)
+
+def _rollback_turn(conversation, history_len, channel):
+    """
+    Drop the user message of an unfinished turn and everything after it (tool calls, tool
+    results), so the next turn does not start after a question nobody answered.
+    The system prompt and notices of the turn stay, the model was told those already.
+    """
+    chat_hist = conversation.history
+    for i in range(history_len, len(chat_hist)):
+        if chat_hist[i].get("role") == "user":
+            print(f"Status: Turn of {conversation.session_id[:8]} did not finish, dropping {len(chat_hist) - i} messages")
+            del chat_hist[i:]
+            break
+    status_manager.set_idle(channel)
+
+def _run_turn(user_message, conversation, channel="chat"):
+    chat_hist = conversation.history
     if not chat_hist:
         chat_hist.append(get_system_prompt())
 
+    # Dynamic tail: status changes and pending notices (uploads) go in right before the user
+    # message, the history stays append-only so the prefix of the previous turn is reused
+    notices = conversation.take_notices()
+    status = get_status_notice()
+    if status != conversation.status_notice:
+        notices.insert(0, status)
+        conversation.status_notice = status
+    if notices:
+        chat_hist.append({"role": "system", "content": "\n".join(notices)})
+
     chat_hist.append({"role": "user", "content": user_message})
-    
-    status_manager.update(mode="thinking", message="AI is thinking...", progress=0)
-    
+
+    status_manager.update(mode="thinking", message="AI is thinking...", progress=0, channel=channel)
+
+    request_start = time.perf_counter()
+    first_token_at = None
+    answer_metrics = StreamMetrics()
+    turn_stats = {}
+    ai_response = ""
+
+    # Standalone questions can be answered (or at least planned) from the answer cache
+    cached = None
+    cacheable = answer_cache is not None and not is_followup(user_message)
+    if cacheable:
+        # read before anything else, an index change during the turn means the answer is not stored
+        cache_generation = vector_store.generation
+        corpus, corpus_files = answer_cache.corpus_version()
+        cached = answer_cache.lookup(user_message)
+
+    plan = None
+    if cached:
+        plan = cached["tool_calls"]
+        turn_stats["answer_cache"] = "answer" if cached["answer"] is not None else "plan"
+        print(f"Status: Answer cache {turn_stats['answer_cache']} hit for '{user_message}' (matched '{cached['question']}')")
+    elif intent_router:
+        routed = intent_router.route(user_message)
+        if routed:
+            plan = [routed]
+            turn_stats["routed"] = routed[0]
+
+    executed = []
     try:
-        # First call to LLM with tools
-        print(f"Sending request to {MODEL_NAME} with tools...")
-        response = ollama.chat(
-            model=MODEL_NAME,
-            messages=chat_hist,
-            tools=mcp_server.get_tool_definitions()
-        )
-        
-        message = response.get("message", {})
-        
+        message = {}
+        if cached and cached["answer"] is not None:
+            # Same question against the same notes: no retrieval, no LLM call
+            ai_response = cached["answer"]
+            first_token_at = time.perf_counter()
+            yield {"type": "token", "content": ai_response}
+        elif plan:
+            # Confident intent: run the tool right away, the LLM is only called once, with the result
+            print(f"Status: Running {', '.join(name for name, _ in plan)} without a planning call")
+            message = {"role": "assistant", "content": "",
+                       "tool_calls": [{"function": {"name": name, "arguments": arguments}} for name, arguments in plan]}
+        else:
+            # First call to LLM with tools. If the model answers directly the tokens
+            # are already the answer, so they are streamed straight to the client.
+            print(f"Sending request to {MODEL_NAME} with tools...")
+            planning_start = time.perf_counter()
+            message, first_token_at = yield from stream_reply(chat_hist, conversation, answer_metrics, turn_stats,
+                                                              tools=mcp_server.get_tool_definitions())
+            if message.get("tool_calls") and intent_router:
+                intent_router.record_planning((time.perf_counter() - planning_start) * 1000)
+
         # Check if the model wants to call a tool
         if message.get("tool_calls"):
             print(f"Model requested {len(message['tool_calls'])} tool calls.")
             # Add the model's message (with tool calls) to history
             chat_hist.append(message)
-            
+            # Any text streamed before the tool calls was planning, not the answer
+            first_token_at = None
+
+            calls = []
             for tool_call in message["tool_calls"]:
                 function_name = tool_call["function"].get("name")
                 arguments = tool_call["function"].get("arguments") or {}
-                
+
                 if not function_name:
                     # Fallback for malformed tool calls
-                    last_user_raw = chat_hist[-2]["content"] if len(chat_hist) >= 2 else ""
-                    last_user_msg = last_user_raw.lower()
-
-                    # 1) Explicit inventory requests ONLY -> list_notes
-                    # Must be asking WHICH files exist, not CONTENT from files
-                    inventory_only_markers = [
-                        "what notes do", "what files do", "what documents do",
-                        "list notes", "list files", "list documents",
-                        "show notes", "show files", "show documents",
-                        "which notes", "which files"
-                    ]
-                    # Exclude if asking for content
-                    content_markers = ["teach", "explain", "what is", "how", "summarize", "according to", "from my notes"]
-                    
-                    is_inventory = any(m in last_user_msg for m in inventory_only_markers)
-                    is_content = any(m in last_user_msg for m in content_markers)
-                    
-                    if is_inventory and not is_content:
-                        print("Warning: Empty tool name. Inferring 'list_notes' from inventory request")
-                        function_name = "list_notes"
-                        arguments = {}
-
-                    # 2) Teaching/explanation requests -> search_notes (or search_internet as fallback)
-                    elif is_content:
-                        print("Warning: Empty tool name. Inferring 'search_notes' from content request")
-                        function_name = "search_notes"
-                        # Try to extract topic from user message
-                        if isinstance(arguments, dict) and arguments.get("query"):
-                            # Keep existing query if provided
-                            pass
-                        else:
-                            # Use the user message as query
-                            arguments = {"query": last_user_raw}
-
-                    # 3) Default -> search_notes
-                    else:
-                        print("Warning: Empty tool name. Defaulting to 'search_notes'")
-                        function_name = "search_notes"
-                        arguments = {"query": last_user_raw} if not (isinstance(arguments, dict) and arguments.get("query")) else arguments
-
-                status_manager.update(mode="tool_call", message=f"Using tool: {function_name}", progress=50)
+                    function_name, arguments = infer_tool_call(user_message, arguments)
+
                 print(f"Executing tool: {function_name} with args: {arguments}")
-                
-                try:
-                    tool_result = mcp_server.call_tool(function_name, arguments)
-                except Exception as e:
-                    tool_result = f"Error executing tool {function_name}: {str(e)}"
-                
+                yield {"type": "tool", "name": function_name}
+                calls.append((function_name, arguments))
+
+            names = ", ".join(name for name, _ in calls)
+            status_manager.update(mode="tool_call", message=f"Using tool: {names}", progress=50, channel=channel)
+
+            # Independent calls run at the same time, results keep the order of the calls
+            for (_, arguments), outcome in zip(calls, tool_executor.run(calls)):
+                tool_result = outcome["result"]
+                executed.append((outcome, arguments))
+
+                # Tokens this tool adds to the next prompt
+                tool_tokens = history_manager.token_counter(str(tool_result))
+                turn_stats.setdefault("tool_calls", []).append(
+                    {"name": outcome["name"], "tokens": tool_tokens, "ms": outcome["ms"]}
+                )
+                turn_stats["tool_tokens"] = turn_stats.get("tool_tokens", 0) + tool_tokens
+                print(f"Tool {outcome['name']} returned {tool_tokens} tokens in {outcome['ms']} ms")
+
                 # Add tool result to history
                 chat_hist.append({
                     "role": "tool",
                     "content": str(tool_result),
-                    "name": function_name
+                    "name": outcome["name"]
                 })
             # Second call to LLM to get final answer
             print("Sending follow-up request to LLM...")
-            status_manager.update(mode="thinking", message="Generating final response...", progress=75)
-            final_response = ollama.chat(
-                model=MODEL_NAME,
-                messages=chat_hist
-            )
-            ai_response = final_response.get("message", {}).get("content", "")
-        else:
+            status_manager.update(mode="thinking", message="Generating final response...", progress=75, channel=channel)
+            answer_metrics = StreamMetrics()
+            final, first_token_at = yield from stream_reply(chat_hist, conversation, answer_metrics, turn_stats,
+                                                            first_token_at=first_token_at)
+            ai_response = final.get("content", "")
+        elif not ai_response:
             ai_response = message.get("content", "")
 
     except Exception as e:
@@ -397,17 +711,65 @@ def process_message(user_message):
         ai_response = f"I encountered an error: {str(e)}"
         # Fallback: try without tools if it failed (e.g. model doesn't support tools)
         if "does not support tools" in str(e):
-             try:
-                response = ollama.chat(model=MODEL_NAME, messages=chat_hist)
-                ai_response = response.get("message", {}).get("content", "")
-             except:
-                 pass
-    
+            try:
+                answer_metrics = StreamMetrics()
+                final, first_token_at = yield from stream_reply(chat_hist, conversation, answer_metrics, turn_stats,
+                                                                first_token_at=first_token_at)
+                ai_response = final.get("content", "")
+            except:
+                pass
+
     if not (ai_response or "").strip():
         ai_response = "I couldn't generate a response just now. Please try again."
+    elif cacheable and not (cached and cached["answer"] is not None) and vector_store.generation == cache_generation:
+        _store_answer(user_message, ai_response, executed, corpus, corpus_files,
+                      (time.perf_counter() - request_start) * 1000)
 
-    status_manager.set_idle()
+    status_manager.set_idle(channel)
     chat_hist.append({"role": "assistant", "content": ai_response})
+
+    metrics = answer_metrics.to_dict()
+    metrics["ttft_ms"] = round((first_token_at - request_start) * 1000, 1) if first_token_at else None
+    metrics["total_ms"] = round((time.perf_counter() - request_start) * 1000, 1)
+    metrics.update(turn_stats)
+    print(f"Response metrics: TTFT {metrics['ttft_ms']} ms, {metrics['tokens_per_sec']} tokens/sec, "
+          f"{metrics.get('prompt_tokens', 0)} prompt tokens ({metrics.get('prompt_tokens_saved', 0)} saved), "
+          f"{metrics.get('tool_tokens', 0)} from tools, model load {metrics['load_ms']} ms, "
+          f"prompt eval {metrics['prompt_eval_ms']} ms, {metrics.get('llm_calls', 0)} LLM calls"
+          f"{' (routed to ' + metrics['routed'] + ')' if metrics.get('routed') else ''}"
+          f"{' (answer cache ' + metrics['answer_cache'] + ' hit)' if metrics.get('answer_cache') else ''}")
+    if intent_router and metrics.get("routed"):
+        router_stats = intent_router.get_stats()
+        print(f"Status: Intent router saved {router_stats['round_trips_saved']} LLM round trips, "
+              f"~{router_stats['ms_saved']:.0f} ms so far")
+    yield {"type": "done", "content": ai_response, "metrics": metrics}
+
+def _store_answer(question, answer, executed, corpus, corpus_files, cost_ms):
+    """
+    Put a finished turn in the answer cache, with the files its tool results came from.
+    Only answers grounded in the notes are cached (search_notes / list_notes, no errors).
+    """
+    if not executed or answer.startswith("I encountered an error"):
+        return
+    files = {}
+    for outcome, _ in executed:
+        if outcome["timed_out"] or outcome["rejected"] or outcome["name"] not in ("search_notes", "list_notes"):
+            return
+        result = str(outcome["result"])
+        sources = {filename for filename, _ in SOURCE_PATTERN.findall(result)}
+        if outcome["name"] == "list_notes" or not sources:
+            # about the whole corpus, or nothing found: any new or changed file matters
+            files[ALL_FILES] = corpus
+        for filename in sources:
+            files[filename] = corpus_files.get(filename, "")
+    tool_calls = [(outcome["name"], arguments) for outcome, arguments in executed]
+    answer_cache.put(question, answer, tool_calls, files, corpus, cost_ms)
+
+def process_message(user_message, conversation):
+    ai_response = ""
+    for event in process_message_stream(user_message, conversation):
+        if event["type"] == "done":
+            ai_response = event["content"]
     return ai_response
 
 @app.route('/end')
@@ -415,6 +777,8 @@ def end():
     print("Ending session...")
     if file_watcher:
         file_watcher.stop()
+    if tool_executor:
+        tool_executor.shutdown()
     
     # Kill Ollama
     kill_llama()
@@ -425,6 +789,150 @@ def end():
     
     return "Session ended. You can close this tab."
 
+# ---------------------------------------------------------------------------
+# ASGI mode (python app.py --asgi)
+# The long-lived endpoints (status SSE, chat) are native async routes, everything
+# else is the Flask app mounted through asgiref's WsgiToAsgi.
+# ---------------------------------------------------------------------------
+
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", "16"))
+
+def _asgi_session(request):
+    """
+    Read (or create) the session id from Flask's signed session cookie, so sessions are
+    shared between the async routes and the Flask ones.
+    Returns (sid, cookie value to set or None).
+    """
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config.get("SESSION_COOKIE_NAME", "session")
+    raw = request.cookies.get(cookie_name)
+    if raw:
+        try:
+            data = serializer.loads(raw, max_age=int(app.permanent_session_lifetime.total_seconds()))
+            if data.get("sid"):
+                return data["sid"], None
+        except Exception:
+            pass
+    sid = ConversationStore.new_session_id()
+    return sid, serializer.dumps({"sid": sid})
+
+def create_asgi_app():
+    import asyncio
+    import contextlib
+    from concurrent.futures import ThreadPoolExecutor
+    from asgiref.wsgi import WsgiToAsgi
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Mount, Route
+    from src.utils.async_status import AsyncStatusBroadcaster
+
+    broadcaster = AsyncStatusBroadcaster(status_manager)
+    # Chat turns are synchronous (tools, history, ollama), they run here instead of on request threads
+    chat_pool = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="chat")
+
+    def start_turn(user_message, conversation):
+        """
+        Run a turn in the chat pool, events come out of the returned asyncio.Queue (None at the end).
+        The turn finishes (and lands in the history) even if the client disconnects.
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def put(event):
+            try:
+                loop.call_soon_threadsafe(events.put_nowait, event)
+            except RuntimeError:
+                pass  # loop closed during shutdown
+
+        def run():
+            try:
+                for event in process_message_stream(user_message, conversation):
+                    put(event)
+            except Exception as e:
+                put({"type": "done", "content": f"I encountered an error: {str(e)}", "metrics": {}})
+            finally:
+                put(None)
+
+        loop.run_in_executor(chat_pool, run)
+        return events
+
+    def with_session(response, cookie):
+        if cookie:
+            response.set_cookie(app.config.get("SESSION_COOKIE_NAME", "session"), cookie, httponly=True)
+        return response
+
+    async def read_message(request):
+        try:
+            data = await request.json()
+        except Exception:
+            data = {}
+        return (data.get("message") or "").strip() if isinstance(data, dict) else ""
+
+    async def status_stream(request):
+        return StreamingResponse(
+            broadcaster.stream(request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    async def message_stream(request):
+        user_message = await read_message(request)
+        if not user_message:
+            return JSONResponse({"ok": False, "error": "empty message"}, status_code=400)
+        sid, cookie = _asgi_session(request)
+        events = start_turn(user_message, conversations.get(sid))
+
+        async def body():
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield sse_event(event)
+
+        response = StreamingResponse(
+            body(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+        return with_session(response, cookie)
+
+    async def message(request):
+        user_message = await read_message(request)
+        if not user_message:
+            return JSONResponse({"ok": False, "error": "empty message"}, status_code=400)
+        sid, cookie = _asgi_session(request)
+        events = start_turn(user_message, conversations.get(sid))
+        ai_response = ""
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            if event["type"] == "done":
+                ai_response = event["content"]
+        return with_session(JSONResponse({"ok": True, "assistant": ai_response}), cookie)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(_):
+        await broadcaster.start()
+        yield
+        # Graceful shutdown: close SSE streams, let running turns finish, no new ones
+        print("Shutting down ASGI server...")
+        broadcaster.stop()
+        status_manager.stop()
+        chat_pool.shutdown(wait=False, cancel_futures=True)
+        if tool_executor:
+            tool_executor.shutdown()
+
+    return Starlette(
+        routes=[
+            Route("/api/status/stream", status_stream),
+            Route("/api/message/stream", message_stream, methods=["POST"]),
+            Route("/api/message", message, methods=["POST"]),
+            Mount("/", app=WsgiToAsgi(app))
+        ],
+        lifespan=lifespan
+    )
+
 if __name__ == '__main__':
     # Start Ollama in background (optional, if user doesn't have it running)
     # We use 'serve' if possible, or just 'run' to keep it alive.
@@ -435,13 +943,24 @@ if __name__ == '__main__':
     except FileNotFoundError:
         print("Ollama executable not found. Please ensure Ollama is installed and in PATH.")
     
-    time.sleep(2) # Wait for Ollama to start
+    # Wait for Ollama to answer instead of a fixed sleep
+    model_manager.wait_until_ready(timeout=OLLAMA_READY_TIMEOUT)
     
     init_system()
 
+    # Load and warm the model with the system prompt while the server starts
+    # (the same prefix the first turn of every conversation starts with)
+    model_manager.start(warm_messages=[get_system_prompt(), {"role": "system", "content": get_status_notice()}],
+                        tools=mcp_server.get_tool_definitions())
+
     try:
-        print("Starting Flask server...")
-        app.run(debug=True, use_reloader=False) # use_reloader=False to avoid double init
+        if "--asgi" in sys.argv:
+            import uvicorn
+            print("Starting ASGI server (uvicorn)...")
+            uvicorn.run(create_asgi_app(), host="127.0.0.1", port=5000, timeout_graceful_shutdown=10)
+        else:
+            print("Starting Flask server...")
+            app.run(debug=True, use_reloader=False, threaded=True) # use_reloader=False to avoid double init
     finally:
         if file_watcher:
             file_watcher.stop()
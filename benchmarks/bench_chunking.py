@@ -0,0 +1,115 @@
+"""
+Sliding-window vs structure-aware chunking.
+
+Chunks every file of a folder with both chunkers and reports chunk count, duplicated text,
+an index size estimate, how many sentences get cut in two, and retrieval quality:
+sampled sentences are used as queries and we check whether the chunk containing
+them comes back at rank 1 / within the top 5.
+
+    python -m benchmarks.bench_chunking --notes notes --queries 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.rag.chunking import SlidingWindowChunker, StructureAwareChunker, SENTENCE_SPLIT
+from src.rag.embeddings import EmbeddingService
+
+EMBEDDING_BYTES = 384 * 4   # all-MiniLM-L6-v2, float32
+
+
+def load_pages(notes_dir):
+    """
+    {filename: [(page, text)]} for every supported file, using the ingestor's extractors.
+    """
+    from src.rag.ingestor import Ingestor
+    ingestor = Ingestor()
+    corpus = {}
+    for name in sorted(os.listdir(notes_dir)):
+        path = os.path.join(notes_dir, name)
+        ext = os.path.splitext(name)[1].lower()
+        if ext == '.pdf':
+            corpus[name] = list(ingestor.iter_pdf_pages(path))
+        elif ext in ('.txt', '.md'):
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                corpus[name] = [(1, f.read())]
+    return corpus
+
+
+def sentences_of(pages):
+    text = " ".join(" ".join((t or "").split()) for _, t in pages)
+    return [s.strip() for s in SENTENCE_SPLIT.split(text) if len(s.split()) >= 6]
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def run(name, chunker, corpus, queries, embedder, k):
+    start = time.perf_counter()
+    chunks = []
+    for filename, pages in corpus.items():
+        for chunk in chunker.chunk_pages(pages):
+            chunks.append((filename, normalize(chunk["text"])))
+    chunk_ms = (time.perf_counter() - start) * 1000
+
+    texts = [text for _, text in chunks]
+    total_chars = sum(len(t) for t in texts)
+    source_chars = sum(len(normalize(t or "")) for pages in corpus.values() for _, t in pages)
+    duplicated = max(0.0, total_chars - source_chars) / total_chars if total_chars else 0.0
+    index_mb = (len(texts) * EMBEDDING_BYTES + total_chars) / (1024 * 1024)
+
+    # a sentence is split if no single chunk contains all of it
+    split = sum(1 for _, sentence in queries if not any(sentence in t for t in texts))
+
+    vectors = np.array(embedder.embed(texts), dtype=np.float32)
+    hits1 = hits5 = 0
+    for filename, sentence in queries:
+        q = np.array(embedder.embed_query(sentence), dtype=np.float32)
+        ranked = np.argsort(-(vectors @ q))[:k].tolist()
+        relevant = [i for i in ranked if chunks[i][0] == filename and sentence[:40] in texts[i]]
+        if relevant and ranked[0] == relevant[0]:
+            hits1 += 1
+        if relevant:
+            hits5 += 1
+
+    n = len(queries) or 1
+    print(f"{name:10s} chunks {len(texts):6d}   dup text {duplicated:5.1%}   index ~{index_mb:7.2f} MB   "
+          f"split sentences {split / n:5.1%}   hit@1 {hits1 / n:.3f}   hit@{k} {hits5 / n:.3f}   "
+          f"chunking {chunk_ms:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", default="notes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--max-tokens", type=int, default=230)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = load_pages(args.notes)
+    if not corpus:
+        print(f"No notes found in {args.notes}")
+        return
+
+    rng = random.Random(args.seed)
+    all_sentences = [(name, s) for name, pages in corpus.items() for s in sentences_of(pages)]
+    queries = rng.sample(all_sentences, min(args.queries, len(all_sentences)))
+    print(f"{len(corpus)} files, {len(queries)} query sentences")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        embedder = EmbeddingService(cache_path=os.path.join(tmp, "bench.db"))
+        run("sliding", SlidingWindowChunker(), corpus, queries, embedder, args.k)
+        run("structure", StructureAwareChunker(max_tokens=args.max_tokens), corpus, queries, embedder, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Chat latency while a bulk ingestion embeds in the background, with and without the
+ResourceScheduler.
+
+A background thread embeds --chunks synthetic chunks (ingestion), meanwhile "chat turns"
+embed a query and then hold the CPU for --turn-ms of other work (standing in for retrieval
+and generation). Reports query-embedding latency and turn time per mode, plus how long
+ingestion waited and how much longer it took overall.
+
+    python -m benchmarks.bench_contention --chunks 4000 --turns 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.rag.embeddings import EmbeddingService
+from src.utils.scheduler import ResourceScheduler
+
+WORDS = ("ledger asset graph vertex queue hashing bucket theorem proof balance equity revenue "
+         "expense traversal stack heap tree sort merge pivot interest").split()
+
+
+def busy(ms):
+    end = time.perf_counter() + ms / 1000
+    x = 0
+    while time.perf_counter() < end:
+        x += 1
+    return x
+
+
+def run(name, scheduler, args, seed):
+    rng = random.Random(seed)
+    service = EmbeddingService(cache_path=None, memory_cache_size=0, scheduler=scheduler)
+    service.embed_query("warm up")
+    chunks = [" ".join(rng.choice(WORDS) for _ in range(120)) + f" {seed} {i}" for i in range(args.chunks)]
+
+    ingest = {}
+
+    def ingestion():
+        start = time.perf_counter()
+        service.embed(chunks, background=True)
+        ingest["seconds"] = time.perf_counter() - start
+
+    worker = threading.Thread(target=ingestion)
+    worker.start()
+    time.sleep(0.5)
+
+    query_ms = []
+    turn_ms = []
+    for i in range(args.turns):
+        if not worker.is_alive():
+            break
+        start = time.perf_counter()
+        with scheduler.interactive() if scheduler else nullcontext():
+            service.embed_query(f"explain {rng.choice(WORDS)} {seed} {i}")
+            query_ms.append((time.perf_counter() - start) * 1000)
+            busy(args.turn_ms)
+        turn_ms.append((time.perf_counter() - start) * 1000)
+        time.sleep(args.think_ms / 1000)
+    worker.join()
+
+    print(f"{name:14s} query embed p50 {statistics.median(query_ms):7.1f} ms  max {max(query_ms):7.1f} ms   "
+          f"turn p50 {statistics.median(turn_ms):7.1f} ms   ingestion {ingest['seconds']:6.1f} s ({len(query_ms)} turns)")
+    if scheduler:
+        background = scheduler.get_stats()["background"]
+        print(f"{'':14s} ingestion waited {background['waits']} times, {background['wait_ms'] / 1000:.1f} s total, "
+              f"max {background['max_wait_ms']:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=4000)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--turn-ms", type=float, default=300, help="CPU work per turn after the query embedding")
+    parser.add_argument("--think-ms", type=float, default=500, help="pause between turns")
+    args = parser.parse_args()
+
+    run("no scheduler", None, args, seed=1)
+    run("scheduler", ResourceScheduler(), args, seed=2)
+
+
+if __name__ == "__main__":
+    main()
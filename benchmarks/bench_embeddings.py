@@ -0,0 +1,74 @@
+"""
+Embedding throughput benchmark (sentences/sec).
+
+Measures the EmbeddingService for ingestion-sized batches (many chunks at once)
+and query-sized batches (one short text per call), cold (encoding) and warm (cache hits).
+
+    python -m benchmarks.bench_embeddings --chunks 512 --queries 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.rag.embeddings import EmbeddingService
+
+WORDS = (
+    "depreciation asset ledger balance graph vertex edge queue stack hashing tree "
+    "module chapter recursion algorithm complexity network protocol packet matrix "
+    "vector integral derivative theorem proof energy force momentum cell enzyme"
+).split()
+
+
+def make_texts(n, words_per_text, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_text)) for _ in range(n)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=512, help="ingestion texts")
+    parser.add_argument("--queries", type=int, default=200, help="query texts")
+    parser.add_argument("--batch-sizes", default="16,32,64,128")
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    chunks = make_texts(args.chunks, 180, seed=1)
+    queries = make_texts(args.queries, 6, seed=2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Ingestion-sized batches")
+        for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+            service = EmbeddingService(cache_path=os.path.join(tmp, f"ingest_{batch_size}.db"),
+                                       batch_size=batch_size, num_threads=args.threads)
+            service.model  # load outside the timing
+            cold = timed(lambda: service.embed(chunks))
+            warm = timed(lambda: service.embed(chunks))
+            print(f"  batch {batch_size:4d}: cold {len(chunks) / cold:8.1f} sent/s   warm {len(chunks) / warm:10.1f} sent/s")
+
+        print("Query-sized batches (one text per call)")
+        service = EmbeddingService(cache_path=os.path.join(tmp, "query.db"), num_threads=args.threads)
+        service.model
+        cold = timed(lambda: [service.embed_query(q) for q in queries])
+        warm = timed(lambda: [service.embed_query(q) for q in queries])
+        print(f"  cold {len(queries) / cold:8.1f} sent/s ({cold / len(queries) * 1000:.2f} ms/query)")
+        print(f"  warm {len(queries) / warm:8.1f} sent/s ({warm / len(queries) * 1000:.3f} ms/query)")
+
+        print("Disk cache only (fresh process memory)")
+        reopened = EmbeddingService(cache_path=os.path.join(tmp, "query.db"), num_threads=args.threads)
+        disk = timed(lambda: reopened.embed(queries))
+        print(f"  {len(queries) / disk:8.1f} sent/s, stats {reopened.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
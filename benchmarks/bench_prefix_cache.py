@@ -0,0 +1,108 @@
+"""
+Prompt-prefix reuse: Ollama prompt-eval time per turn over a long simulated session.
+
+Every turn appends a user question, a search_notes result and an answer (synthetic, the
+same text in every mode) and asks the model for a single token, so the timings are almost
+only prompt evaluation. Modes:
+
+    no reuse    the first message changes every turn (like runtime state in the system prompt),
+                Ollama has to evaluate the whole prompt again each time
+    append      static system prompt + append-only history, but turns are dropped one at a
+                time once over budget (every cut shifts the prefix)
+    hysteresis  what app.py does: static prefix, notices in the tail, cuts down to 70%
+                of the budget so cuts are rare
+
+    python -m benchmarks.bench_prefix_cache --turns 30 --context 4096
+
+Needs a running Ollama with the model pulled.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+
+import ollama
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import MODEL_NAME, get_system_prompt, get_status_notice
+from src.llm.history import HistoryManager
+from src.llm.model_manager import ModelManager
+
+WORDS = ("depreciation asset ledger graph vertex edge queue hashing collision bucket impairment "
+         "module chapter theorem proof lemma balance equity revenue expense search traversal").split()
+
+
+def text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def build_session(turns, seed):
+    """
+    [(notice or None, user, tool result, answer)] for every turn, identical for every mode.
+    """
+    rng = random.Random(seed)
+    session = []
+    for i in range(turns):
+        notice = f"System Notification: User has uploaded 'notes_{i}.pdf'." if i % 7 == 3 else None
+        tool = f"--- Source: notes_{i % 5}.pdf (Page {i + 1}) ---\n{text(rng, 250)}"
+        session.append((notice, f"explain {text(rng, 6)}", tool, text(rng, 120)))
+    return session
+
+
+def run(mode, session, manager, context, seed):
+    # a different first line per mode so a mode never starts from another mode's cache
+    system = dict(get_system_prompt())
+    system["content"] = f"[bench {mode} {seed}]\n" + system["content"]
+    history = [system, {"role": "system", "content": get_status_notice()}]
+    drop_to = 1.0 if mode == "append" else 0.7
+    history_manager = HistoryManager(context_limit=context, reserve_tokens=256, drop_to=drop_to)
+    state = {}
+
+    rows = []
+    for turn, (notice, user, tool, answer) in enumerate(session):
+        if notice:
+            history.append({"role": "system", "content": notice})
+        history.append({"role": "user", "content": user})
+        history.append({"role": "tool", "content": tool, "name": "search_notes"})
+
+        messages = history_manager.build(history, state=None if mode == "append" else state)
+        if mode == "no reuse":
+            messages = [dict(messages[0], content=f"Turn {turn}. " + messages[0]["content"])] + messages[1:]
+
+        kwargs = manager.request_kwargs()
+        kwargs["options"] = dict(kwargs["options"], num_predict=1)
+        response = ollama.chat(model=manager.model, messages=messages, stream=False, **kwargs)
+        t = manager.timings(response)
+        rows.append((history_manager.count(messages), t["prompt_eval_tokens"], t["prompt_eval_ms"]))
+        history.append({"role": "assistant", "content": answer})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--context", type=int, default=4096, help="num_ctx and history budget")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--modes", default="no reuse,append,hysteresis")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    manager = ModelManager(args.model, num_ctx=args.context)
+    if not manager.wait_until_ready(timeout=10) or not manager.preload():
+        return
+    session = build_session(args.turns, args.seed)
+    print(f"{args.turns} turns, num_ctx {args.context}, model {args.model}")
+
+    for mode in args.modes.split(","):
+        rows = run(mode, session, manager, args.context, args.seed)
+        sent = sum(r[0] for r in rows)
+        evaluated = sum(r[1] for r in rows)
+        eval_ms = [r[2] for r in rows]
+        print(f"{mode:11s} prompt eval p50 {statistics.median(eval_ms):7.1f} ms   max {max(eval_ms):7.1f} ms   "
+              f"total {sum(eval_ms) / 1000:6.1f} s   tokens evaluated {evaluated}/{sent} sent (~est.)")
+
+
+if __name__ == "__main__":
+    main()
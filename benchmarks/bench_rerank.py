@@ -0,0 +1,80 @@
+"""
+Cross-encoder reranking: answer-context precision against added latency.
+
+Uses the same self-labelled queries as bench_retrieval (rare tokens of a sampled chunk,
+every chunk containing all of them is relevant) and compares plain hybrid retrieval
+with hybrid + rerank at a few latency budgets. precision@k is the share of the k chunks
+handed to the LLM that are relevant.
+
+    python -m benchmarks.bench_rerank --db data/chroma_db --queries 100 -k 5 --budgets 0,100,300
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.rag.vector_store import VectorStore
+from src.rag.reranker import CrossEncoderReranker
+from src.mcp.tools import ToolSet
+from benchmarks.bench_retrieval import build_queries
+
+
+def evaluate(name, search, queries, k, baseline_ms=None):
+    precisions = []
+    latencies = []
+    for query, relevant in queries:
+        start = time.perf_counter()
+        ids = search(query)[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        precisions.append(len(relevant & set(ids)) / k)
+    median = statistics.median(latencies)
+    added = f"   +{median - baseline_ms:6.1f} ms" if baseline_ms is not None else ""
+    print(f"{name:22s} precision@{k} {statistics.mean(precisions):.3f}   latency p50 {median:6.1f} ms{added}")
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="data/chroma_db")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--terms", type=int, default=2, help="rare tokens per query")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--budgets", default="0,100,300", help="latency budgets in ms, 0 = unlimited")
+    parser.add_argument("--model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store = VectorStore(persistence_path=args.db)
+    if store.collection.count() == 0:
+        print("Collection is empty, index some notes first.")
+        return
+
+    tools = ToolSet(store, ingestor=None)
+    queries = build_queries(store, args.queries, args.terms, args.seed)
+    print(f"{len(queries)} queries over {store.collection.count()} chunks, {args.candidates} candidates reranked")
+    store.query("warm up", n_results=args.k)
+
+    baseline = evaluate("hybrid", lambda q: tools._hybrid_query(q, args.k)['ids'][0], queries, args.k)
+
+    for budget in [int(b) for b in args.budgets.split(",")]:
+        # fresh reranker per budget so the score cache does not carry over
+        reranker = CrossEncoderReranker(model_name=args.model, latency_budget_ms=budget)
+        reranker.load()
+
+        def search(q):
+            candidates = tools._hybrid_query(q, args.candidates)
+            return reranker.rerank(q, candidates, args.k)[0]['ids'][0]
+
+        label = f"rerank (budget {budget or 'none'})"
+        evaluate(label, search, queries, args.k, baseline)
+        stats = reranker.get_stats()
+        print(f"{'':22s} fallbacks {stats['fallback_rate']:.0%}   avg rerank {stats['avg_ms']:.1f} ms")
+        evaluate(label + " warm", search, queries, args.k, baseline)
+
+
+if __name__ == "__main__":
+    main()
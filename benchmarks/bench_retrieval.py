@@ -0,0 +1,86 @@
+"""
+Dense vs hybrid (dense + BM25, RRF) retrieval: recall and latency.
+
+Queries are sampled from the indexed chunks themselves: for each sampled chunk we take
+its rarest tokens (identifiers, numbers, course codes...) as the query, and every chunk
+that contains all of those tokens counts as relevant.
+
+    python -m benchmarks.bench_retrieval --db data/chroma_db --queries 100 -k 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.rag.vector_store import VectorStore
+from src.rag.keyword_index import tokenize
+from src.mcp.tools import ToolSet
+
+
+def build_queries(store, n_queries, terms_per_query, seed):
+    data = store.collection.get(include=['documents'])
+    docs = dict(zip(data['ids'], data['documents']))
+    token_sets = {chunk_id: set(tokenize(doc)) for chunk_id, doc in docs.items()}
+    df = {}
+    for tokens in token_sets.values():
+        for t in tokens:
+            df[t] = df.get(t, 0) + 1
+
+    rng = random.Random(seed)
+    sample = rng.sample(list(docs), min(n_queries, len(docs)))
+    queries = []
+    for chunk_id in sample:
+        rare = sorted(token_sets[chunk_id], key=lambda t: (df[t], t))[:terms_per_query]
+        if not rare:
+            continue
+        relevant = {cid for cid, tokens in token_sets.items() if all(t in tokens for t in rare)}
+        queries.append((" ".join(rare), relevant))
+    return queries
+
+
+def evaluate(name, search, queries, k):
+    recalls = []
+    latencies = []
+    for query, relevant in queries:
+        start = time.perf_counter()
+        ids = search(query)[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(relevant & set(ids)) / min(len(relevant), k))
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+    print(f"{name:8s} recall@{k} {statistics.mean(recalls):.3f}   "
+          f"latency p50 {statistics.median(latencies):6.1f} ms   p95 {p95:6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="data/chroma_db")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--terms", type=int, default=2, help="rare tokens per query")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store = VectorStore(persistence_path=args.db)
+    if store.collection.count() == 0:
+        print("Collection is empty, index some notes first.")
+        return
+
+    tools = ToolSet(store, ingestor=None)
+    queries = build_queries(store, args.queries, args.terms, args.seed)
+    print(f"{len(queries)} queries over {store.collection.count()} chunks")
+
+    # warm the model and caches so the first query does not skew latency
+    store.query("warm up", n_results=args.k)
+
+    evaluate("dense", lambda q: store.query(q, n_results=args.k)['ids'][0], queries, args.k)
+    evaluate("bm25", lambda q: store.keyword_query(q, n_results=args.k)['ids'][0], queries, args.k)
+    evaluate("hybrid", lambda q: tools._hybrid_query(q, args.k)['ids'][0], queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
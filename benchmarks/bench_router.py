@@ -0,0 +1,78 @@
+"""
+Intent router: how many turns skip the planning LLM call, how often the routed tool is
+the wrong one, and what routing costs.
+
+The labelled messages below are not the router's exemplars. "llm" means the model should
+plan the turn (scoped searches, follow-ups, small talk), routing those is counted as wrong.
+
+    python -m benchmarks.bench_router --threshold 0.55 --planning-ms 900
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.rag.embeddings import EmbeddingService
+from src.mcp.router import IntentRouter
+
+LABELLED = [
+    ("what files have you got", "list_notes"),
+    ("list every document I gave you", "list_notes"),
+    ("show my uploaded notes", "list_notes"),
+    ("which pdfs can you read", "list_notes"),
+    ("what is a hash table", "search_notes"),
+    ("explain dijkstra's algorithm", "search_notes"),
+    ("how is goodwill calculated", "search_notes"),
+    ("teach me about amortization", "search_notes"),
+    ("summarize the notes about recursion", "search_notes"),
+    ("what does the term liquidity mean", "search_notes"),
+    ("what are the properties of a heap", "search_notes"),
+    ("describe the accrual basis of accounting", "search_notes"),
+    ("which notes cover depreciation", "llm"),
+    ("which files mention the BFS algorithm", "llm"),
+    ("what notes do you have about hashing", "llm"),
+    ("summarize chapter 3", "llm"),
+    ("what is on page 12 of graphs.pdf", "llm"),
+    ("explain it more simply", "llm"),
+    ("thanks!", "llm"),
+    ("good morning", "llm"),
+    ("can you turn that into a table", "llm"),
+    ("write me a haiku", "llm"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threshold", type=float, default=0.55)
+    parser.add_argument("--margin", type=float, default=0.08)
+    parser.add_argument("--planning-ms", type=float, default=900.0,
+                        help="time of one planning LLM call, to estimate the time saved")
+    args = parser.parse_args()
+
+    router = IntentRouter(EmbeddingService(cache_path=None), threshold=args.threshold, margin=args.margin)
+    router.route("warm up")
+
+    routed = 0
+    wrong = 0
+    latencies = []
+    for message, expected in LABELLED:
+        start = time.perf_counter()
+        decision = router.route(message)
+        latencies.append((time.perf_counter() - start) * 1000)
+        got = decision[0] if decision else "llm"
+        if decision:
+            routed += 1
+            wrong += got != expected
+        mark = "ok" if got == expected else ("WRONG" if decision else "missed")
+        print(f"  {mark:6s} {got:12s} {message}")
+
+    print(f"Routed {routed}/{len(LABELLED)} turns, {wrong} to the wrong tool")
+    print(f"Route latency p50 {statistics.median(latencies):.1f} ms, max {max(latencies):.1f} ms")
+    print(f"LLM round trips saved {routed}, ~{routed * args.planning_ms / 1000:.1f} s at {args.planning_ms:.0f} ms per planning call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Load test for the chat and status SSE endpoints.
+
+Opens --sse status streams and keeps them open, then runs --chats concurrent
+/api/message/stream requests (each client with its own session) while a probe
+keeps requesting a cheap page. Run it once against the Flask dev server and once
+against the ASGI server to compare:
+
+    python app.py            &  python -m benchmarks.load_test --sse 200 --chats 8
+    python app.py --asgi     &  python -m benchmarks.load_test --sse 200 --chats 8
+
+Reports how many SSE clients got connected, chat time-to-first-token / total time,
+probe latency under load, errors, and the server's thread count if --pid is given.
+"""
+import argparse
+import threading
+import time
+
+import requests
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def fmt(values):
+    if not values:
+        return "-"
+    return f"p50 {percentile(values, 0.5):7.1f} ms   p95 {percentile(values, 0.95):7.1f} ms"
+
+
+class SSEClient(threading.Thread):
+    def __init__(self, url, stop, connect_timeout):
+        super().__init__(daemon=True)
+        self.url = url
+        self.stop = stop
+        self.connect_timeout = connect_timeout
+        self.connected_ms = None
+        self.events = 0
+        self.error = None
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            with requests.get(self.url, stream=True, timeout=(self.connect_timeout, 60)) as r:
+                r.raise_for_status()
+                self.connected_ms = (time.perf_counter() - start) * 1000
+                for line in r.iter_lines():
+                    if self.stop.is_set():
+                        break
+                    if line:
+                        self.events += 1
+        except Exception as e:
+            if not self.stop.is_set():
+                self.error = str(e)
+
+
+def run_chat(base, message, results):
+    session = requests.Session()
+    start = time.perf_counter()
+    first = None
+    try:
+        with session.post(f"{base}/api/message/stream", json={"message": message}, stream=True, timeout=(10, 600)) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if line.startswith(b"data:") and first is None:
+                    first = time.perf_counter()
+        results.append({"ttft_ms": (first - start) * 1000 if first else None,
+                        "total_ms": (time.perf_counter() - start) * 1000, "error": None})
+    except Exception as e:
+        results.append({"ttft_ms": None, "total_ms": None, "error": str(e)})
+
+
+def server_threads(pid):
+    try:
+        import psutil
+        return psutil.Process(pid).num_threads()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--sse", type=int, default=100, help="status stream clients to hold open")
+    parser.add_argument("--chats", type=int, default=4, help="concurrent chat requests")
+    parser.add_argument("--message", default="what notes do I have?")
+    parser.add_argument("--probe-path", default="/static/style.css", help="cheap endpoint to time while under load")
+    parser.add_argument("--connect-timeout", type=float, default=5.0)
+    parser.add_argument("--pid", type=int, default=None, help="server pid, to report its thread count")
+    args = parser.parse_args()
+    base = args.url.rstrip("/")
+
+    print(f"Target {base}: {args.sse} SSE clients, {args.chats} concurrent chats")
+    threads_before = server_threads(args.pid) if args.pid else None
+
+    stop = threading.Event()
+    sse_clients = [SSEClient(f"{base}/api/status/stream", stop, args.connect_timeout) for _ in range(args.sse)]
+    for client in sse_clients:
+        client.start()
+    time.sleep(args.connect_timeout)
+
+    probe_ms = []
+    probe_errors = 0
+    chat_results = []
+    chats = [threading.Thread(target=run_chat, args=(base, args.message, chat_results), daemon=True)
+             for _ in range(args.chats)]
+    for chat in chats:
+        chat.start()
+
+    threads_peak = threads_before
+    while any(chat.is_alive() for chat in chats):
+        start = time.perf_counter()
+        try:
+            requests.get(base + args.probe_path, timeout=10).raise_for_status()
+            probe_ms.append((time.perf_counter() - start) * 1000)
+        except Exception:
+            probe_errors += 1
+        if args.pid:
+            count = server_threads(args.pid)
+            if count is not None:
+                threads_peak = max(threads_peak or 0, count)
+        time.sleep(0.2)
+
+    stop.set()
+    connected = [c for c in sse_clients if c.connected_ms is not None]
+    errors = [c.error for c in sse_clients if c.error]
+    ttft = [r["ttft_ms"] for r in chat_results if r["ttft_ms"] is not None]
+    total = [r["total_ms"] for r in chat_results if r["total_ms"] is not None]
+    chat_errors = [r["error"] for r in chat_results if r["error"]]
+
+    print(f"SSE clients connected  {len(connected)}/{args.sse}   connect {fmt([c.connected_ms for c in connected])}   errors {len(errors)}")
+    print(f"Chat time to 1st event {fmt(ttft)}")
+    print(f"Chat total             {fmt(total)}   errors {len(chat_errors)}")
+    print(f"Probe {args.probe_path:16s} {fmt(probe_ms)}   errors {probe_errors}")
+    if threads_before is not None:
+        print(f"Server threads         {threads_before} before, {threads_peak} peak")
+    if chat_errors:
+        print(f"First chat error: {chat_errors[0]}")
+    if errors:
+        print(f"First SSE error: {errors[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import math
+import re
+import threading
+
+SOURCE_PATTERN = re.compile(r"--- Source: (.+?) \(Page (\S+?)\) ---")
+# Line of a system notice that carries the runtime status (get_status_notice in app.py)
+STATUS_PREFIX = "SYSTEM STATUS:"
+
+
+def estimate_tokens(text):
+    """
+    Rough token count, about 4 characters per token for llama-style tokenizers.
+    """
+    if not text:
+        return 0
+    return max(1, math.ceil(len(text) / 4))
+
+
+class HistoryManager:
+    """
+    Builds the message list sent to Ollama from a conversation history
+    so that it fits a token budget.
+
+    - the system prompt (first message) is always kept
+    - tool results of older turns are replaced by a one-line summary
+    - if that is not enough the oldest turns are dropped, down to drop_to * budget so the
+      next turns fit again without another cut (every cut changes the prompt prefix and
+      Ollama has to evaluate the whole prompt again)
+    - the status is only sent when it changes, so if the turn with the latest status line
+      was dropped that line is pinned right after the system prompt
+    The stored history itself is never modified, only the copy that is sent.
+    """
+    def __init__(self, context_limit=8192, reserve_tokens=1024, keep_recent_turns=1, token_counter=estimate_tokens,
+                 drop_to=0.7):
+        self.context_limit = context_limit
+        self.reserve_tokens = reserve_tokens
+        self.keep_recent_turns = max(1, keep_recent_turns)
+        self.drop_to = drop_to
+        self.token_counter = token_counter
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "prompt_tokens_total": 0,
+            "prompt_tokens_saved_total": 0,
+            "cuts": 0,
+            "last": {}
+        }
+
+    @property
+    def budget(self):
+        return self.context_limit - self.reserve_tokens
+
+    def count_message(self, message):
+        # a few tokens of chat-template overhead per message
+        tokens = 4 + self.token_counter(message.get("content") or "")
+        if message.get("tool_calls"):
+            tokens += self.token_counter(str(message["tool_calls"]))
+        return tokens
+
+    def count(self, messages):
+        return sum(self.count_message(m) for m in messages)
+
+    def _split_turns(self, messages):
+        """
+        Group messages into turns, each turn starts at a user message.
+        Keeping whole turns keeps tool_calls and their tool results together.
+        System notices right before a user message belong to that message's turn.
+        """
+        turns = []
+        current = []
+        for message in messages:
+            if message.get("role") == "user" and current:
+                lead = []
+                while current and current[-1].get("role") == "system":
+                    lead.insert(0, current.pop())
+                if current:
+                    turns.append(current)
+                current = lead
+            current.append(message)
+        if current:
+            turns.append(current)
+        return turns
+
+    @staticmethod
+    def _latest_status(turns):
+        for turn in reversed(turns):
+            for message in reversed(turn):
+                if message.get("role") != "system":
+                    continue
+                for line in reversed((message.get("content") or "").splitlines()):
+                    if line.startswith(STATUS_PREFIX):
+                        return line
+        return None
+
+    def _compact_tool_message(self, message):
+        content = message.get("content") or ""
+        name = message.get("name") or "tool"
+        sources = []
+        for filename, page in SOURCE_PATTERN.findall(content):
+            ref = f"{filename} p.{page}"
+            if ref not in sources:
+                sources.append(ref)
+        if sources:
+            summary = f"[Earlier {name} result compacted. Sources: {', '.join(sources)}]"
+        else:
+            first_line = content.strip().split("\n", 1)[0][:200]
+            summary = f"[Earlier {name} result compacted: {first_line}]"
+        if len(summary) >= len(content):
+            return message
+        compacted = dict(message)
+        compacted["content"] = summary
+        return compacted
+
+    def _truncate_tool_messages(self, turn, overflow):
+        """
+        Last resort for a single huge turn: cut the tool results down.
+        """
+        tool_indexes = [i for i, m in enumerate(turn) if m.get("role") == "tool"]
+        if not tool_indexes:
+            return turn
+        # tokens ~ 4 chars, cut the overflow evenly from every tool result
+        cut_chars = math.ceil(overflow * 4 / len(tool_indexes))
+        turn = list(turn)
+        for i in tool_indexes:
+            content = turn[i].get("content") or ""
+            keep = max(0, len(content) - cut_chars)
+            truncated = dict(turn[i])
+            truncated["content"] = content[:keep] + "\n[...truncated to fit context window]"
+            turn[i] = truncated
+        return turn
+
+    def build(self, history, turn_stats=None, state=None):
+        """
+        Return the messages to send for this call.
+        If turn_stats (a dict) is given, prompt token counts of this call are added to it
+        so a caller can report per-turn totals.
+        state is a per-conversation dict, turns dropped on an earlier call stay dropped
+        so the prefix sent stays the same from call to call.
+        """
+        if not history:
+            return []
+
+        pinned = [history[0]] if history[0].get("role") == "system" else []
+        all_turns = self._split_turns(history[len(pinned):])
+        turns = list(all_turns)
+        dropped = 0
+        if state is not None:
+            dropped = min(state.get("dropped_turns", 0), max(0, len(turns) - 1))
+            turns = turns[dropped:]
+
+        # 1. Summarize tool results of older turns
+        recent = len(turns) - self.keep_recent_turns
+        for i in range(max(0, recent)):
+            turns[i] = [
+                self._compact_tool_message(m) if m.get("role") == "tool" else m
+                for m in turns[i]
+            ]
+
+        # 2. Drop oldest turns until we are inside the budget
+        pinned_tokens = self.count(pinned)
+        turn_tokens = [self.count(t) for t in turns]
+        total = pinned_tokens + sum(turn_tokens)
+        if total > self.budget:
+            with self._lock:
+                self.stats["cuts"] += 1
+            target = self.budget * self.drop_to
+            while len(turns) > 1 and total > target:
+                total -= turn_tokens.pop(0)
+                turns.pop(0)
+                dropped += 1
+        if state is not None:
+            state["dropped_turns"] = dropped
+
+        # the status the model was last told went out with a dropped turn: pin it. It only
+        # changes when turns are dropped or the status changes, so the prefix stays stable
+        if dropped and self._latest_status(turns) is None:
+            status = self._latest_status(all_turns[:dropped])
+            if status:
+                pinned = pinned + [{"role": "system", "content": status}]
+                total += self.count(pinned[-1:])
+
+        # 3. A single turn can still be too large (big tool dumps)
+        if turns and total > self.budget:
+            turns[-1] = self._truncate_tool_messages(turns[-1], total - self.budget)
+
+        messages = pinned + [m for turn in turns for m in turn]
+        self._record(history, messages, turn_stats)
+        return messages
+
+    def _record(self, history, messages, turn_stats):
+        raw = self.count(history)
+        sent = self.count(messages)
+        if turn_stats is not None:
+            turn_stats["prompt_tokens"] = turn_stats.get("prompt_tokens", 0) + sent
+            turn_stats["prompt_tokens_saved"] = turn_stats.get("prompt_tokens_saved", 0) + raw - sent
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_tokens_total"] += sent
+            self.stats["prompt_tokens_saved_total"] += raw - sent
+            self.stats["last"] = {
+                "history_tokens": raw,
+                "prompt_tokens": sent,
+                "prompt_tokens_saved": raw - sent,
+                "messages_sent": len(messages),
+                "messages_total": len(history)
+            }
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["last"] = dict(self.stats["last"])
+            return stats
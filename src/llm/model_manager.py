@@ -0,0 +1,145 @@
+import threading
+import time
+import ollama
+
+# Ollama reports durations in nanoseconds
+NS_PER_MS = 1e6
+
+
+class ModelManager:
+    """
+    Keeps the chat model loaded and ready.
+
+    - wait_until_ready() polls the Ollama server instead of sleeping a fixed time
+    - preload() loads the model and runs a tiny warm-up chat at startup, so the first user
+      request does not pay the model load
+    - every call goes out with the same keep_alive and num_ctx (request_kwargs()), a different
+      num_ctx would make Ollama reload the model and a short keep_alive lets it unload it
+      between sparse requests
+    - record() collects load / prompt eval / eval timings from the final chunk of each call
+    """
+    def __init__(self, model, num_ctx=8192, keep_alive="30m", cold_load_ms=500):
+        self.model = model
+        self.num_ctx = num_ctx
+        self.keep_alive = keep_alive
+        # a load_duration above this means the call had to load the model
+        self.cold_load_ms = cold_load_ms
+        self.ready = threading.Event()
+        self.warm = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {
+            "ready_ms": None,
+            "preload_ms": None,
+            "calls": 0,
+            "cold_loads": 0,
+            "load_ms": 0.0,
+            "prompt_eval_tokens": 0,
+            "prompt_eval_ms": 0.0,
+            "eval_tokens": 0,
+            "eval_ms": 0.0,
+            "last": {}
+        }
+
+    def request_kwargs(self):
+        """
+        Extra ollama.chat arguments for every call.
+        """
+        return {"keep_alive": self.keep_alive, "options": {"num_ctx": self.num_ctx}}
+
+    def wait_until_ready(self, timeout=30, interval=0.25):
+        """
+        Poll the Ollama server until it answers, returns False after timeout seconds.
+        """
+        start = time.perf_counter()
+        deadline = start + timeout
+        while True:
+            try:
+                ollama.list()
+                break
+            except Exception as e:
+                if time.perf_counter() >= deadline:
+                    print(f"Ollama not ready after {timeout}s: {e}")
+                    return False
+                time.sleep(interval)
+        ready_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats["ready_ms"] = round(ready_ms, 1)
+        self.ready.set()
+        print(f"Ollama ready after {ready_ms:.0f} ms")
+        return True
+
+    def preload(self, warm_messages=None, tools=None):
+        """
+        Load the model with the pinned num_ctx and keep_alive and run a one token warm-up chat.
+        If warm_messages (and tools) are given, e.g. the system prompt, they are evaluated now,
+        Ollama keeps that prefix around so the first real request starts from a warm cache.
+        """
+        if not self.ready.is_set() and not self.wait_until_ready():
+            return False
+        start = time.perf_counter()
+        messages = warm_messages or [{"role": "user", "content": "hi"}]
+        kwargs = self.request_kwargs()
+        kwargs["options"] = dict(kwargs["options"], num_predict=1)
+        if tools:
+            kwargs["tools"] = tools
+        try:
+            response = ollama.chat(model=self.model, messages=messages, stream=False, **kwargs)
+        except Exception as e:
+            print(f"Could not preload {self.model}: {e}")
+            return False
+        self.record(response)
+        preload_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats["preload_ms"] = round(preload_ms, 1)
+        self.warm.set()
+        print(f"Model {self.model} loaded and warm in {preload_ms:.0f} ms (num_ctx {self.num_ctx}, keep_alive {self.keep_alive})")
+        return True
+
+    def start(self, warm_messages=None, tools=None):
+        """
+        Wait for Ollama and preload in a background thread, the web server can start meanwhile.
+        """
+        t = threading.Thread(target=self.preload, args=(warm_messages, tools), daemon=True, name="model-preload")
+        t.start()
+        return t
+
+    @staticmethod
+    def timings(chunk):
+        """
+        Timings in ms from the final chunk (or non-streamed response) of an Ollama call.
+        """
+        def ms(key):
+            value = chunk.get(key)
+            return round(value / NS_PER_MS, 1) if value else 0.0
+        return {
+            "load_ms": ms("load_duration"),
+            "prompt_eval_tokens": chunk.get("prompt_eval_count") or 0,
+            "prompt_eval_ms": ms("prompt_eval_duration"),
+            "eval_tokens": chunk.get("eval_count") or 0,
+            "eval_ms": ms("eval_duration"),
+            "total_ms": ms("total_duration")
+        }
+
+    def record(self, chunk):
+        if not chunk:
+            return None
+        t = self.timings(chunk)
+        with self._lock:
+            self.stats["calls"] += 1
+            if t["load_ms"] > self.cold_load_ms:
+                self.stats["cold_loads"] += 1
+                print(f"Model {self.model} was not loaded, this call waited {t['load_ms']:.0f} ms for it")
+            for key in ("load_ms", "prompt_eval_tokens", "prompt_eval_ms", "eval_tokens", "eval_ms"):
+                self.stats[key] += t[key]
+            self.stats["last"] = t
+        return t
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["ready"] = self.ready.is_set()
+        stats["warm"] = self.warm.is_set()
+        stats["prompt_eval_tokens_per_sec"] = (
+            stats["prompt_eval_tokens"] / (stats["prompt_eval_ms"] / 1000) if stats["prompt_eval_ms"] else None
+        )
+        return stats
@@ -0,0 +1,98 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class Conversation:
+    """
+    Chat history of one browser session.
+    The lock serializes turns so tool-call sequences of two requests never interleave.
+    """
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.history = []
+        self.lock = threading.Lock()
+        self.last_active = time.time()
+        # notes for the model (uploads, status changes) sent along with the next turn,
+        # they never need the conversation lock so an upload does not wait for a running turn
+        self.notices = []
+        self._notices_lock = threading.Lock()
+        # last status line the model was told, and which turns are still sent (HistoryManager.build)
+        self.status_notice = None
+        self.prompt_state = {}
+
+    def touch(self):
+        self.last_active = time.time()
+
+    def add_notice(self, text):
+        with self._notices_lock:
+            self.notices.append(text)
+
+    def take_notices(self):
+        with self._notices_lock:
+            notices, self.notices = self.notices, []
+        return notices
+
+    def reset(self, history=None):
+        """
+        Start over (call with the lock held), pending notices are kept.
+        """
+        self.history = history or []
+        self.status_notice = None
+        self.prompt_state = {}
+
+
+class ConversationStore:
+    """
+    Session-keyed conversation store.
+    Keeps at most max_sessions conversations and forgets the least recently used ones
+    (or the ones idle for longer than idle_timeout seconds).
+    """
+    def __init__(self, max_sessions=256, idle_timeout=6 * 3600):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_session_id():
+        return uuid.uuid4().hex
+
+    def get(self, session_id):
+        """
+        Return the conversation for a session, creating it if needed.
+        """
+        with self._lock:
+            conversation = self._conversations.get(session_id)
+            if conversation is None:
+                conversation = Conversation(session_id)
+                self._conversations[session_id] = conversation
+            else:
+                self._conversations.move_to_end(session_id)
+            conversation.touch()
+            self._evict()
+            return conversation
+
+    def clear(self, session_id):
+        with self._lock:
+            conversation = self._conversations.get(session_id)
+        if conversation is not None:
+            with conversation.lock:
+                conversation.reset()
+
+    def all(self):
+        with self._lock:
+            return list(self._conversations.values())
+
+    def _evict(self):
+        # Called with self._lock held. Busy conversations (lock taken) are never evicted.
+        now = time.time()
+        for session_id, conversation in list(self._conversations.items()):
+            too_many = len(self._conversations) > self.max_sessions
+            idle = now - conversation.last_active > self.idle_timeout
+            if not (too_many or idle):
+                break
+            if conversation.lock.locked():
+                continue
+            del self._conversations[session_id]
@@ -0,0 +1,98 @@
+import time
+import ollama
+
+
+class StreamMetrics:
+    """
+    Tracks time-to-first-token and generation speed for one streamed ollama.chat call.
+    """
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.chunks = 0
+        self.eval_count = None
+        self.eval_duration = None
+        # final chunk, has Ollama's load / prompt eval / eval timings
+        self.done_chunk = None
+
+    def on_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chunks += 1
+
+    def on_done(self, chunk):
+        self.finished_at = time.perf_counter()
+        self.done_chunk = chunk
+        self.eval_count = chunk.get("eval_count")
+        self.eval_duration = chunk.get("eval_duration")
+
+    def ttft_ms(self):
+        if self.first_token_at is None:
+            return None
+        return (self.first_token_at - self.started_at) * 1000
+
+    def tokens_per_sec(self):
+        # Prefer Ollama's own counters (eval_duration is in nanoseconds)
+        if self.eval_count and self.eval_duration:
+            return self.eval_count / (self.eval_duration / 1e9)
+        # Otherwise approximate with streamed chunks over generation time
+        if self.first_token_at is None or self.finished_at is None:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        if elapsed <= 0:
+            return None
+        return self.chunks / elapsed
+
+    def to_dict(self):
+        ttft = self.ttft_ms()
+        tps = self.tokens_per_sec()
+        chunk = self.done_chunk or {}
+        return {
+            "ttft_ms": round(ttft, 1) if ttft is not None else None,
+            "tokens_per_sec": round(tps, 2) if tps is not None else None,
+            "tokens": self.eval_count if self.eval_count is not None else self.chunks,
+            "load_ms": round((chunk.get("load_duration") or 0) / 1e6, 1),
+            "prompt_eval_ms": round((chunk.get("prompt_eval_duration") or 0) / 1e6, 1)
+        }
+
+
+def stream_chat(model, messages, tools=None, metrics=None, options=None, keep_alive=None):
+    """
+    Stream a chat completion from Ollama.
+    Yields ("token", text) for every content piece as it arrives and finishes with
+    ("message", message) where message is the assembled assistant message
+    (content plus any tool calls the model requested).
+    options / keep_alive are passed through to Ollama (see ModelManager.request_kwargs).
+    """
+    kwargs = {"model": model, "messages": messages, "stream": True}
+    if tools:
+        kwargs["tools"] = tools
+    if options:
+        kwargs["options"] = options
+    if keep_alive is not None:
+        kwargs["keep_alive"] = keep_alive
+
+    content = []
+    tool_calls = []
+    for chunk in ollama.chat(**kwargs):
+        message = chunk.get("message") or {}
+
+        text = message.get("content") or ""
+        if text:
+            if metrics:
+                metrics.on_token()
+            content.append(text)
+            yield "token", text
+
+        if message.get("tool_calls"):
+            tool_calls.extend(message["tool_calls"])
+
+        if chunk.get("done"):
+            if metrics:
+                metrics.on_done(chunk)
+
+    assembled = {"role": "assistant", "content": "".join(content)}
+    if tool_calls:
+        assembled["tool_calls"] = tool_calls
+    yield "message", assembled
@@ -0,0 +1,133 @@
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class ToolExecutor:
+    """
+    Runs the tool calls of one model turn concurrently.
+
+    - every call gets its own timeout (per tool name, default_timeout otherwise);
+      a call that runs over it returns an error result, the turn does not wait for it
+    - results come back in the order of the calls, so they land in chat_hist as the model asked
+    - a timed out call can't be killed and keeps its worker until it returns ("stuck");
+      a tool with max_stuck_per_tool stuck calls, or a pool whose workers are all stuck,
+      gets new calls refused straight away instead of queueing them behind the hung ones
+    - latency per tool is kept in stats
+    """
+    def __init__(self, call_tool, max_workers=4, timeouts=None, default_timeout=30, max_stuck_per_tool=1):
+        self.call_tool = call_tool
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_workers = max_workers
+        self.max_stuck_per_tool = max_stuck_per_tool
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._lock = threading.Lock()
+        # tool name -> timed out calls still holding a worker
+        self._stuck = {}
+        self.stats = {}
+
+    def _timed_call(self, name, arguments):
+        start = time.perf_counter()
+        try:
+            result = self.call_tool(name, arguments)
+        except Exception as e:
+            result = f"Error executing tool {name}: {str(e)}"
+        return result, (time.perf_counter() - start) * 1000
+
+    def run(self, calls):
+        """
+        calls: list of (name, arguments).
+        Returns [{"name", "result", "ms", "timed_out", "rejected"}] in the same order.
+        """
+        start = time.perf_counter()
+        futures = []
+        for name, arguments in calls:
+            refusal = self._refusal(name)
+            if refusal:
+                futures.append(refusal)
+                continue
+            # tools run with the caller's context (e.g. ResourceScheduler's "inside a chat turn"),
+            # a context can only be entered by one thread at a time so every call gets a copy
+            futures.append(self._pool.submit(contextvars.copy_context().run, self._timed_call, name, arguments))
+
+        outcomes = []
+        for (name, _), future in zip(calls, futures):
+            if isinstance(future, str):
+                print(f"Refused tool call {name}: {future}")
+                outcomes.append({"name": name, "result": future, "ms": 0.0, "timed_out": False, "rejected": True})
+                self._record(name, 0.0, False, rejected=True)
+                continue
+            timeout = self.timeouts.get(name, self.default_timeout)
+            # every call's clock started at submit time, not when we get around to waiting on it
+            remaining = max(0.0, start + timeout - time.perf_counter())
+            try:
+                result, ms = future.result(timeout=remaining)
+                timed_out = False
+            except TimeoutError:
+                result = f"Error: tool {name} did not finish within {timeout}s."
+                ms = timeout * 1000
+                timed_out = True
+                self._mark_stuck(name, future)
+            outcomes.append({"name": name, "result": result, "ms": round(ms, 1), "timed_out": timed_out,
+                             "rejected": False})
+            self._record(name, ms, timed_out)
+
+        if len(calls) > 1:
+            wall_ms = (time.perf_counter() - start) * 1000
+            summed = sum(o["ms"] for o in outcomes)
+            print(f"Ran {len(calls)} tools in {wall_ms:.0f} ms ({summed:.0f} ms if run one after another)")
+        return outcomes
+
+    def _refusal(self, name):
+        """
+        Error text if a call to this tool should not be submitted right now, else None.
+        """
+        with self._lock:
+            if self._stuck.get(name, 0) >= self.max_stuck_per_tool:
+                return f"Error: tool {name} is still busy with an earlier call that timed out, try again later."
+            if sum(self._stuck.values()) >= self.max_workers:
+                return f"Error: no tool workers free (all busy with calls that timed out), {name} was not run."
+        return None
+
+    def _mark_stuck(self, name, future):
+        # still queued: it never got a worker, so it just never runs
+        if future.cancel():
+            return
+        with self._lock:
+            self._stuck[name] = self._stuck.get(name, 0) + 1
+        # runs right away if the call finished in the meantime
+        future.add_done_callback(lambda _, name=name: self._release(name))
+
+    def _release(self, name):
+        with self._lock:
+            self._stuck[name] -= 1
+            if not self._stuck[name]:
+                del self._stuck[name]
+
+    def _record(self, name, ms, timed_out, rejected=False):
+        with self._lock:
+            entry = self.stats.setdefault(
+                name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "timeouts": 0, "rejected": 0}
+            )
+            if rejected:
+                entry["rejected"] += 1
+                return
+            entry["calls"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            if timed_out:
+                entry["timeouts"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = {name: dict(entry) for name, entry in self.stats.items()}
+            for name, entry in stats.items():
+                entry["stuck"] = self._stuck.get(name, 0)
+        for entry in stats.values():
+            entry["avg_ms"] = entry["total_ms"] / entry["calls"] if entry["calls"] else 0.0
+        return stats
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,202 @@
+import re
+import time
+import threading
+import numpy as np
+
+# Wording that asks WHICH files exist (also used for malformed tool calls, see infer_tool_call)
+INVENTORY_MARKERS = [
+    "what notes do", "what files do", "what documents do",
+    "list notes", "list files", "list documents",
+    "show notes", "show files", "show documents",
+    "which notes", "which files"
+]
+# Wording that asks for CONTENT
+CONTENT_MARKERS = ["teach", "explain", "what is", "how", "summarize", "according to", "from my notes"]
+
+# Scoped questions (a chapter, pages, one file) need the model to fill in the search_notes filters
+SCOPE_PATTERN = re.compile(r"\b(chapter|module|unit|lecture|page|pages|pg)\b|\b\w+\.(pdf|txt|md|docx?)\b", re.I)
+# Short follow-ups that only make sense with the previous turns ("explain it again")
+FOLLOWUP_PATTERN = re.compile(r"\b(it|that|this|these|those|them|they|again|more|shorter|longer|above)\b", re.I)
+# Words that can go with an inventory marker without naming a topic ("which files do you have so far?")
+INVENTORY_FILLER = set("""
+    a all any are can did do does every have got i in is me my of please right so far now search
+    system the there uploaded upload you your yet
+""".split())
+
+
+def is_followup(text):
+    """
+    Short message that leans on the earlier turns ("explain it again").
+    """
+    return len(text.split()) <= 6 and bool(FOLLOWUP_PATTERN.search(text))
+
+
+def has_topic(text):
+    """
+    True if an inventory-style message is about something ("which notes cover depreciation"),
+    i.e. words are left over once the inventory marker and filler words are removed.
+    """
+    lowered = text.lower()
+    for marker in INVENTORY_MARKERS:
+        lowered = lowered.replace(marker, " ")
+    return any(word not in INVENTORY_FILLER for word in re.findall(r"[a-z0-9]+", lowered))
+
+
+EXEMPLARS = {
+    "list_notes": [
+        "what notes do you have",
+        "list my files",
+        "show me the documents I uploaded",
+        "which files are in my notes",
+        "what have I uploaded so far",
+        "what documents can you search",
+    ],
+    "search_notes": [
+        "what is depreciation",
+        "explain breadth first search",
+        "teach me impairment of assets",
+        "how does hashing work",
+        "summarize the notes on sorting algorithms",
+        "define a binary search tree",
+        "what are the types of inventory valuation",
+        "according to my notes what is a ledger",
+        "give me the formula for compound interest",
+        "difference between a stack and a queue",
+    ],
+    "other": [
+        "hi",
+        "hello how are you",
+        "thanks that helps",
+        "can you make it shorter",
+        "explain that again in simpler words",
+        "write a poem about the sea",
+        "what did I just ask you",
+        "translate the previous answer to french",
+    ],
+}
+
+
+class IntentRouter:
+    """
+    Decides the obvious tool calls without asking the LLM.
+
+    The message is embedded with the same MiniLM model as the notes and compared with a few
+    labelled exemplars per intent (list_notes / search_notes / other), the keyword markers
+    of infer_tool_call back it up. Only a confident list_notes or search_notes is routed,
+    anything else (scoped searches, follow-ups, small talk, close calls) goes the normal way
+    where the model plans the tool calls itself.
+
+    A routed turn needs one LLM call instead of two, stats count the round trips saved and
+    estimate the time saved from how long planning calls take on unrouted turns.
+    """
+    def __init__(self, embedder, exemplars=None, threshold=0.55, margin=0.08):
+        self.embedder = embedder
+        self.exemplars = exemplars or EXEMPLARS
+        self.threshold = threshold
+        self.margin = margin
+        self._labels = None
+        self._matrix = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "routed": {},
+            "deferred": 0,
+            "round_trips_saved": 0,
+            "route_ms": 0.0,
+            "planning_calls": 0,
+            "planning_ms": 0.0,
+            "ms_saved": 0.0
+        }
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+    def _load(self):
+        with self._lock:
+            if self._matrix is None:
+                labels, texts = [], []
+                for label, examples in self.exemplars.items():
+                    labels.extend([label] * len(examples))
+                    texts.extend(examples)
+                self._matrix = self._normalize(self.embedder.embed(texts))
+                self._labels = labels
+        return self._labels, self._matrix
+
+    def scores(self, message):
+        """
+        Best exemplar similarity per intent.
+        """
+        labels, matrix = self._load()
+        query = self._normalize(self.embedder.embed_query(message))
+        similarities = matrix @ query
+        best = {}
+        for label, score in zip(labels, similarities):
+            best[label] = max(best.get(label, -1.0), float(score))
+        return best
+
+    def route(self, message):
+        """
+        (tool name, arguments) for a confident case, None to let the model decide.
+        """
+        start = time.perf_counter()
+        decision = self._decide(message)
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats["route_ms"] += elapsed
+            if decision is None:
+                self.stats["deferred"] += 1
+            else:
+                routed = self.stats["routed"]
+                routed[decision[0]] = routed.get(decision[0], 0) + 1
+                self.stats["round_trips_saved"] += 1
+                # a routed turn skips one planning call
+                if self.stats["planning_calls"]:
+                    avg_planning = self.stats["planning_ms"] / self.stats["planning_calls"]
+                    self.stats["ms_saved"] += max(0.0, avg_planning - elapsed)
+        return decision
+
+    def _decide(self, message):
+        text = message.strip()
+        lowered = text.lower()
+        if not text or SCOPE_PATTERN.search(text):
+            return None
+        if is_followup(text):
+            return None
+
+        is_inventory = any(m in lowered for m in INVENTORY_MARKERS)
+        is_content = any(m in lowered for m in CONTENT_MARKERS)
+        # "which notes cover depreciation" wants content, not the file list
+        topical = has_topic(text)
+        if is_inventory and not is_content and not topical:
+            return "list_notes", {}
+
+        scores = self.scores(text)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (label, best), (_, second) = ranked[0], ranked[1]
+        # keyword agreement lowers the bar a little, disagreement defers
+        threshold = self.threshold - (0.05 if is_content and label == "search_notes" else 0.0)
+        if label == "other" or best < threshold or best - second < self.margin:
+            return None
+        if label == "list_notes" and (is_content or topical):
+            return None
+        if label == "list_notes":
+            return "list_notes", {}
+        return "search_notes", {"query": text}
+
+    def record_planning(self, ms):
+        """
+        Duration of a planning call (an LLM call that ended in tool calls) on an unrouted turn.
+        """
+        with self._lock:
+            self.stats["planning_calls"] += 1
+            self.stats["planning_ms"] += ms
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["routed"] = dict(self.stats["routed"])
+        routed = sum(stats["routed"].values())
+        stats["routed_rate"] = routed / (routed + stats["deferred"]) if routed + stats["deferred"] else 0.0
+        return stats
@@ -15,7 +15,9 @@ class MCPServer:
                     "Examples:\n"
                     "- User: 'What is the definition of depreciation?' -> Tool Call: search_notes('definition of depreciation')\n"
                     "- User: 'Explain the difference between BFS and DFS' -> Tool Call: search_notes('BFS vs DFS difference')\n"
-                    "- User: 'How does the transformer architecture work?' -> Tool Call: search_notes('transformer architecture mechanism')"
+                    "- User: 'How does the transformer architecture work?' -> Tool Call: search_notes('transformer architecture mechanism')\n"
+                    "- User: 'Explain topic X from module 3' -> Tool Call: search_notes('topic X', chapter='module 3')\n"
+                    "- User: 'What does page 4-6 of graphs.pdf say about BFS?' -> Tool Call: search_notes('BFS', filename='graphs.pdf', page_start=4, page_end=6)"
                 ),
                 "parameters": {
                     "type": "object",
@@ -23,6 +25,22 @@ class MCPServer:
                         "query": {
                             "type": "string",
                             "description": "The specific topic, concept, or question to search for in the vector database."
+                        },
+                        "filename": {
+                            "type": "string",
+                            "description": "Optional. Only search this document (full or partial filename)."
+                        },
+                        "page_start": {
+                            "type": "integer",
+                            "description": "Optional. First page to search."
+                        },
+                        "page_end": {
+                            "type": "integer",
+                            "description": "Optional. Last page to search."
+                        },
+                        "chapter": {
+                            "type": "string",
+                            "description": "Optional. Only search notes of this chapter/module/unit, e.g. 'chapter 5' or 'module 2'."
                         }
                     },
                     "required": ["query"]
@@ -78,6 +96,14 @@ class MCPServer:
     def get_tool_definitions(self):
         return self.tool_definitions
 
+    @staticmethod
+    def _as_page(value):
+        # models sometimes send numbers as strings
+        try:
+            return int(value) if value not in (None, "") else None
+        except (TypeError, ValueError):
+            return None
+
     def call_tool(self, tool_name, arguments):
         """
         Execute a tool call.
@@ -89,7 +115,13 @@ class MCPServer:
                 pass # might be a raw string if simple
         
         if tool_name == "search_notes":
-            return self.tools.search_notes(arguments.get("query"))
+            return self.tools.search_notes(
+                arguments.get("query"),
+                filename=arguments.get("filename") or None,
+                page_start=self._as_page(arguments.get("page_start")),
+                page_end=self._as_page(arguments.get("page_end")),
+                chapter=arguments.get("chapter") or None
+            )
         elif tool_name == "list_notes":
             return self.tools.list_notes()
         elif tool_name == "search_internet":
@@ -1,6 +1,10 @@
 from src.rag.vector_store import VectorStore
 from src.rag.ingestor import Ingestor
+from src.rag.retrieval_cache import RetrievalCache
+from src.rag.keyword_index import fuse_rrf
+from src.rag.context_packer import ContextPacker
 import os
+import time
 import requests
 import google.generativeai as genai
 from dotenv import load_dotenv
@@ -8,9 +12,17 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class ToolSet:
-    def __init__(self, vector_store: VectorStore, ingestor: Ingestor):
+    def __init__(self, vector_store: VectorStore, ingestor: Ingestor, reranker=None, rerank_candidates=20,
+                 context_packer=None):
         self.vector_store = vector_store
         self.ingestor = ingestor
+        self.retrieval_cache = RetrievalCache()
+        self.context_packer = context_packer or ContextPacker()
+        # Optional CrossEncoderReranker: over-fetch rerank_candidates chunks, keep the best few
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        if self.reranker:
+            self.reranker.preload()
         
         # Configure Gemini
         api_key = os.getenv("GEMINI_API_KEY")
@@ -37,27 +49,109 @@ class ToolSet:
         except Exception as e:
             return f"Error searching internet (Gemini): {str(e)}"
 
-    def search_notes(self, query: str) -> str:
+    def search_notes(self, query: str, filename: str = None, page_start: int = None,
+                     page_end: int = None, chapter: str = None) -> str:
         """
         Search the vector database for relevant notes.
+        filename, page_start/page_end and chapter (a key of the chapter map) narrow the search.
         """
-        print(f"Tool Call: search_notes('{query}')")
-        print(f"Status: Querying vector database for '{query}'...")
-        results = self.vector_store.query(query)
-        
-        # Format results
-        formatted_results = []
-        if results and results['documents']:
-            for i, doc in enumerate(results['documents'][0]):
-                meta = results['metadatas'][0][i]
-                source = meta.get('filename', 'unknown')
-                page = meta.get('page', 'unknown')
-                formatted_results.append(f"--- Source: {source} (Page {page}) ---\n{doc}\n")
+        print(f"Tool Call: search_notes('{query}', filename={filename}, pages={page_start}-{page_end}, chapter={chapter})")
+        scope, note = self._resolve_scope(filename, page_start, page_end, chapter)
+        results = self._cached_query(query, **scope)
         
-        if not formatted_results:
+        # Dedupe, merge neighbouring chunks and fit the token budget
+        passages = self.context_packer.pack(results)
+        if not passages:
             return "No relevant notes found."
-            
-        return "\n".join(formatted_results)
+
+        formatted = self.context_packer.format(passages)
+        return note + formatted if note else formatted
+
+    def _resolve_scope(self, filename=None, page_start=None, page_end=None, chapter=None):
+        """
+        Turn search_notes arguments into query filters.
+        Returns (scope kwargs, note for the model or None). A filename or chapter that matches
+        nothing does not fail the search, that filter is dropped and the note says so.
+        """
+        scope = {}
+        notes = []
+        filenames = None
+        if filename:
+            known = self.vector_store.get_all_files()
+            filenames = [f for f in known if f.lower() == filename.lower()] or \
+                        [f for f in known if filename.lower() in f.lower()]
+            if not filenames:
+                notes.append(f"No file matches '{filename}'")
+        if chapter:
+            chapter_files = self.vector_store.chapter_map.files_for(chapter)
+            if not chapter_files:
+                notes.append(f"No notes are mapped to '{chapter}'")
+            elif filenames:
+                filenames = [f for f in filenames if f in chapter_files] or filenames
+            else:
+                filenames = chapter_files
+        if filenames:
+            scope["filenames"] = sorted(filenames)
+        if page_start is not None:
+            scope["page_start"] = page_start
+        if page_end is not None:
+            scope["page_end"] = page_end
+        note = f"({'; '.join(notes)}, that filter was ignored)\n" if notes else None
+        return scope, note
+
+    def _cached_query(self, query, n_results=5, filenames=None, page_start=None, page_end=None):
+        """
+        vector_store.query through the retrieval cache.
+        The scope is part of the cache key.
+        """
+        scope = {"filenames": filenames, "page_start": page_start, "page_end": page_end}
+        key = self.retrieval_cache.make_key(query, n_results, tuple(filenames or ()), page_start, page_end)
+        # read the generation before querying, a concurrent add makes the entry stale right away
+        generation = self.vector_store.generation
+        results = self.retrieval_cache.get(key, generation)
+        if results is not None:
+            stats = self.retrieval_cache.get_stats()
+            print(f"Status: Retrieval cache hit for '{query}' (hit rate {stats['hit_rate']:.0%}, {stats['ms_saved']:.0f} ms saved so far)")
+            return results
+
+        print(f"Status: Querying vector database for '{query}'...")
+        start = time.perf_counter()
+        if self.reranker:
+            candidates = self._hybrid_query(query, max(n_results, self.rerank_candidates), **scope)
+            results, reranked = self.reranker.rerank(query, candidates, n_results)
+            if reranked:
+                print(f"Status: Reranked {len(candidates['ids'][0])} candidates in {(time.perf_counter() - start) * 1000:.0f} ms")
+        else:
+            results, reranked = self._hybrid_query(query, n_results, **scope), True
+        # a fallback order is not cached, the next identical query gets another chance at reranking
+        if reranked:
+            self.retrieval_cache.put(key, generation, results, (time.perf_counter() - start) * 1000)
+        return results
+
+    def _hybrid_query(self, query, n_results, **scope):
+        """
+        Dense (embedding) and sparse (BM25) retrieval fused with reciprocal-rank fusion.
+        The keyword side catches exact identifiers, formulas and course codes the embeddings miss.
+        scope (filenames, page_start, page_end) is applied inside both searches.
+        """
+        candidates = n_results * 2
+        dense = self.vector_store.query(query, n_results=candidates, **scope)
+        sparse = self.vector_store.keyword_query(query, n_results=candidates, **scope)
+
+        dense_ids = dense['ids'][0] if dense and dense.get('ids') else []
+        sparse_ids = sparse['ids'][0]
+        fused = fuse_rrf([dense_ids, sparse_ids])[:n_results]
+
+        chunks = {}
+        for results in (sparse, dense):
+            if results and results.get('ids'):
+                for chunk_id, doc, meta in zip(results['ids'][0], results['documents'][0], results['metadatas'][0]):
+                    chunks[chunk_id] = (doc, meta)
+        return {
+            "ids": [fused],
+            "documents": [[chunks[i][0] for i in fused]],
+            "metadatas": [[chunks[i][1] for i in fused]]
+        }
 
     def list_notes(self) -> str:
         """
@@ -0,0 +1,215 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+# Dependency of an answer on the whole corpus (e.g. list_notes), any change invalidates it
+ALL_FILES = "*"
+
+
+class AnswerCache:
+    """
+    Semantic cache of final answers, persisted in SQLite next to the index.
+
+    - a question matches a stored one when their embeddings are at least `threshold` similar
+    - every entry records the corpus version (hash of all indexed files and their content
+      hashes) and the files its answer was built from
+    - same corpus version: the stored answer is returned, no retrieval and no LLM call
+    - corpus changed but not the files the answer used (e.g. a new file was added): only the
+      stored tool calls are returned, the turn skips planning and runs one generation
+    - VectorStore change callbacks drop every entry that depended on a changed file
+    - eviction: least recently used beyond max_entries, anything older than max_age seconds
+    """
+    def __init__(self, vector_store, db_path="data/index.db", threshold=0.92, max_entries=1000,
+                 max_age=7 * 24 * 3600):
+        self.vector_store = vector_store
+        self.embedder = vector_store.embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    question TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    answer TEXT NOT NULL,
+                    tool_calls TEXT NOT NULL,
+                    files TEXT NOT NULL,
+                    corpus TEXT NOT NULL,
+                    cost_ms REAL NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS answer_cache_files (
+                    entry_id INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    PRIMARY KEY (filename, entry_id)
+                ) WITHOUT ROWID
+            """)
+        # question vectors are matched in memory, (ids, matrix) is rebuilt after changes
+        self._ids = []
+        self._matrix = None
+        self._load_vectors()
+        self.stats = {
+            "lookups": 0,
+            "answer_hits": 0,
+            "plan_hits": 0,
+            "stored": 0,
+            "invalidated": 0,
+            "evicted": 0,
+            "ms_saved": 0.0
+        }
+        vector_store.add_change_listener(self.invalidate)
+
+    def _load_vectors(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT id, vector FROM answer_cache ORDER BY id").fetchall()
+            self._ids = [r[0] for r in rows]
+            self._matrix = np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows]) if rows else None
+
+    def _embed(self, question):
+        vector = np.asarray(self.embedder.embed_query(question), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-9)
+
+    def corpus_version(self):
+        """
+        Hash of every indexed file with its content hash, plus the file -> hash map itself.
+        """
+        files = {doc["filename"]: doc["hash"] for doc in self.vector_store.get_documents()}
+        h = hashlib.sha1(json.dumps(sorted(files.items())).encode("utf-8")).hexdigest()
+        return h, files
+
+    def lookup(self, question):
+        """
+        {"answer": str or None, "tool_calls": [(name, arguments)], "question": ...} or None.
+        answer is None when only the tool calls can be reused.
+        """
+        with self._lock:
+            self.stats["lookups"] += 1
+            if self._matrix is None:
+                return None
+            ids, matrix = self._ids, self._matrix
+        vector = self._embed(question)
+        similarities = matrix @ vector
+        best = int(np.argmax(similarities))
+        if float(similarities[best]) < self.threshold:
+            return None
+
+        entry_id = ids[best]
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT question, answer, tool_calls, files, corpus, cost_ms, created FROM answer_cache WHERE id = ?",
+                (entry_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        stored_question, answer, tool_calls, files, corpus, cost_ms, created = row
+        # "chapter 3" and "chapter 4" embed almost the same, numbers have to match exactly
+        if re.findall(r"\d+", stored_question) != re.findall(r"\d+", question):
+            return None
+        if time.time() - created > self.max_age:
+            self._delete([entry_id], "evicted")
+            return None
+
+        version, current = self.corpus_version()
+        files = json.loads(files)
+        if any(current.get(f) != h for f, h in files.items() if f != ALL_FILES) or \
+                (ALL_FILES in files and version != corpus):
+            # a file the answer used changed or is gone
+            self._delete([entry_id], "invalidated")
+            return None
+
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE answer_cache SET last_used = ?, hits = hits + 1 WHERE id = ?",
+                              (time.time(), entry_id))
+            if version == corpus:
+                self.stats["answer_hits"] += 1
+                self.stats["ms_saved"] += cost_ms
+            else:
+                self.stats["plan_hits"] += 1
+        return {
+            "question": stored_question,
+            "answer": answer if version == corpus else None,
+            "tool_calls": [tuple(call) for call in json.loads(tool_calls)]
+        }
+
+    def put(self, question, answer, tool_calls, files, corpus, cost_ms):
+        """
+        Store an answer. files: {filename: content hash} it was built from ({ALL_FILES: ...}
+        for answers about the whole corpus), corpus: corpus_version() from before the turn.
+        """
+        vector = self._embed(question)
+        now = time.time()
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO answer_cache (question, vector, answer, tool_calls, files, corpus, cost_ms, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (question, vector.tobytes(), answer, json.dumps(tool_calls), json.dumps(files), corpus,
+                 cost_ms, now, now)
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO answer_cache_files (entry_id, filename) VALUES (?, ?)",
+                [(cursor.lastrowid, f) for f in files]
+            )
+            self.stats["stored"] += 1
+        self._evict()
+        self._load_vectors()
+
+    def invalidate(self, filenames):
+        """
+        VectorStore change listener: drop entries built from any of these files
+        (and entries about the whole corpus). filenames None drops everything.
+        """
+        with self._lock:
+            if filenames is None:
+                rows = self.conn.execute("SELECT id FROM answer_cache").fetchall()
+            else:
+                names = list(filenames) + [ALL_FILES]
+                rows = self.conn.execute(
+                    f"SELECT DISTINCT entry_id FROM answer_cache_files WHERE filename IN ({','.join('?' * len(names))})",
+                    names
+                ).fetchall()
+        if rows:
+            self._delete([r[0] for r in rows], "invalidated")
+
+    def _evict(self):
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id FROM answer_cache WHERE created < ? UNION "
+                "SELECT id FROM (SELECT id FROM answer_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (cutoff, self.max_entries)
+            ).fetchall()
+        if rows:
+            self._delete([r[0] for r in rows], "evicted", reload=False)
+
+    def _delete(self, entry_ids, reason, reload=True):
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM answer_cache WHERE id = ?", [(i,) for i in entry_ids])
+            self.conn.executemany("DELETE FROM answer_cache_files WHERE entry_id = ?", [(i,) for i in entry_ids])
+            self.stats[reason] += len(entry_ids)
+        if reload:
+            self._load_vectors()
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM answer_cache")
+            self.conn.execute("DELETE FROM answer_cache_files")
+        self._load_vectors()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._ids)
+        stats["hit_rate"] = (stats["answer_hits"] + stats["plan_hits"]) / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+
+CHAPTER_PATTERNS = [
+    r"(module|chapter|unit)\s*(\d+)",
+    r"(module|chapter|unit)-(\d+)",
+    r"(module|chapter|unit)_(\d+)",
+    r"(module|chapter|unit)\s*([ivx]+)\b",  # Roman numerals
+    r"(module|chapter|unit)\s*([a-z])\b"    # Single letters
+]
+
+
+def normalize_key(key):
+    """
+    "Chapter_5", "chapter-5" and "CHAPTER 5" are all "chapter 5".
+    """
+    key = re.sub(r"\s+", " ", (key or "").lower()).strip()
+    return re.sub(r"^(module|chapter|unit)[\s_-]*", r"\1 ", key)
+
+
+def find_chapter_refs(text):
+    """
+    Every "module/chapter/unit N" mentioned in a text, normalized, in order of appearance.
+    """
+    found = []
+    for pat in CHAPTER_PATTERNS:
+        for match in re.finditer(pat, (text or "").lower()):
+            key = f"{match.group(1)} {match.group(2)}"
+            if key not in found:
+                found.append(key)
+    return found
+
+
+def extract_chapter_keys(filename, content):
+    """
+    Chapter/module keys of a file.
+    1. patterns in the filename
+    2. patterns in the first 2000 chars of the content, or its first short line as "topic: ..."
+    3. fallback: the filename itself as a topic
+    """
+    name_lower = filename.lower()
+    found_keys = []
+    for pat in CHAPTER_PATTERNS:
+        match = re.search(pat, name_lower)
+        if match:
+            key = f"{match.group(1)} {match.group(2)}"
+            if key not in found_keys:
+                found_keys.append(key)
+
+    if not found_keys and content:
+        intro = content[:2000].lower()
+        for pat in CHAPTER_PATTERNS:
+            match = re.search(pat, intro)
+            if match:
+                key = f"{match.group(1)} {match.group(2)}"
+                if key not in found_keys:
+                    found_keys.append(key)
+
+        # If still nothing, use a short first line as a "topic" key
+        # "Graph Theory" -> "topic: graph theory"
+        if not found_keys:
+            lines = [l.strip() for l in intro.split('\n') if l.strip()]
+            if lines and len(lines[0]) < 50:
+                clean_title = re.sub(r'[^\w\s]', '', lines[0])
+                found_keys.append(f"topic: {clean_title}")
+
+    if not found_keys:
+        # "Graph Theory.pdf" -> "topic: graph theory"
+        clean_name = os.path.splitext(filename)[0].replace('_', ' ').replace('-', ' ')
+        found_keys.append(f"topic: {clean_name.lower()}")
+
+    return found_keys
+
+
+class ChapterMap:
+    """
+    Chapter/module/topic -> filename map, in SQLite (WAL) next to the manifest.
+    Replaces data/chapter_map.json: every Ingestor/process shares it safely and a
+    file's keys are replaced in one transaction instead of rewriting the whole map.
+    """
+    def __init__(self, db_path="data/index.db", json_path="data/chapter_map.json"):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS chapter_map (
+                    key TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    PRIMARY KEY (key, filename)
+                ) WITHOUT ROWID
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_chapter_map_filename ON chapter_map(filename)")
+        if json_path:
+            self._migrate_json(json_path)
+
+    def _migrate_json(self, json_path):
+        """
+        One-time import of the old JSON map, renamed afterwards so it is not imported again.
+        """
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, 'r') as f:
+                mapping = json.load(f)
+        except (OSError, ValueError):
+            mapping = {}
+        rows = [(normalize_key(key), filename) for key, files in mapping.items() for filename in files]
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO chapter_map (key, filename) VALUES (?, ?)", rows)
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except OSError:
+            pass
+        print(f"Imported {len(rows)} chapter map entries from {json_path}")
+
+    def set_many(self, entries):
+        """
+        Replace the keys of several files in one transaction.
+        entries: list of (filename, keys)
+        """
+        if not entries:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM chapter_map WHERE filename = ?", [(filename,) for filename, _ in entries])
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO chapter_map (key, filename) VALUES (?, ?)",
+                [(normalize_key(key), filename) for filename, keys in entries for key in keys]
+            )
+
+    def set_keys(self, filename, keys):
+        self.set_many([(filename, keys)])
+
+    def remove(self, filename):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM chapter_map WHERE filename = ?", (filename,))
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM chapter_map")
+
+    def keys_for(self, filename):
+        with self._lock:
+            rows = self.conn.execute("SELECT key FROM chapter_map WHERE filename = ? ORDER BY key", (filename,)).fetchall()
+        return [r[0] for r in rows]
+
+    def files_for(self, key):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT filename FROM chapter_map WHERE key = ? ORDER BY filename", (normalize_key(key),)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def resolve(self, text):
+        """
+        Files of every chapter/module the text refers to ("summarize chapter 5" -> files of "chapter 5").
+        Returns {key: [filenames]} for the keys that are in the map.
+        """
+        resolved = {}
+        for key in find_chapter_refs(text):
+            files = self.files_for(key)
+            if files:
+                resolved[key] = files
+        return resolved
+
+    def all(self):
+        """
+        The whole map as {key: [filenames]}, the shape of the old JSON file.
+        """
+        with self._lock:
+            rows = self.conn.execute("SELECT key, filename FROM chapter_map ORDER BY key, filename").fetchall()
+        mapping = {}
+        for key, filename in rows:
+            mapping.setdefault(key, []).append(filename)
+        return mapping
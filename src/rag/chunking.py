@@ -0,0 +1,280 @@
+import re
+import hashlib
+from bisect import bisect_right
+from functools import lru_cache
+
+WORD_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+HEADING_PATTERN = re.compile(
+    r"^(#{1,6}\s+\S|(chapter|module|unit|section|part|lecture|topic)\s+[\w.]+|\d+(\.\d+)*\.?\s+[A-Z])",
+    re.IGNORECASE
+)
+
+
+def approx_token_count(text):
+    """
+    Words and punctuation marks, close to a word-piece count for English text.
+    """
+    return len(WORD_PIECE_PATTERN.findall(text))
+
+
+@lru_cache(maxsize=4)
+def get_token_counter(tokenizer_name):
+    """
+    Token counter of the embedding model's own tokenizer (cached per process),
+    falling back to approx_token_count if it cannot be loaded.
+    """
+    if not tokenizer_name:
+        return approx_token_count
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    except Exception as e:
+        print(f"Could not load tokenizer {tokenizer_name} ({e}), using approximate token counts")
+        return approx_token_count
+
+
+class SlidingWindowChunker:
+    """
+    The original fixed character window with overlap.
+    """
+    def __init__(self, chunk_size=1000, chunk_overlap=200):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def signature(self):
+        return f"sliding:{self.chunk_size}:{self.chunk_overlap}"
+
+    def chunk_text(self, text):
+        if not text:
+            return []
+
+        chunks = []
+        start = 0
+        text_len = len(text)
+
+        while start < text_len:
+            end = start + self.chunk_size
+            chunk = text[start:end]
+            chunks.append(chunk)
+            start += self.chunk_size - self.chunk_overlap
+
+        return chunks
+
+    def chunk_pages(self, pages):
+        """
+        pages: iterable of (page_number, text). Every page is chunked on its own.
+        """
+        for page_number, text in pages:
+            for chunk in self.chunk_text(text):
+                yield {"text": chunk, "page": page_number, "page_end": page_number}
+
+
+class StructureAwareChunker:
+    """
+    Token-budgeted chunker that respects document structure.
+
+    - chunks hold at most max_tokens tokens of the embedding model's tokenizer
+      (all-MiniLM-L6-v2 truncates input after 256 word pieces, anything longer is never embedded)
+    - splits only between sentences; a heading always starts a new chunk and
+      a new paragraph does once the current chunk is reasonably full
+    - text runs on across page boundaries, chunks keep their page span (page .. page_end)
+    - optional overlap of whole sentences and deduplication of repeated chunks
+      (running headers/footers, repeated slides)
+    """
+    def __init__(self, max_tokens=230, overlap_sentences=0, min_fill=0.6, dedupe=True,
+                 tokenizer_name="sentence-transformers/all-MiniLM-L6-v2"):
+        self.max_tokens = max_tokens
+        self.overlap_sentences = overlap_sentences
+        self.min_fill = min_fill
+        self.dedupe = dedupe
+        self.tokenizer_name = tokenizer_name
+
+    def signature(self):
+        return f"structure:{self.max_tokens}:{self.overlap_sentences}:{self.min_fill}:{int(self.dedupe)}:{self.tokenizer_name}"
+
+    @property
+    def count_tokens(self):
+        return get_token_counter(self.tokenizer_name)
+
+    def chunk_text(self, text):
+        return [chunk["text"] for chunk in self.chunk_pages([(1, text)])]
+
+    @staticmethod
+    def _is_heading(line):
+        if len(line) > 80 or line.endswith((".", ",", ";", ":")):
+            return False
+        if HEADING_PATTERN.match(line):
+            return True
+        letters = [c for c in line if c.isalpha()]
+        return len(letters) >= 4 and all(c.isupper() for c in letters)
+
+    def _blocks(self, text):
+        """
+        Split page text into ("heading" | "paragraph", text) blocks.
+        PDF text has a newline per visual line, so lines are re-joined into paragraphs
+        (fixing words hyphenated across lines) and blank lines end a paragraph.
+        """
+        paragraph = []
+        for raw in text.split("\n"):
+            line = raw.strip()
+            if not line:
+                if paragraph:
+                    yield "paragraph", self._join(paragraph)
+                    paragraph = []
+                continue
+            if self._is_heading(line):
+                if paragraph:
+                    yield "paragraph", self._join(paragraph)
+                    paragraph = []
+                yield "heading", line.lstrip("# ")
+                continue
+            paragraph.append(line)
+        if paragraph:
+            yield "paragraph", self._join(paragraph)
+
+    @staticmethod
+    def _join(lines):
+        text = ""
+        for line in lines:
+            if text.endswith("-") and line[:1].islower():
+                text = text[:-1] + line
+            elif text:
+                text += " " + line
+            else:
+                text = line
+        return text
+
+    @staticmethod
+    def _continues(previous, following):
+        """
+        Does a paragraph cut by a page break continue on the next page?
+        """
+        return not previous.rstrip().endswith((".", "!", "?", ":")) or following[:1].islower()
+
+    def _sentences(self, paragraph, breaks):
+        """
+        (sentence, page, page_end) for a paragraph, with sentences over the budget split by words.
+        breaks: [(char_offset, page_number), ...] where the paragraph moves on to a page,
+        starting with (0, first_page). More than one entry means it ran across page breaks.
+        """
+        offsets = [offset for offset, _ in breaks]
+
+        def page_at(position):
+            return breaks[bisect_right(offsets, position) - 1][1]
+
+        offset = 0
+        for sentence in SENTENCE_SPLIT.split(paragraph):
+            begin = paragraph.find(sentence, offset)
+            offset = begin + len(sentence)
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            start_page = page_at(begin)
+            end_page = page_at(max(begin, offset - 1))
+
+            if self.count_tokens(sentence) <= self.max_tokens:
+                yield sentence, start_page, end_page
+                continue
+            piece = []
+            for word in sentence.split():
+                piece.append(word)
+                if self.count_tokens(" ".join(piece)) > self.max_tokens:
+                    piece.pop()
+                    if piece:
+                        yield " ".join(piece), start_page, end_page
+                    piece = [word]
+            if piece:
+                yield " ".join(piece), start_page, end_page
+
+    def chunk_pages(self, pages):
+        """
+        pages: iterable of (page_number, text), consumed lazily.
+        Yields {"text", "page", "page_end"}.
+        """
+        seen = set()
+        current = []          # (sentence, page, page_end, tokens)
+        current_tokens = 0
+
+        def emit(keep_overlap=True):
+            nonlocal current, current_tokens
+            if not current:
+                return None
+            chunk = {
+                "text": " ".join(item[0] for item in current),
+                "page": current[0][1],
+                "page_end": current[-1][2]
+            }
+            if keep_overlap and self.overlap_sentences:
+                current = current[-self.overlap_sentences:]
+                current_tokens = sum(item[3] for item in current)
+            else:
+                current = []
+                current_tokens = 0
+            if self.dedupe:
+                key = hashlib.sha1(re.sub(r"\s+", " ", chunk["text"].lower()).encode('utf-8')).hexdigest()
+                if key in seen:
+                    return None
+                seen.add(key)
+            return chunk
+
+        def add_block(kind, text, breaks):
+            nonlocal current, current_tokens
+            if kind == "heading":
+                # a heading always starts a new chunk (no overlap across it)
+                chunk = emit(keep_overlap=False)
+                if chunk:
+                    yield chunk
+                tokens = self.count_tokens(text)
+                page = breaks[0][1]
+                current = [(text, page, page, tokens)]
+                current_tokens = tokens
+                return
+
+            # New paragraph: break here if the chunk is already well filled
+            if current_tokens >= self.max_tokens * self.min_fill:
+                chunk = emit()
+                if chunk:
+                    yield chunk
+
+            for sentence, start_page, end_page in self._sentences(text, breaks):
+                tokens = self.count_tokens(sentence)
+                if current and current_tokens + tokens > self.max_tokens:
+                    chunk = emit()
+                    if chunk:
+                        yield chunk
+                    # overlap sentences never push a chunk over budget
+                    while current and current_tokens + tokens > self.max_tokens:
+                        current_tokens -= current.pop(0)[3]
+                current.append((sentence, start_page, end_page, tokens))
+                current_tokens += tokens
+
+        # The last paragraph of a page is held back, it may continue on the next page
+        pending = None        # (text, breaks)
+        for page_number, text in pages:
+            blocks = list(self._blocks(text or ""))
+            if pending:
+                pending_text, breaks = pending
+                pending = None
+                if blocks and blocks[0][0] == "paragraph" and self._continues(pending_text, blocks[0][1]):
+                    merged = self._join([pending_text, blocks.pop(0)[1]])
+                    breaks = breaks + [(len(pending_text), page_number)]
+                    if not blocks and not merged.rstrip().endswith((".", "!", "?")):
+                        # the whole page was one unfinished paragraph, keep holding it
+                        pending = (merged, breaks)
+                        continue
+                    yield from add_block("paragraph", merged, breaks)
+                else:
+                    yield from add_block("paragraph", pending_text, breaks)
+
+            if blocks and blocks[-1][0] == "paragraph":
+                pending = (blocks.pop()[1], [(0, page_number)])
+            for kind, block in blocks:
+                yield from add_block(kind, block, [(0, page_number)])
+
+        if pending:
+            yield from add_block("paragraph", pending[0], pending[1])
+        chunk = emit(keep_overlap=False)
+        if chunk:
+            yield chunk
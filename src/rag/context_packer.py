@@ -0,0 +1,179 @@
+import re
+import threading
+from src.llm.history import estimate_tokens
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def shingles(text, size=3):
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def overlap_join(first, second, min_overlap=20):
+    """
+    first + second without repeating text the two share (the end of first is the start of second,
+    as with overlapping sliding-window chunks). None if they do not overlap.
+    """
+    longest = min(len(first), len(second))
+    for size in range(longest, min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+
+class ContextPacker:
+    """
+    Turns retrieved chunks into the text handed to the LLM as a tool result.
+
+    - near-duplicate chunks (shingle overlap >= near_duplicate) are dropped, the better ranked one stays
+    - chunks of the same file on the same or adjacent pages become one passage,
+      text the chunks share is written once
+    - passages are added best first until token_budget is used up, the last one may be
+      cut at a sentence boundary
+    """
+    def __init__(self, token_budget=1500, near_duplicate=0.8, min_passage_tokens=40, token_counter=estimate_tokens):
+        self.token_budget = token_budget
+        self.near_duplicate = near_duplicate
+        self.min_passage_tokens = min_passage_tokens
+        self.token_counter = token_counter
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "chunks_in": 0,
+            "duplicates_dropped": 0,
+            "chunks_merged": 0,
+            "tokens_in": 0,
+            "tokens_out": 0
+        }
+
+    def _dedupe(self, chunks):
+        kept = []
+        for chunk in chunks:
+            grams = shingles(chunk["text"])
+            duplicate = False
+            for other in kept:
+                if not grams or not other["shingles"]:
+                    continue
+                # share of the smaller chunk covered by the other one
+                common = len(grams & other["shingles"]) / min(len(grams), len(other["shingles"]))
+                if common >= self.near_duplicate:
+                    duplicate = True
+                    break
+            if not duplicate:
+                chunk["shingles"] = grams
+                kept.append(chunk)
+        return kept
+
+    def _merge(self, chunks):
+        """
+        Group chunks of the same file whose page spans touch, in page order.
+        A passage keeps the rank of its best chunk.
+        """
+        passages = []
+        for chunk in chunks:
+            for passage in passages:
+                if passage["filename"] != chunk["filename"]:
+                    continue
+                if chunk["page"] <= passage["page_end"] + 1 and chunk["page_end"] >= passage["page"] - 1:
+                    passage["chunks"].append(chunk)
+                    passage["page"] = min(passage["page"], chunk["page"])
+                    passage["page_end"] = max(passage["page_end"], chunk["page_end"])
+                    break
+            else:
+                passages.append({
+                    "filename": chunk["filename"],
+                    "page": chunk["page"],
+                    "page_end": chunk["page_end"],
+                    "rank": chunk["rank"],
+                    "chunks": [chunk]
+                })
+
+        for passage in passages:
+            members = sorted(passage["chunks"], key=lambda c: (c["page"], c["rank"]))
+            text = members[0]["text"]
+            for chunk in members[1:]:
+                joined = overlap_join(text, chunk["text"]) or overlap_join(chunk["text"], text)
+                text = joined if joined is not None else text + "\n...\n" + chunk["text"]
+            passage["text"] = text
+        return passages
+
+    def _cut(self, text, max_tokens):
+        """
+        Longest prefix of whole sentences that fits max_tokens.
+        """
+        out = ""
+        for sentence in SENTENCE_END.split(text):
+            candidate = f"{out} {sentence}".strip()
+            if self.token_counter(candidate) > max_tokens:
+                break
+            out = candidate
+        return out
+
+    def pack(self, results):
+        """
+        results: query()-shaped results, best first.
+        Returns a list of passages {"filename", "page", "page_end", "text"} in rank order.
+        """
+        ids = results['ids'][0] if results and results.get('ids') else []
+        chunks = []
+        for rank, (doc, meta) in enumerate(zip(results['documents'][0], results['metadatas'][0]) if ids else []):
+            meta = meta or {}
+            page = meta.get('page')
+            page = page if isinstance(page, int) else 0
+            page_end = meta.get('page_end')
+            chunks.append({
+                "text": (doc or "").strip(),
+                "filename": meta.get('filename', 'unknown'),
+                "page": page,
+                "page_end": page_end if isinstance(page_end, int) else page,
+                "rank": rank
+            })
+        tokens_in = sum(self.token_counter(c["text"]) for c in chunks)
+
+        unique = self._dedupe(chunks)
+        passages = self._merge(unique)
+        passages.sort(key=lambda p: p["rank"])
+
+        packed = []
+        used = 0
+        for passage in passages:
+            tokens = self.token_counter(passage["text"])
+            remaining = self.token_budget - used
+            if tokens > remaining:
+                if remaining < self.min_passage_tokens:
+                    break
+                passage["text"] = self._cut(passage["text"], remaining)
+                if not passage["text"]:
+                    break
+                tokens = self.token_counter(passage["text"])
+            used += tokens
+            packed.append({k: passage[k] for k in ("filename", "page", "page_end", "text")})
+
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["chunks_in"] += len(chunks)
+            self.stats["duplicates_dropped"] += len(chunks) - len(unique)
+            self.stats["chunks_merged"] += len(unique) - len(passages)
+            self.stats["tokens_in"] += tokens_in
+            self.stats["tokens_out"] += used
+        print(f"Status: Packed {len(chunks)} chunks into {len(packed)} passages ({tokens_in} -> {used} tokens)")
+        return packed
+
+    def format(self, passages):
+        """
+        Tool result text, one "--- Source: file (Page n) ---" header per passage.
+        """
+        blocks = []
+        for p in passages:
+            pages = p["page"] if p["page_end"] == p["page"] else f"{p['page']}-{p['page_end']}"
+            blocks.append(f"--- Source: {p['filename']} (Page {pages}) ---\n{p['text']}\n")
+        return "\n".join(blocks)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["tokens_saved"] = stats["tokens_in"] - stats["tokens_out"]
+        return stats
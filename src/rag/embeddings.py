@@ -0,0 +1,188 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+from sentence_transformers import SentenceTransformer
+
+
+class EmbeddingService:
+    """
+    Explicit embedding step in front of the vector store.
+
+    - encodes in batches of a configurable size (batch_size for ingestion,
+      query_batch_size for queries) with an optional torch thread count
+    - caches vectors in memory (LRU) and on disk (SQLite), keyed by model name + text hash,
+      so identical chunks and repeated queries are never encoded twice
+    - background (ingestion) encodes go one batch at a time through the ResourceScheduler,
+      so a chat request in flight gets the CPU between batches
+    """
+    def __init__(self, model_name="all-MiniLM-L6-v2", batch_size=64, query_batch_size=16,
+                 cache_path="data/embeddings.db", memory_cache_size=10000, num_threads=None, scheduler=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.query_batch_size = query_batch_size
+        self.memory_cache_size = memory_cache_size
+        self.num_threads = num_threads
+        self.scheduler = scheduler
+        self._model = None
+        self._model_lock = threading.Lock()
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "encoded": 0,
+            "encode_seconds": 0.0
+        }
+
+        self.conn = None
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
+            with self._lock, self.conn:
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS embeddings (
+                        key TEXT PRIMARY KEY,
+                        vector BLOB NOT NULL
+                    )
+                """)
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                if self.num_threads:
+                    import torch
+                    torch.set_num_threads(self.num_threads)
+                print(f"Loading embedding model {self.model_name}...")
+                self._model = SentenceTransformer(self.model_name)
+            return self._model
+
+    def _key(self, text):
+        h = hashlib.sha1()
+        h.update(self.model_name.encode('utf-8'))
+        h.update(b"\0")
+        h.update(text.encode('utf-8', errors='ignore'))
+        return h.hexdigest()
+
+    def _remember(self, key, vector):
+        # called with self._lock held
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_cache_size:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, keys):
+        found = {}
+        if not self.conn or not keys:
+            return found
+        # stay under SQLite's bound parameter limit
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self.conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _disk_put(self, items):
+        if not self.conn or not items:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+
+    def encode(self, texts, batch_size):
+        """
+        Encode without the cache.
+        """
+        start = time.perf_counter()
+        vectors = self.model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        with self._lock:
+            self.stats["encoded"] += len(texts)
+            self.stats["encode_seconds"] += time.perf_counter() - start
+        return vectors
+
+    def embed(self, texts, batch_size=None, background=False):
+        """
+        Embed a list of texts, returns a list of float lists (what Chroma expects).
+        background=True for ingestion, it yields to interactive work between batches.
+        """
+        if not texts:
+            return []
+        batch_size = batch_size or self.batch_size
+        keys = [self._key(t) for t in texts]
+        vectors = [None] * len(texts)
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    vectors[i] = vector
+                    self.stats["memory_hits"] += 1
+
+            missing = [i for i, v in enumerate(vectors) if v is None]
+            disk = self._disk_get(list({keys[i] for i in missing}))
+            for i in missing:
+                vector = disk.get(keys[i])
+                if vector is not None:
+                    vectors[i] = vector
+                    self._remember(keys[i], vector)
+                    self.stats["disk_hits"] += 1
+
+        # Encode every distinct text that is still missing exactly once
+        todo = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                todo.setdefault(keys[i], []).append(i)
+        if todo:
+            todo_keys = list(todo.keys())
+            todo_texts = [texts[todo[k][0]] for k in todo_keys]
+            if background and self.scheduler:
+                encoded = []
+                for i in range(0, len(todo_texts), batch_size):
+                    with self.scheduler.background():
+                        encoded.extend(self.encode(todo_texts[i:i + batch_size], batch_size))
+            else:
+                encoded = self.encode(todo_texts, batch_size)
+            with self._lock:
+                for key, vector in zip(todo_keys, encoded):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    for i in todo[key]:
+                        vectors[i] = vector
+                    self._remember(key, vector)
+                self._disk_put(list(zip(todo_keys, encoded)))
+
+        return [v.tolist() for v in vectors]
+
+    def embed_query(self, text):
+        return self.embed([text], batch_size=self.query_batch_size)[0]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["encoded"]
+        stats["cache_hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["sentences_per_sec"] = stats["encoded"] / stats["encode_seconds"] if stats["encode_seconds"] else 0.0
+        return stats
+
+
+class ServiceEmbeddingFunction(EmbeddingFunction):
+    """
+    Chroma embedding function backed by an EmbeddingService,
+    used if Chroma ever has to embed text itself.
+    """
+    def __init__(self, service):
+        self.service = service
+
+    def __call__(self, input):
+        return self.service.embed(list(input))
@@ -2,117 +2,52 @@ import os
 import pypdf
 import pytesseract
 from PIL import Image
-import uuid
 import time
-import json
-import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from src.rag.manifest import hash_file, hash_chunk, chunk_ids_for
+from src.rag.chunking import StructureAwareChunker
+from src.rag.chapter_map import extract_chapter_keys
+
+# text at the start of a file that extract_chapter_keys looks at
+INTRO_CHARS = 2000
 
 class Ingestor:
-    def __init__(self, chunk_size=1000, chunk_overlap=200, status_manager=None):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
+    def __init__(self, chunker=None, status_manager=None, page_workers=None, pages_per_reader=64):
+        # StructureAwareChunker by default, SlidingWindowChunker(chunk_size, chunk_overlap) is the old behaviour
+        self.chunker = chunker or StructureAwareChunker()
         self.status_manager = status_manager
-        self.map_file = "data/chapter_map.json"
-        self._ensure_map_file()
+        # threads per PDF, they help OCR (tesseract runs as a subprocess), not pypdf's text extraction
+        self.page_workers = page_workers or min(4, os.cpu_count() or 1)
+        self.pages_per_reader = pages_per_reader
+
+    @staticmethod
+    def status_channel(file_path):
+        # every file gets its own status channel, concurrent ingests do not overwrite each other
+        return f"ingest:{os.path.basename(file_path)}"
 
-    def _ensure_map_file(self):
-        if not os.path.exists("data"):
-            os.makedirs("data")
-        if not os.path.exists(self.map_file):
-            with open(self.map_file, 'w') as f:
-                json.dump({}, f)
+    def _update_status(self, mode, message, progress=0, step="", channel=None):
+        if self.status_manager:
+            if channel:
+                self.status_manager.update(mode=mode, message=message, progress=progress, step=step, channel=channel)
+            else:
+                self.status_manager.update(mode=mode, message=message, progress=progress, step=step)
 
-    def _update_map(self, filename, content):
+    def finish_status(self, file_path, mode="idle", message=""):
         """
-        Extract chapter/module info and update the map.
+        Last status of a file's job: "complete"/"error" with a message, or just close the
+        channel if one is open (e.g. an upload of a file that turned out to be unchanged).
         """
-        try:
-            with open(self.map_file, 'r') as f:
-                mapping = json.load(f)
-        except:
-            mapping = {}
-
-        # 1. Check filename
-        name_lower = filename.lower()
-        patterns = [
-            r"(module|chapter|unit)\s*(\d+)",
-            r"(module|chapter|unit)-(\d+)",
-            r"(module|chapter|unit)_(\d+)",
-            # Add more flexible patterns
-            r"(module|chapter|unit)\s*([ivx]+)", # Roman numerals
-            r"(module|chapter|unit)\s*([a-z])\b" # Single letters
-        ]
-        
-        found_keys = []
-        for pat in patterns:
-            match = re.search(pat, name_lower)
-            if match:
-                # Normalize key
-                prefix = match.group(1)
-                val = match.group(2)
-                key = f"{prefix} {val}" 
-                found_keys.append(key)
-
-        # 2. Check first 2000 chars of content if no filename match
-        # Also check for "Topic: X" or "Subject: Y"
-        if not found_keys and content:
-            intro = content[:2000].lower()
-            
-            # Standard patterns in content
-            for pat in patterns:
-                match = re.search(pat, intro)
-                if match:
-                    prefix = match.group(1)
-                    val = match.group(2)
-                    key = f"{prefix} {val}"
-                    found_keys.append(key)
-            
-            # If still nothing, try to extract a title from the first few lines
-            if not found_keys:
-                lines = [l.strip() for l in intro.split('\n') if l.strip()]
-                if lines:
-                    # Use the first non-empty line as a potential "topic" key
-                    # This is a heuristic: "Graph Theory" -> "topic: graph theory"
-                    # We limit it to short titles (e.g. < 50 chars)
-                    title_candidate = lines[0]
-                    if len(title_candidate) < 50:
-                        # Clean it up
-                        clean_title = re.sub(r'[^\w\s]', '', title_candidate)
-                        key = f"topic: {clean_title}"
-                        found_keys.append(key)
-
-        # Update mapping
-        if found_keys:
-            for key in found_keys:
-                if key not in mapping:
-                    mapping[key] = []
-                if filename not in mapping[key]:
-                    mapping[key].append(filename)
-            
-            with open(self.map_file, 'w') as f:
-                json.dump(mapping, f, indent=2)
-            
-            print(f"Mapped {filename} to {found_keys}")
+        if not self.status_manager:
+            return
+        channel = self.status_channel(file_path)
+        if mode == "idle":
+            self.status_manager.close(channel)
         else:
-            # Fallback: Map to filename itself as a topic
-            # e.g. "Graph Theory.pdf" -> "topic: graph theory"
-            clean_name = os.path.splitext(filename)[0].replace('_', ' ').replace('-', ' ')
-            key = f"topic: {clean_name.lower()}"
-            
-            if key not in mapping:
-                mapping[key] = []
-            if filename not in mapping[key]:
-                mapping[key].append(filename)
-            
-            with open(self.map_file, 'w') as f:
-                json.dump(mapping, f, indent=2)
-            print(f"Mapped {filename} to fallback {key}")
-
-    def _update_status(self, mode, message, progress=0, step=""):
-        if self.status_manager:
-            self.status_manager.update(mode=mode, message=message, progress=progress, step=step)
+            self._update_status(mode, message, 100, mode, channel)
 
-    def load_file(self, file_path):
+    def load_file(self, file_path, timings=None):
         """
         Load a file and return text content.
         Supports .pdf, .png, .jpg, .jpeg, .txt
@@ -120,7 +55,7 @@ class Ingestor:
         ext = os.path.splitext(file_path)[1].lower()
         
         if ext == '.pdf':
-            return self._process_pdf(file_path)
+            return self._process_pdf(file_path, timings)
         elif ext in ['.png', '.jpg', '.jpeg']:
             return self._process_image(file_path)
         elif ext == '.txt':
@@ -129,130 +64,393 @@ class Ingestor:
             print(f"Unsupported file type: {ext}")
             return []
 
-    def _process_pdf(self, file_path):
-        text_chunks = []
+    def _process_pdf(self, file_path, timings=None):
+        return list(self.iter_pdf_chunks(file_path, timings))
+
+    def iter_chunks(self, file_path, timings=None):
+        """
+        Chunks of a file as a generator, PDFs are read page by page (iter_pdf_chunks),
+        other files are small and loaded at once.
+        timings: list that gets the per-page timings of a PDF (see iter_pdf_pages).
+        """
+        if os.path.splitext(file_path)[1].lower() == '.pdf':
+            return self.iter_pdf_chunks(file_path, timings)
+        return iter(self.load_file(file_path))
+
+    def iter_pdf_chunks(self, file_path, timings=None):
+        """
+        Stream chunks of a PDF page by page, in page order.
+        Text flows across page boundaries, chunks carry their page span.
+        A page that fails raises, a half read PDF must never look like a finished one.
+        """
         try:
-            reader = pypdf.PdfReader(file_path)
-            full_text = ""
-            for i, page in enumerate(reader.pages):
-                text = page.extract_text()
-                if not text.strip():
-                    # Try OCR if text extraction fails (scanned PDF)
-                    # This is a simplified approach; for robust OCR on PDF, 
-                    # one might need pdf2image -> pytesseract
-                    pass 
-                
-                # Simple page-level metadata
-                page_text = text
-                chunks = self._chunk_text(page_text)
-                for chunk in chunks:
-                    text_chunks.append({
-                        "text": chunk,
-                        "metadata": {
-                            "source": file_path,
-                            "filename": os.path.basename(file_path),
-                            "page": i + 1
-                        }
-                    })
+            pages = ((page["page"], page["text"]) for page in self.iter_pdf_pages(file_path, timings))
+            yield from self._chunk_pages(file_path, pages)
         except Exception as e:
             print(f"Error processing PDF {file_path}: {e}")
-        return text_chunks
+            raise
+
+    def iter_pdf_pages(self, file_path, timings=None):
+        """
+        Yield {"page", "text", "ocr", "extract_ms", "ocr_ms"} for every page, in order.
+        Pages go through page_workers threads with only a bounded window in flight.
+        OCR (tesseract is a subprocess) runs in parallel, pypdf's text extraction is pure
+        Python and mostly serialized by the GIL, different files are parallel in the pipeline's
+        process pool instead. Pages without a text layer (scans) are OCR'd.
+        If timings (a list) is given, {"page", "ocr", "extract_ms", "ocr_ms"} of every page is
+        appended to it; it belongs to the caller, so parallel files never mix their timings.
+        """
+        timings = [] if timings is None else timings
+        num_pages = len(pypdf.PdfReader(file_path).pages)
+        local = threading.local()
+
+        def extract(index):
+            # pypdf readers are not thread safe, every worker thread has its own.
+            # Readers cache parsed objects, so they are recycled every few pages.
+            if getattr(local, "reader", None) is None or local.used >= self.pages_per_reader:
+                local.reader = pypdf.PdfReader(file_path)
+                local.used = 0
+            local.used += 1
+            return self._extract_page(local.reader.pages[index], index + 1)
+
+        with ThreadPoolExecutor(max_workers=self.page_workers) as pool:
+            window = deque()
+            for index in range(num_pages):
+                window.append(pool.submit(extract, index))
+                if len(window) >= self.page_workers * 2:
+                    yield self._record_page(window.popleft().result(), timings)
+            while window:
+                yield self._record_page(window.popleft().result(), timings)
+
+    @staticmethod
+    def _record_page(page, timings):
+        timings.append({k: v for k, v in page.items() if k != "text"})
+        return page
+
+    def _extract_page(self, page, page_number):
+        start = time.perf_counter()
+        text = page.extract_text() or ""
+        extract_ms = (time.perf_counter() - start) * 1000
+
+        ocr_ms = 0.0
+        used_ocr = False
+        if not text.strip():
+            # No text layer: this is a scanned page, OCR its images
+            start = time.perf_counter()
+            text = self._ocr_page(page)
+            ocr_ms = (time.perf_counter() - start) * 1000
+            used_ocr = True
+
+        return {
+            "page": page_number,
+            "text": text,
+            "ocr": used_ocr,
+            "extract_ms": round(extract_ms, 1),
+            "ocr_ms": round(ocr_ms, 1)
+        }
+
+    def _ocr_page(self, page):
+        """
+        OCR the raster images of a page (a scanned page is one full-page image).
+        """
+        texts = []
+        try:
+            images = page.images
+            count = len(images)
+        except Exception as e:
+            print(f"Could not read the images of a page: {e}")
+            return ""
+        for index in range(count):
+            # images decode one by one, a broken one does not cost the rest of the page
+            try:
+                texts.append(pytesseract.image_to_string(images[index].image))
+            except Exception as e:
+                print(f"OCR failed on image {index + 1} of a page: {e}")
+        return "\n".join(t for t in texts if t.strip())
 
     def _process_image(self, file_path):
         try:
             text = pytesseract.image_to_string(Image.open(file_path))
-            chunks = self._chunk_text(text)
-            return [{
-                "text": chunk,
-                "metadata": {
-                    "source": file_path,
-                    "filename": os.path.basename(file_path),
-                    "page": 1
-                }
-            } for chunk in chunks]
+            return list(self._chunk_pages(file_path, [(1, text)]))
         except Exception as e:
             print(f"Error processing image {file_path}: {e}")
-            return []
+            raise
 
     def _process_text(self, file_path):
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 text = f.read()
-            chunks = self._chunk_text(text)
-            return [{
-                "text": chunk,
+            return list(self._chunk_pages(file_path, [(1, text)]))
+        except Exception as e:
+            print(f"Error processing text file {file_path}: {e}")
+            raise
+
+    def _chunk_pages(self, file_path, pages):
+        """
+        Run (page_number, text) pairs through the chunker and attach metadata.
+        """
+        filename = os.path.basename(file_path)
+        for chunk in self.chunker.chunk_pages(pages):
+            yield {
+                "text": chunk["text"],
                 "metadata": {
                     "source": file_path,
-                    "filename": os.path.basename(file_path),
-                    "page": 1
+                    "filename": filename,
+                    "page": chunk["page"],
+                    "page_end": chunk["page_end"]
                 }
-            } for chunk in chunks]
-        except Exception as e:
-            print(f"Error processing text file {file_path}: {e}")
-            return []
+            }
 
     def _chunk_text(self, text):
         """
-        Simple sliding window chunker.
+        Chunk a single text with the configured chunker.
         """
-        if not text:
-            return []
-        
-        chunks = []
-        start = 0
-        text_len = len(text)
-        
-        while start < text_len:
-            end = start + self.chunk_size
-            chunk = text[start:end]
-            chunks.append(chunk)
-            start += self.chunk_size - self.chunk_overlap
-            
-        return chunks
+        return self.chunker.chunk_text(text)
+
+    def is_up_to_date(self, file_path, vector_store):
+        """
+        True if this exact file content is indexed with the current chunker.
+        """
+        return vector_store.manifest.is_unchanged(file_path, index_version=self.chunker.signature())
+
+    @staticmethod
+    def file_snapshot(file_path):
+        """
+        Size, mtime and content hash of a file, taken BEFORE it is parsed, so the manifest
+        records the version the chunks came from (a save during parsing then still counts as a change).
+        Raises OSError if the file is gone.
+        """
+        st = os.stat(file_path)
+        return {"size": st.st_size, "mtime": st.st_mtime, "hash": hash_file(file_path)}
 
     def process_and_embed(self, file_path, vector_store):
         """
         Process a file and add it to the vector store.
+        Files whose content is already indexed are skipped.
         """
         filename = os.path.basename(file_path)
+        if self.is_up_to_date(file_path, vector_store):
+            print(f"File {filename} is unchanged, skipping.")
+            self.finish_status(file_path)
+            return 0
+
         print(f"Processing {file_path}...")
-        self._update_status("processing", f"Starting ingestion for {filename}", 10, "init")
-        
-        chunks_data = self.load_file(file_path)
+        self._update_status("processing", f"Starting ingestion for {filename}", 10, "init", self.status_channel(file_path))
         
-        if not chunks_data:
+        # background work: let a chat request in flight finish first
+        if getattr(vector_store, "scheduler", None):
+            vector_store.scheduler.checkpoint()
+        try:
+            snapshot = self.file_snapshot(file_path)
+        except OSError:
+            print(f"File {file_path} disappeared before it could be processed")
+            self.finish_status(file_path, "error", f"{filename} disappeared before it could be processed")
+            return 0
+        # chunks are consumed as pages come out of the PDF and embedded batch by batch
+        try:
+            timings = []
+            added = self.store_file_stream(file_path, self.iter_chunks(file_path, timings), vector_store, snapshot)
+        except Exception:
+            # nothing was recorded, the file is picked up again by the next sync or save
+            self.finish_status(file_path, "error", f"Could not process {filename}")
+            raise
+        if timings:
+            ocr_pages = sum(1 for p in timings if p["ocr"])
+            total_ms = sum(p["extract_ms"] + p["ocr_ms"] for p in timings)
+            print(f"Extracted {len(timings)} pages of {filename} ({ocr_pages} OCR'd) in {total_ms / 1000:.1f}s of page time")
+        return added
+
+    def store_file_stream(self, file_path, chunks, vector_store, snapshot, batch_size=256):
+        """
+        Store one file whose chunks come from an iterator (a long PDF page by page).
+        New chunks are embedded batch_size at a time, until the end only the chunk ids/hashes
+        and the first INTRO_CHARS of text (for the chapter keys) are kept, so memory does not
+        grow with the file. Returns the number of chunks added.
+        If the iterator (parsing) or storing fails the added chunks are removed again and the
+        error is raised, old chunks and the manifest entry stay as they were.
+        """
+        manifest = vector_store.manifest
+        filename = os.path.basename(file_path)
+        channel = self.status_channel(file_path)
+        if manifest.get(file_path) is None:
+            # New file, or indexed before chunk ids were stable: start from a clean slate
+            vector_store.delete_document(filename)
+            old_ids = set()
+        else:
+            old_ids = manifest.chunk_ids(filename)
+
+        seen = {}
+        records = []
+        intro = ""
+        pages = 0
+        added = []
+        ids, documents, metadatas = [], [], []
+
+        def flush():
+            if ids:
+                self._update_status("processing", f"Embedding chunks of {filename} ({len(added) + len(ids)} so far)...",
+                                    70, "embedding", channel)
+                vector_store.add_documents(list(documents), list(metadatas), list(ids))
+                added.extend(ids)
+                ids.clear()
+                documents.clear()
+                metadatas.clear()
+
+        self._update_status("processing", f"Chunking {filename}...", 40, "chunking", channel)
+        try:
+            for item in chunks:
+                text, metadata = item["text"], item["metadata"]
+                chunk_hash = hash_chunk(text, metadata)
+                chunk_id = chunk_ids_for(filename, [chunk_hash], seen)[0]
+                records.append((chunk_id, chunk_hash))
+                pages = max(pages, metadata.get("page") or 0)
+                if len(intro) < INTRO_CHARS:
+                    intro = f"{intro} {text}" if intro else text
+                if chunk_id not in old_ids:
+                    ids.append(chunk_id)
+                    documents.append(text)
+                    metadatas.append(metadata)
+                    if len(ids) >= batch_size:
+                        flush()
+            flush()
+        except Exception:
+            # not recorded in the manifest, drop what was added so a retry starts clean
+            vector_store.delete_ids(set(added))
+            raise
+
+        # Remove chunks that no longer exist, keep unchanged ones as they are
+        vector_store.delete_ids(old_ids - {chunk_id for chunk_id, _ in records})
+        keys = extract_chapter_keys(filename, intro[:INTRO_CHARS]) if records else []
+        vector_store.chapter_map.set_many([(filename, keys)])
+        if keys:
+            print(f"Mapped {filename} to {keys}")
+        # Only now the file counts as indexed, with the hash of the version that was parsed
+        manifest.record(file_path, snapshot["hash"], snapshot["size"], snapshot["mtime"], records, pages,
+                        self.chunker.signature())
+
+        if records:
+            print(f"Added {len(added)} chunks to vector store for {file_path} ({len(records) - len(added)} unchanged)")
+            self.finish_status(file_path, "complete", f"Successfully processed {filename}")
+        else:
             print(f"No text found in {file_path}")
-            self._update_status("processing", f"No text found in {filename}", 100, "error")
-            time.sleep(2)
-            self._update_status("idle", "")
-            return
+            self.finish_status(file_path, "error", f"No text found in {filename}")
+        return len(added)
 
-        self._update_status("processing", f"Chunking {filename}...", 40, "chunking")
-        
-        documents = [item['text'] for item in chunks_data]
-        metadatas = [item['metadata'] for item in chunks_data]
-        ids = [f"{filename}_{i}_{str(uuid.uuid4())[:8]}" for i in range(len(documents))]
-        
-        # Remove existing docs for this file to avoid duplicates
+    def store_chunks(self, batch, vector_store):
+        """
+        Add already loaded files to the vector store.
+        batch: list of (file_path, chunks_data, snapshot), chunks_data as returned by load_file
+        and snapshot the file_snapshot taken before it was loaded (None takes one now).
+        Only chunks whose text/metadata changed since the last index are embedded,
+        all of them with a single add call. Returns the number of chunks added.
+        """
+        manifest = vector_store.manifest
+        documents = []
+        metadatas = []
+        ids = []
+        records = []
+        chapter_entries = []
+        stored_files = []
+        stale_ids = set()
+
+        # The same file can show up twice in a batch if it changed while queued, keep the last
+        latest = {}
+        for file_path, chunks_data, snapshot in batch:
+            latest[file_path] = (chunks_data, snapshot)
+
+        for file_path, (chunks_data, snapshot) in latest.items():
+            filename = os.path.basename(file_path)
+            try:
+                if snapshot is None:
+                    snapshot = self.file_snapshot(file_path)
+                elif not os.path.exists(file_path):
+                    raise OSError(file_path)
+            except OSError:
+                print(f"File {file_path} disappeared before it could be stored")
+                continue
+
+            if not chunks_data:
+                print(f"No text found in {file_path}")
+                chunks_data = []
+            else:
+                self._update_status("processing", f"Chunking {filename}...", 40, "chunking", self.status_channel(file_path))
+
+            file_documents = [item['text'] for item in chunks_data]
+            file_metadatas = [item['metadata'] for item in chunks_data]
+            chunk_hashes = [hash_chunk(d, m) for d, m in zip(file_documents, file_metadatas)]
+            file_ids = chunk_ids_for(filename, chunk_hashes)
+
+            if manifest.get(file_path) is None:
+                # New file, or indexed before chunk ids were stable: start from a clean slate
+                vector_store.delete_document(filename)
+                old_ids = set()
+            else:
+                old_ids = manifest.chunk_ids(filename)
+
+            # chunks that no longer exist, deleted once the new ones are stored
+            stale_ids.update(old_ids - set(file_ids))
+            added = 0
+            for chunk_id, doc, meta in zip(file_ids, file_documents, file_metadatas):
+                if chunk_id not in old_ids:
+                    ids.append(chunk_id)
+                    documents.append(doc)
+                    metadatas.append(meta)
+                    added += 1
+
+            # a file that lost all its text loses its chapter keys too
+            keys = extract_chapter_keys(filename, " ".join(file_documents)) if file_documents else []
+            chapter_entries.append((filename, keys))
+
+            pages = max((m.get('page') or 0 for m in file_metadatas), default=0)
+            # the hash/stat of the parsed version: if the file was saved again meanwhile it no longer
+            # matches the manifest, and the event of that save indexes the new content
+            records.append((file_path, snapshot["hash"], snapshot["size"], snapshot["mtime"],
+                            list(zip(file_ids, chunk_hashes)), pages, self.chunker.signature()))
+            stored_files.append((file_path, added, len(file_ids) - added))
+
+        if documents:
+            for file_path, added, _ in stored_files:
+                if added:
+                    self._update_status("processing", f"Embedding {len(documents)} chunks...", 70, "embedding",
+                                        self.status_channel(file_path))
+            vector_store.add_documents(documents, metadatas, ids)
+        # a failed add raised above: old chunks and the old manifest entry are still in place
+        vector_store.delete_ids(stale_ids)
+
+        # Only now the files count as indexed (this is also the document registry)
+        for record in records:
+            manifest.record(*record)
+        # Chapter map for the whole batch in one transaction
+        vector_store.chapter_map.set_many(chapter_entries)
+        for filename, keys in chapter_entries:
+            if keys:
+                print(f"Mapped {filename} to {keys}")
+
+        for file_path, added, kept in stored_files:
+            filename = os.path.basename(file_path)
+            if added or kept:
+                print(f"Added {added} chunks to vector store for {file_path} ({kept} unchanged)")
+                # The UI keeps "complete" on screen for a moment, no need to wait here
+                self.finish_status(file_path, "complete", f"Successfully processed {filename}")
+            else:
+                self.finish_status(file_path, "error", f"No text found in {filename}")
+        return len(documents)
+
+    def remove_file(self, file_path, vector_store):
+        """
+        Remove a deleted (or moved away) file from the vector store and the chapter map.
+        """
+        filename = os.path.basename(file_path)
+        print(f"Removing {filename} from index...")
+        # also drops it from the manifest, keyword index and chapter map
         vector_store.delete_document(filename)
-        
-        # Update chapter map
-        full_text = " ".join(documents)
-        self._update_map(filename, full_text)
-        
-        self._update_status("processing", f"Embedding {len(documents)} chunks...", 70, "embedding")
-        vector_store.add_documents(documents, metadatas, ids)
-        
-        print(f"Added {len(documents)} chunks to vector store for {file_path}")
-        self._update_status("complete", f"Successfully processed {filename}", 100, "complete")
-        
-        # Wait a moment so user sees the completion, then go idle
-        time.sleep(3)
-        self._update_status("idle", "")
+        self.finish_status(file_path, "complete", f"Removed {filename} from index")
 
-    def sync_existing_files(self, notes_dir, vector_store):
+    def sync_existing_files(self, notes_dir, vector_store, pipeline=None):
         """
         Scan the notes directory and ensure all files are indexed and mapped.
+        If an IngestionPipeline is given, new/modified files are queued on it instead of
+        being ingested one by one here.
         """
         print(f"Syncing files in {notes_dir}...")
         if not os.path.exists(notes_dir):
@@ -260,37 +458,28 @@ class Ingestor:
 
         # Get files on disk
         disk_files = [f for f in os.listdir(notes_dir) if os.path.isfile(os.path.join(notes_dir, f))]
-        
-        # Get files in vector store
-        indexed_files = set(vector_store.get_all_files())
+
+        # Files deleted while the app was not running
+        notes_abs = os.path.abspath(notes_dir)
+        for path in vector_store.manifest.paths():
+            if os.path.dirname(path) == notes_abs and not os.path.exists(path):
+                self.remove_file(path, vector_store)
         
         for filename in disk_files:
             file_path = os.path.join(notes_dir, filename)
-            
-            # 1. Always try to update the map (it's fast and idempotent)
-            # We try to read a bit of content for better mapping if possible
-            content_head = ""
-            try:
-                ext = os.path.splitext(filename)[1].lower()
-                if ext == '.txt':
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content_head = f.read(1000)
-                elif ext == '.pdf':
-                    # Quick attempt to read first page text for mapping
-                    try:
-                        reader = pypdf.PdfReader(file_path)
-                        if len(reader.pages) > 0:
-                            content_head = reader.pages[0].extract_text()[:1000]
-                    except:
-                        pass
-            except:
-                pass
-            
-            self._update_map(filename, content_head)
-
-            # 2. Ingest if missing from vector store
-            if filename not in indexed_files:
-                print(f"Found unindexed file {filename}, ingesting...")
-                self.process_and_embed(file_path, vector_store)
-            else:
+
+            # Skip files whose exact content is already indexed (size/mtime, then content hash)
+            # with the current chunker
+            if self.is_up_to_date(file_path, vector_store):
                 print(f"File {filename} is already indexed.")
+                continue
+
+            # New or edited file: ingest it (the chapter map is updated while storing)
+            print(f"Found new or modified file {filename}, ingesting...")
+            if pipeline:
+                pipeline.submit(file_path)
+            else:
+                try:
+                    self.process_and_embed(file_path, vector_store)
+                except Exception as e:
+                    print(f"Error ingesting {filename}: {e}")
@@ -0,0 +1,206 @@
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-]\w+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "what", "with", "how", "explain"
+}
+
+
+def tokenize(text):
+    """
+    Lowercased word tokens. Keeps identifiers like "cs-101", "3.14" or "hash_map" whole.
+    """
+    return [t for t in TOKEN_PATTERN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def fuse_rrf(rankings, k=60):
+    """
+    Reciprocal-rank fusion of several ranked lists of ids.
+    Returns ids ordered by sum(1 / (k + rank)).
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
+
+
+class KeywordIndex:
+    """
+    Persistent BM25 inverted index over the same chunks as the vector store.
+    Lives in SQLite and is updated incrementally on add/delete.
+    """
+    def __init__(self, db_path="data/index.db", k1=1.2, b=0.75):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS kw_docs (
+                    chunk_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    page INTEGER,
+                    length INTEGER NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS kw_postings (
+                    term TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, chunk_id)
+                ) WITHOUT ROWID
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS kw_terms (
+                    term TEXT PRIMARY KEY,
+                    df INTEGER NOT NULL
+                ) WITHOUT ROWID
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS kw_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            # page span of a chunk, added to indexes created before scoped search existed
+            columns = {r[1] for r in self.conn.execute("PRAGMA table_info(kw_docs)")}
+            if "page_end" not in columns:
+                self.conn.execute("ALTER TABLE kw_docs ADD COLUMN page_end INTEGER")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_kw_postings_chunk ON kw_postings(chunk_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_kw_docs_filename ON kw_docs(filename)")
+            self.conn.execute("INSERT OR IGNORE INTO kw_meta (key, value) VALUES ('docs', 0), ('total_length', 0)")
+
+    def _meta(self):
+        rows = dict(self.conn.execute("SELECT key, value FROM kw_meta").fetchall())
+        return rows.get("docs", 0), rows.get("total_length", 0)
+
+    def count(self):
+        with self._lock:
+            return self._meta()[0]
+
+    def add(self, ids, documents, metadatas):
+        """
+        Index chunks (replaces chunks with the same id).
+        """
+        if not ids:
+            return
+        with self._lock, self.conn:
+            self._delete(list(ids))
+            added_length = 0
+            for chunk_id, text, meta in zip(ids, documents, metadatas):
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                added_length += length
+                meta = meta or {}
+                self.conn.execute(
+                    "INSERT INTO kw_docs (chunk_id, filename, page, page_end, length) VALUES (?, ?, ?, ?, ?)",
+                    (chunk_id, meta.get("filename", ""), meta.get("page"), meta.get("page_end", meta.get("page")), length)
+                )
+                self.conn.executemany(
+                    "INSERT INTO kw_postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in counts.items()]
+                )
+                self.conn.executemany(
+                    "INSERT INTO kw_terms (term, df) VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1",
+                    [(term,) for term in counts]
+                )
+            self.conn.execute("UPDATE kw_meta SET value = value + ? WHERE key = 'docs'", (len(ids),))
+            self.conn.execute("UPDATE kw_meta SET value = value + ? WHERE key = 'total_length'", (added_length,))
+
+    def _delete(self, ids):
+        # called with the lock held inside a transaction
+        removed_docs = 0
+        removed_length = 0
+        for chunk_id in ids:
+            row = self.conn.execute("SELECT length FROM kw_docs WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            if row is None:
+                continue
+            terms = [r[0] for r in self.conn.execute("SELECT term FROM kw_postings WHERE chunk_id = ?", (chunk_id,))]
+            self.conn.executemany("UPDATE kw_terms SET df = df - 1 WHERE term = ?", [(t,) for t in terms])
+            self.conn.execute("DELETE FROM kw_postings WHERE chunk_id = ?", (chunk_id,))
+            self.conn.execute("DELETE FROM kw_docs WHERE chunk_id = ?", (chunk_id,))
+            removed_docs += 1
+            removed_length += row[0]
+        if removed_docs:
+            self.conn.execute("DELETE FROM kw_terms WHERE df <= 0")
+            self.conn.execute("UPDATE kw_meta SET value = value - ? WHERE key = 'docs'", (removed_docs,))
+            self.conn.execute("UPDATE kw_meta SET value = value - ? WHERE key = 'total_length'", (removed_length,))
+
+    def delete_ids(self, ids):
+        if not ids:
+            return
+        with self._lock, self.conn:
+            self._delete(list(ids))
+
+    def delete_filename(self, filename):
+        with self._lock, self.conn:
+            ids = [r[0] for r in self.conn.execute("SELECT chunk_id FROM kw_docs WHERE filename = ?", (filename,))]
+            self._delete(ids)
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM kw_postings")
+            self.conn.execute("DELETE FROM kw_terms")
+            self.conn.execute("DELETE FROM kw_docs")
+            self.conn.execute("UPDATE kw_meta SET value = 0")
+
+    @staticmethod
+    def _scope_sql(filenames=None, page_start=None, page_end=None):
+        """
+        Extra WHERE clauses (on kw_docs d) for a scoped search.
+        A chunk is in a page range if its span page..page_end overlaps it.
+        """
+        clauses = []
+        params = []
+        if filenames:
+            clauses.append(f"d.filename IN ({', '.join('?' for _ in filenames)})")
+            params.extend(filenames)
+        if page_start is not None:
+            clauses.append("COALESCE(d.page_end, d.page) >= ?")
+            params.append(page_start)
+        if page_end is not None:
+            clauses.append("d.page <= ?")
+            params.append(page_end)
+        return "".join(f" AND {c}" for c in clauses), params
+
+    def search(self, query, n_results=5, filenames=None, page_start=None, page_end=None):
+        """
+        BM25 search. Returns [(chunk_id, score)] best first.
+        filenames / page_start / page_end restrict it to part of the notes.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scope_sql, scope_params = self._scope_sql(filenames, page_start, page_end)
+        with self._lock:
+            n_docs, total_length = self._meta()
+            if n_docs == 0:
+                return []
+            avgdl = total_length / n_docs
+            scores = {}
+            for term in terms:
+                row = self.conn.execute("SELECT df FROM kw_terms WHERE term = ?", (term,)).fetchone()
+                if row is None:
+                    continue
+                df = row[0]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                postings = self.conn.execute(
+                    "SELECT p.chunk_id, p.tf, d.length FROM kw_postings p JOIN kw_docs d ON d.chunk_id = p.chunk_id "
+                    "WHERE p.term = ?" + scope_sql,
+                    [term] + scope_params
+                )
+                for chunk_id, tf, length in postings:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avgdl)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
@@ -0,0 +1,205 @@
+import os
+import sqlite3
+import threading
+import hashlib
+import json
+import time
+import re
+
+CHUNK_ID_PATTERN = re.compile(r"^(.*)_[0-9a-f]{16}(?:_\d+)?$")
+
+
+def hash_file(file_path, block_size=1 << 20):
+    """
+    sha256 of a file's content, read in 1 MB blocks.
+    """
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def hash_chunk(text, metadata):
+    """
+    Hash of a chunk's text and metadata. Same text on a different page is a different chunk.
+    """
+    h = hashlib.sha1()
+    h.update(text.encode('utf-8', errors='ignore'))
+    h.update(b"\0")
+    h.update(json.dumps(metadata, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+
+def chunk_ids_for(filename, chunk_hashes, seen=None):
+    """
+    Stable chunk ids: filename + content hash, with a counter for repeated chunks.
+    Unchanged chunks keep their id when a file is edited.
+    Pass the same seen dict to number a file that comes in several pieces.
+    """
+    seen = {} if seen is None else seen
+    ids = []
+    for chunk_hash in chunk_hashes:
+        n = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = n + 1
+        suffix = f"_{n}" if n else ""
+        ids.append(f"{filename}_{chunk_hash[:16]}{suffix}")
+    return ids
+
+
+def filename_of(chunk_id):
+    """
+    Filename part of a chunk id made by chunk_ids_for.
+    """
+    match = CHUNK_ID_PATTERN.match(chunk_id)
+    return match.group(1) if match else chunk_id
+
+
+class Manifest:
+    """
+    Persistent record of what is indexed: one row per file (size, mtime, content hash,
+    chunk count, pages, indexed_at) and one row per chunk (id, hash).
+    Stored in SQLite next to the vector DB.
+    The files table doubles as the document registry, so listing documents never has
+    to scan the collection.
+    """
+    def __init__(self, db_path="data/index.db"):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    hash TEXT NOT NULL,
+                    indexed_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    chunk_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL
+                )
+            """)
+            # Registry columns, added to manifests created before they existed
+            columns = {r["name"] for r in self.conn.execute("PRAGMA table_info(files)")}
+            if "chunk_count" not in columns:
+                self.conn.execute("ALTER TABLE files ADD COLUMN chunk_count INTEGER NOT NULL DEFAULT 0")
+                self.conn.execute(
+                    "UPDATE files SET chunk_count = (SELECT COUNT(*) FROM chunks WHERE chunks.filename = files.filename)"
+                )
+            if "pages" not in columns:
+                self.conn.execute("ALTER TABLE files ADD COLUMN pages INTEGER NOT NULL DEFAULT 0")
+            if "index_version" not in columns:
+                self.conn.execute("ALTER TABLE files ADD COLUMN index_version TEXT NOT NULL DEFAULT ''")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_filename ON files(filename)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_filename ON chunks(filename)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_hash ON files(hash)")
+
+    @staticmethod
+    def key(file_path):
+        return os.path.abspath(file_path)
+
+    def get(self, file_path):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM files WHERE path = ?", (self.key(file_path),)).fetchone()
+        return dict(row) if row else None
+
+    def is_unchanged(self, file_path, index_version=None):
+        """
+        True if the file is indexed with exactly this content.
+        Size+mtime match is trusted, otherwise the content hash decides
+        (a touch or a copy with the same bytes does not trigger a re-index).
+        If index_version is given (e.g. the chunker settings) it has to match too.
+        """
+        row = self.get(file_path)
+        if row is None:
+            return False
+        if index_version is not None and row["index_version"] != index_version:
+            return False
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return False
+        if st.st_size == row["size"] and st.st_mtime == row["mtime"]:
+            return True
+        if st.st_size != row["size"]:
+            return False
+        if hash_file(file_path) != row["hash"]:
+            return False
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE files SET mtime = ? WHERE path = ?", (st.st_mtime, self.key(file_path)))
+        return True
+
+    def chunk_ids(self, filename):
+        with self._lock:
+            rows = self.conn.execute("SELECT chunk_id FROM chunks WHERE filename = ?", (filename,)).fetchall()
+        return {r["chunk_id"] for r in rows}
+
+    def record(self, file_path, file_hash, size, mtime, chunks, pages=0, index_version=""):
+        """
+        Replace the entry of a file after it was stored.
+        chunks: list of (chunk_id, chunk_hash)
+        """
+        filename = os.path.basename(file_path)
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE filename = ?", (filename,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, filename, chunk_hash) VALUES (?, ?, ?)",
+                [(chunk_id, filename, chunk_hash) for chunk_id, chunk_hash in chunks]
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, filename, size, mtime, hash, indexed_at, chunk_count, pages, index_version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.key(file_path), filename, size, mtime, file_hash, time.time(), len(chunks), pages, index_version)
+            )
+
+    def remove_filename(self, filename):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE filename = ?", (filename,))
+            self.conn.execute("DELETE FROM files WHERE filename = ?", (filename,))
+
+    def clear(self):
+        """
+        Forget every file and chunk (the vector store was wiped).
+        """
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM chunks")
+            self.conn.execute("DELETE FROM files")
+
+    def paths(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT path FROM files").fetchall()
+        return [r["path"] for r in rows]
+
+    def documents(self):
+        """
+        Document registry: one dict per indexed file that has chunks
+        (filename, chunk_count, pages, hash, indexed_at), ordered by filename.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT filename, chunk_count, pages, hash, indexed_at FROM files WHERE chunk_count > 0 ORDER BY filename"
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def filename_for_hash(self, file_hash):
+        """
+        Indexed file with this content hash (sha256 of hash_file), None if there is none.
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT filename FROM files WHERE hash = ? AND chunk_count > 0 LIMIT 1", (file_hash,)
+            ).fetchone()
+        return row["filename"] if row else None
+
+    def file_count(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
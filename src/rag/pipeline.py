@@ -0,0 +1,321 @@
+import os
+import json
+import queue
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.rag.ingestor import Ingestor
+
+_STOP = object()
+
+
+def _lower_priority():
+    """
+    Parse workers run at a lower OS priority, OCR should not compete with chat for the CPU.
+    """
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+
+def _spool_chunks(ingestor, file_path, keep_chunks, timings=None):
+    """
+    Chunk a file. Up to keep_chunks chunks come back as a list, a longer file is written to a
+    JSON lines spool file while it is chunked and the path of that file comes back instead,
+    so neither the worker nor the result sent back holds a 1000 page PDF.
+    """
+    chunks = []
+    spool = None
+    try:
+        for item in ingestor.iter_chunks(file_path, timings):
+            if spool is None:
+                chunks.append(item)
+                if len(chunks) <= keep_chunks:
+                    continue
+                spool = tempfile.NamedTemporaryFile("w", encoding="utf-8", prefix="ingest-", suffix=".jsonl", delete=False)
+                items, chunks = chunks, None
+            else:
+                items = [item]
+            for chunk in items:
+                spool.write(json.dumps(chunk) + "\n")
+    except Exception:
+        if spool:
+            spool.close()
+            os.remove(spool.name)
+        raise
+    if spool:
+        spool.close()
+        return spool.name
+    return chunks
+
+
+def _read_spool(path):
+    """
+    Chunks of a spool file written by _spool_chunks, the file is removed once read.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _parse_file(file_path, chunker, keep_chunks):
+    """
+    Runs in a worker process: parse/OCR and chunk one file.
+    Returns the chunks (or the path of their spool file), the file snapshot taken before
+    parsing and the per-page timings (PDFs only).
+    """
+    ingestor = Ingestor(chunker=chunker)
+    snapshot = Ingestor.file_snapshot(file_path)
+    timings = []
+    chunks_data = _spool_chunks(ingestor, file_path, keep_chunks, timings)
+    return chunks_data, snapshot, timings
+
+
+class IngestionPipeline:
+    """
+    Ingestion job queue with two stages:
+
+    1. parse: files are parsed/OCR'd and chunked in a process pool
+    2. embed: one thread collects parsed files into batches and embeds/stores
+       each batch with a single vector store call. A file with more than batch_chunks chunks
+       is spooled to a temp file by its worker and streamed from there in batches of
+       batch_chunks (Ingestor.store_file_stream), so memory is bounded by the batch size,
+       not by the length of the file
+
+    Stages are connected by bounded queues, so a big drop of files into notes/
+    applies backpressure instead of piling everything up in memory.
+    Every file is parsed as background work of the vector store's ResourceScheduler:
+    while a chat request is in flight no new file is started and embedding waits between batches.
+    """
+    def __init__(self, ingestor, vector_store, parse_workers=None, queue_size=64, batch_chunks=256):
+        self.ingestor = ingestor
+        self.vector_store = vector_store
+        self.resource_scheduler = getattr(vector_store, "scheduler", None)
+        self.parse_workers = parse_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.batch_chunks = batch_chunks
+
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.parsed = queue.Queue(maxsize=self.parse_workers * 2)
+        self.pool = None
+        self.threads = []
+
+        self._queued = set()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._busy_since = None
+        self.stats = {
+            "files": 0,
+            "chunks": 0,
+            "errors": 0,
+            "busy_seconds": 0.0,
+            "pages": 0,
+            "ocr_pages": 0,
+            "extract_ms": 0.0,
+            "ocr_ms": 0.0
+        }
+        # slowest pages seen so far: (ms, filename, page)
+        self.slowest_pages = []
+
+    def start(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.parse_workers, initializer=_lower_priority)
+        for i in range(self.parse_workers):
+            t = threading.Thread(target=self._parse_loop, name=f"ingest-parse-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+        t = threading.Thread(target=self._embed_loop, name="ingest-embed", daemon=True)
+        t.start()
+        self.threads.append(t)
+        print(f"Ingestion pipeline started with {self.parse_workers} parse workers")
+
+    def stop(self):
+        for _ in range(self.parse_workers):
+            self.jobs.put(_STOP)
+        for t in self.threads:
+            t.join(timeout=5)
+        self.threads = []
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def submit(self, file_path):
+        """
+        Queue a file for ingestion. A file that is already waiting in the queue is not queued twice.
+        Blocks while the job queue is full.
+        """
+        with self._cond:
+            if file_path in self._queued:
+                return False
+            self._queued.add(file_path)
+            if self._pending == 0:
+                self._busy_since = time.perf_counter()
+            self._pending += 1
+        self.jobs.put(file_path)
+        return True
+
+    def wait(self, timeout=None):
+        """
+        Block until every submitted file has been stored.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def _parse(self, file_path):
+        try:
+            future = self.pool.submit(_parse_file, file_path, self.ingestor.chunker, self.batch_chunks)
+            chunks_data, snapshot, page_timings = future.result()
+        except BrokenProcessPool:
+            # A worker died (e.g. a crashing OCR binary), parse in this thread instead
+            print(f"Process pool unavailable, parsing {file_path} in-thread")
+            # several parse threads can get here at once, each has its own timings list
+            page_timings = []
+            snapshot = Ingestor.file_snapshot(file_path)
+            chunks_data = _spool_chunks(self.ingestor, file_path, self.batch_chunks, page_timings)
+        self._record_pages(os.path.basename(file_path), page_timings)
+        return chunks_data, snapshot
+
+    def _record_pages(self, filename, page_timings):
+        if not page_timings:
+            return
+        with self._cond:
+            for page in page_timings:
+                self.stats["pages"] += 1
+                self.stats["extract_ms"] += page["extract_ms"]
+                if page["ocr"]:
+                    self.stats["ocr_pages"] += 1
+                    self.stats["ocr_ms"] += page["ocr_ms"]
+                self.slowest_pages.append((page["extract_ms"] + page["ocr_ms"], filename, page["page"]))
+            self.slowest_pages = sorted(self.slowest_pages, reverse=True)[:10]
+
+    def _parse_loop(self):
+        while True:
+            file_path = self.jobs.get()
+            if file_path is _STOP:
+                self.parsed.put(_STOP)
+                return
+            with self._cond:
+                # from here on a new event for this file must queue it again
+                self._queued.discard(file_path)
+            try:
+                if self.ingestor.is_up_to_date(file_path, self.vector_store):
+                    # duplicate event for a save we already indexed
+                    self.ingestor.finish_status(file_path)
+                    self._done(0, 0, 0, 1)
+                    continue
+                with self.resource_scheduler.background() if self.resource_scheduler else nullcontext():
+                    chunks_data, snapshot = self._parse(file_path)
+            except Exception as e:
+                print(f"Error parsing {file_path}: {e}")
+                chunks_data, snapshot = None, None
+            self.parsed.put((file_path, chunks_data, snapshot))
+
+    def _embed_loop(self):
+        stopped = 0
+        while stopped < self.parse_workers:
+            item = self.parsed.get()
+            if item is _STOP:
+                stopped += 1
+                continue
+
+            # Take whatever else is already parsed, up to batch_chunks chunks
+            batch = [item]
+            batch_size = self._size(item)
+            while batch_size < self.batch_chunks:
+                try:
+                    item = self.parsed.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopped += 1
+                    continue
+                batch.append(item)
+                batch_size += self._size(item)
+
+            self._store(batch)
+
+    def _size(self, item):
+        chunks_data = item[1]
+        if isinstance(chunks_data, str):
+            # spooled file, at least a full batch
+            return self.batch_chunks
+        return len(chunks_data or [])
+
+    def _store(self, batch):
+        failed = [path for path, chunks_data, _ in batch if chunks_data is None]
+        spooled = [item for item in batch if isinstance(item[1], str)]
+        ok = [item for item in batch if item[1] is not None and not isinstance(item[1], str)]
+        chunks = 0
+        try:
+            chunks = self.ingestor.store_chunks(ok, self.vector_store)
+        except Exception as e:
+            print(f"Error storing batch of {len(ok)} files: {e}")
+            failed.extend(path for path, _, _ in ok)
+            ok = []
+        for path, spool_path, snapshot in spooled:
+            try:
+                chunks += self.ingestor.store_file_stream(path, _read_spool(spool_path), self.vector_store, snapshot,
+                                                          batch_size=self.batch_chunks)
+                ok.append((path, spool_path, snapshot))
+            except Exception as e:
+                print(f"Error storing {path}: {e}")
+                failed.append(path)
+            finally:
+                if os.path.exists(spool_path):
+                    os.remove(spool_path)
+        for path in failed:
+            self.ingestor.finish_status(path, "error", f"Could not process {os.path.basename(path)}")
+        self._done(len(ok), chunks, len(failed), len(batch))
+
+    def _done(self, files, chunks, errors, finished):
+        with self._cond:
+            self.stats["files"] += files
+            self.stats["chunks"] += chunks
+            self.stats["errors"] += errors
+            self._pending -= finished
+            if self._pending == 0 and self._busy_since is not None:
+                self.stats["busy_seconds"] += time.perf_counter() - self._busy_since
+                self._busy_since = None
+                self._report()
+                self._cond.notify_all()
+
+    def _report(self):
+        s = self.get_stats(locked=True)
+        print(f"Ingestion idle: {s['files']} files, {s['chunks']} chunks in {s['busy_seconds']:.1f}s "
+              f"({s['files_per_sec']:.2f} files/sec, {s['chunks_per_sec']:.1f} chunks/sec)")
+        if self.resource_scheduler:
+            background = self.resource_scheduler.get_stats()["background"]
+            print(f"  Yielded to chat {background['waits']} times, waited {background['wait_ms'] / 1000:.1f}s "
+                  f"(max {background['max_wait_ms']:.0f} ms)")
+        if s["pages"]:
+            print(f"  PDF pages: {s['pages']} ({s['ocr_pages']} OCR'd), "
+                  f"text extraction {s['extract_ms'] / 1000:.1f}s, OCR {s['ocr_ms'] / 1000:.1f}s")
+
+    def get_stats(self, locked=False):
+        """
+        Totals plus throughput over the time the pipeline was busy.
+        """
+        if not locked:
+            with self._cond:
+                return self.get_stats(locked=True)
+        stats = dict(self.stats)
+        busy = stats["busy_seconds"]
+        if self._busy_since is not None:
+            busy += time.perf_counter() - self._busy_since
+        stats["busy_seconds"] = busy
+        stats["pending"] = self._pending
+        stats["slowest_pages"] = [
+            {"ms": round(ms, 1), "filename": filename, "page": page}
+            for ms, filename, page in self.slowest_pages
+        ]
+        stats["files_per_sec"] = stats["files"] / busy if busy > 0 else 0.0
+        stats["chunks_per_sec"] = stats["chunks"] / busy if busy > 0 else 0.0
+        return stats
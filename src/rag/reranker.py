@@ -0,0 +1,183 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CrossEncoderReranker:
+    """
+    Rescores retrieved chunks with a small local cross-encoder (query and chunk read together),
+    which ranks much better than comparing two separately computed embeddings.
+
+    - candidates are scored in batches on the CPU, scores are cached per (query, chunk)
+    - every query gets latency_budget_ms; if scoring would run over it, the
+      candidates keep their retrieval order (scores computed so far stay cached)
+    - the model loads in the background, queries fall back until it is ready
+    """
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size=16,
+                 latency_budget_ms=300, cache_size=4096, num_threads=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.latency_budget_ms = latency_budget_ms
+        self.cache_size = cache_size
+        self.num_threads = num_threads
+        self._model = None
+        self._loading = False
+        self._model_lock = threading.Lock()
+
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        # seconds per scored pair, used to predict if the next batch still fits the budget
+        self._pair_seconds = None
+        self.stats = {
+            "queries": 0,
+            "reranked": 0,
+            "fallbacks": 0,
+            "cache_hits": 0,
+            "scored": 0,
+            "rerank_ms": 0.0
+        }
+
+    def load(self):
+        """
+        Load the model (blocking). Safe to call more than once.
+        """
+        with self._model_lock:
+            if self._model is None:
+                if self.num_threads:
+                    import torch
+                    torch.set_num_threads(self.num_threads)
+                from sentence_transformers import CrossEncoder
+                print(f"Loading reranker model {self.model_name}...")
+                self._model = CrossEncoder(self.model_name)
+            return self._model
+
+    def preload(self):
+        """
+        Load the model in a background thread.
+        """
+        with self._model_lock:
+            if self._model is not None or self._loading:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Could not load reranker {self.model_name}: {e}")
+            finally:
+                self._loading = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @property
+    def ready(self):
+        return self._model is not None
+
+    def _key(self, query, text):
+        h = hashlib.sha1()
+        h.update(self.model_name.encode('utf-8'))
+        h.update(b"\0")
+        h.update(" ".join(query.lower().split()).encode('utf-8'))
+        h.update(b"\0")
+        h.update(text.encode('utf-8', errors='ignore'))
+        return h.hexdigest()
+
+    def _cached(self, keys):
+        with self._lock:
+            found = {}
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[key] = self._scores[key]
+            return found
+
+    def _remember(self, scored):
+        with self._lock:
+            for key, score in scored.items():
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+
+    def score(self, query, documents, deadline=None):
+        """
+        Cross-encoder scores for documents, or None if the deadline (perf_counter) is hit first.
+        """
+        keys = [self._key(query, doc) for doc in documents]
+        scores = self._cached(keys)
+        with self._lock:
+            self.stats["cache_hits"] += len(scores)
+
+        missing = [i for i, key in enumerate(keys) if key not in scores]
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            if deadline is not None and self._pair_seconds is not None:
+                if time.perf_counter() + self._pair_seconds * len(batch) > deadline:
+                    return None
+            start = time.perf_counter()
+            values = self.load().predict([(query, documents[j]) for j in batch],
+                                         batch_size=self.batch_size, show_progress_bar=False)
+            elapsed = time.perf_counter() - start
+            per_pair = elapsed / len(batch)
+            self._pair_seconds = per_pair if self._pair_seconds is None else 0.7 * self._pair_seconds + 0.3 * per_pair
+            scored = {keys[j]: float(v) for j, v in zip(batch, values)}
+            self._remember(scored)
+            scores.update(scored)
+            with self._lock:
+                self.stats["scored"] += len(batch)
+            if deadline is not None and time.perf_counter() > deadline and i + self.batch_size < len(missing):
+                return None
+        return [scores[key] for key in keys]
+
+    def rerank(self, query, results, n_results):
+        """
+        Reorder query()-shaped results by cross-encoder score and keep the best n_results.
+        Returns (results, reranked). On fallback (model not ready, budget exceeded) the
+        retrieval order is kept and reranked is False.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self.stats["queries"] += 1
+        ids = results['ids'][0] if results and results.get('ids') else []
+        documents = results['documents'][0] if ids else []
+        metadatas = results['metadatas'][0] if ids else []
+
+        scores = None
+        if len(ids) > 1:
+            if not self.ready:
+                self.preload()
+            else:
+                deadline = start + self.latency_budget_ms / 1000 if self.latency_budget_ms else None
+                scores = self.score(query, documents, deadline)
+
+        if scores is None:
+            order = list(range(len(ids)))
+        else:
+            order = sorted(range(len(ids)), key=lambda i: scores[i], reverse=True)
+        order = order[:n_results]
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats["rerank_ms"] += elapsed_ms
+            if scores is not None:
+                self.stats["reranked"] += 1
+            elif len(ids) > 1:
+                self.stats["fallbacks"] += 1
+        if scores is None and len(ids) > 1:
+            print(f"Status: Reranker {'not ready' if not self.ready else 'over budget'}, keeping retrieval order")
+
+        return {
+            "ids": [[ids[i] for i in order]],
+            "documents": [[documents[i] for i in order]],
+            "metadatas": [[metadatas[i] for i in order]]
+        }, scores is not None
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["cached_scores"] = len(self._scores)
+        stats["avg_ms"] = stats["rerank_ms"] / stats["queries"] if stats["queries"] else 0.0
+        stats["fallback_rate"] = stats["fallbacks"] / stats["queries"] if stats["queries"] else 0.0
+        return stats
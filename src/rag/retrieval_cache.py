@@ -0,0 +1,83 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+
+
+class RetrievalCache:
+    """
+    LRU + TTL cache for vector store query results.
+
+    Every entry remembers the collection generation it was computed at.
+    VectorStore bumps its generation on every add/delete, so an entry is only
+    served while the collection is exactly as it was (no stale hits, no blanket expiry).
+    """
+    def __init__(self, max_entries=512, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "invalidated": 0,
+            "expired": 0,
+            "ms_saved": 0.0
+        }
+
+    @staticmethod
+    def normalize(query):
+        """
+        Case, whitespace and surrounding punctuation do not change a search.
+        """
+        query = re.sub(r"\s+", " ", (query or "").lower()).strip()
+        return query.strip(" ?!.,;:'\"")
+
+    def make_key(self, query, n_results, *extra):
+        return (self.normalize(query), n_results) + tuple(extra)
+
+    def get(self, key, generation):
+        start = time.perf_counter()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry["generation"] != generation:
+                del self._entries[key]
+                self.stats["invalidated"] += 1
+                self.stats["misses"] += 1
+                return None
+            if time.monotonic() - entry["created"] > self.ttl:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["ms_saved"] += max(0.0, entry["cost_ms"] - (time.perf_counter() - start) * 1000)
+            return entry["value"]
+
+    def put(self, key, generation, value, cost_ms):
+        with self._lock:
+            self._entries[key] = {
+                "value": value,
+                "generation": generation,
+                "created": time.monotonic(),
+                "cost_ms": cost_ms
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -1,21 +1,81 @@
 import chromadb
-from chromadb.utils import embedding_functions
 import os
+import threading
+from src.rag.manifest import Manifest, filename_of
+from src.rag.embeddings import EmbeddingService, ServiceEmbeddingFunction
+from src.rag.keyword_index import KeywordIndex
+from src.rag.chapter_map import ChapterMap
 
 class VectorStore:
-    def __init__(self, persistence_path="data/chroma_db", collection_name="chatrtx_notes"):
+    def __init__(self, persistence_path="data/chroma_db", collection_name="chatrtx_notes", embedding_service=None,
+                 scheduler=None):
         self.client = chromadb.PersistentClient(path=persistence_path)
+        data_dir = os.path.dirname(os.path.normpath(persistence_path)) or "."
         
-        # Use a local embedding model
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
+        # Use a local embedding model. Embeddings are computed (and cached) by the
+        # service and handed to Chroma, the function is only a fallback for Chroma itself.
+        self.embedder = embedding_service or EmbeddingService(
+            model_name="all-MiniLM-L6-v2",
+            cache_path=os.path.join(data_dir, "embeddings.db"),
+            scheduler=scheduler
         )
+        # ResourceScheduler shared with the ingestion pipeline (None = no priorities)
+        self.scheduler = scheduler
+        self.embedding_fn = ServiceEmbeddingFunction(self.embedder)
         
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
             embedding_function=self.embedding_fn
         )
 
+        # File/chunk hashes of what is in the collection, kept next to the DB
+        self.manifest = Manifest(os.path.join(data_dir, "index.db"))
+
+        # chapter/module -> files, imports the old data/chapter_map.json once
+        self.chapter_map = ChapterMap(os.path.join(data_dir, "index.db"), json_path=os.path.join(data_dir, "chapter_map.json"))
+
+        # BM25 index over the same chunks, kept in sync by add/delete below
+        self.keyword_index = KeywordIndex(os.path.join(data_dir, "index.db"))
+        if self.keyword_index.count() == 0 and self.collection.count() > 0:
+            self._rebuild_keyword_index()
+
+        # The registry lives and dies with the collection: an empty collection next to a
+        # filled manifest (chroma_db removed by hand) would list files that are not there
+        if self.collection.count() == 0 and self.manifest.file_count() > 0:
+            print("Collection is empty, clearing the document registry...")
+            self.manifest.clear()
+            self.keyword_index.clear()
+            self.chapter_map.clear()
+
+        # Bumped on every change to the collection, caches compare against it
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        # Called with the changed filenames (None = everything) after every change
+        self._change_listeners = []
+
+    def _rebuild_keyword_index(self):
+        """
+        One-time backfill for a collection indexed before the keyword index existed.
+        """
+        print("Building keyword index from existing chunks...")
+        result = self.collection.get(include=['documents', 'metadatas'])
+        self.keyword_index.add(result['ids'], result['documents'], result['metadatas'])
+
+    def _bump_generation(self, filenames=None):
+        with self._generation_lock:
+            self.generation += 1
+        for listener in list(self._change_listeners):
+            try:
+                listener(filenames)
+            except Exception as e:
+                print(f"Error in vector store change listener: {e}")
+
+    def add_change_listener(self, listener):
+        """
+        listener(filenames) runs after every add/delete, filenames is a set or None (reset).
+        """
+        self._change_listeners.append(listener)
+
     def add_documents(self, documents, metadatas, ids):
         """
         Add documents to the vector store.
@@ -26,22 +86,72 @@ class VectorStore:
         if not documents:
             return
             
+        embeddings = self.embedder.embed(documents, background=True)
         self.collection.add(
             documents=documents,
+            embeddings=embeddings,
             metadatas=metadatas,
             ids=ids
         )
+        self.keyword_index.add(ids, documents, metadatas)
+        self._bump_generation({m.get('filename') for m in metadatas if m})
+
+    @staticmethod
+    def build_where(filenames=None, page_start=None, page_end=None):
+        """
+        Chroma where filter for a scoped search, None for the whole collection.
+        A chunk matches a page range if its span (page .. page_end) overlaps it.
+        """
+        conditions = []
+        if filenames:
+            filenames = list(filenames)
+            conditions.append({"filename": filenames[0]} if len(filenames) == 1 else {"filename": {"$in": filenames}})
+        if page_start is not None:
+            conditions.append({"page_end": {"$gte": page_start}})
+        if page_end is not None:
+            conditions.append({"page": {"$lte": page_end}})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
 
-    def query(self, query_text, n_results=5):
+    def query(self, query_text, n_results=5, filenames=None, page_start=None, page_end=None):
         """
         Query the vector store.
+        filenames / page_start / page_end scope the search, the filter runs inside Chroma.
         """
         results = self.collection.query(
-            query_texts=[query_text],
-            n_results=n_results
+            query_embeddings=[self.embedder.embed_query(query_text)],
+            n_results=n_results,
+            where=self.build_where(filenames, page_start, page_end)
         )
         return results
 
+    def keyword_query(self, query_text, n_results=5, filenames=None, page_start=None, page_end=None):
+        """
+        BM25 keyword search, results in the same shape as query().
+        """
+        hits = self.keyword_index.search(query_text, n_results=n_results, filenames=filenames,
+                                         page_start=page_start, page_end=page_end)
+        return self.get_by_ids([chunk_id for chunk_id, _ in hits])
+
+    def get_by_ids(self, ids):
+        """
+        Fetch chunks by id, keeping the order of ids, shaped like query() results.
+        """
+        if not ids:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]]}
+        result = self.collection.get(ids=list(ids), include=['documents', 'metadatas'])
+        found = {
+            chunk_id: (doc, meta)
+            for chunk_id, doc, meta in zip(result['ids'], result['documents'], result['metadatas'])
+        }
+        ordered = [chunk_id for chunk_id in ids if chunk_id in found]
+        return {
+            "ids": [ordered],
+            "documents": [[found[i][0] for i in ordered]],
+            "metadatas": [[found[i][1] for i in ordered]]
+        }
+
     def delete_document(self, filename):
         """
         Delete all chunks associated with a filename.
@@ -49,19 +159,56 @@ class VectorStore:
         self.collection.delete(
             where={"filename": filename}
         )
+        self.manifest.remove_filename(filename)
+        self.keyword_index.delete_filename(filename)
+        self.chapter_map.remove(filename)
+        self._bump_generation({filename})
+
+    def delete_ids(self, ids):
+        """
+        Delete specific chunks by id.
+        """
+        if not ids:
+            return
+        self.collection.delete(ids=list(ids))
+        self.keyword_index.delete_ids(ids)
+        self._bump_generation({filename_of(chunk_id) for chunk_id in ids})
 
     def get_all_files(self):
         """
         Get a list of all unique filenames in the store.
+        Read from the document registry, not from the collection.
         """
-        # This is a bit expensive in Chroma, but manageable for personal use
-        # We fetch just metadata to list files
+        files = [doc["filename"] for doc in self.manifest.documents()]
+        if files or self.manifest.file_count() > 0:
+            return files
+
+        # Collection indexed before the registry existed: fall back to a scan
+        # until the startup sync has re-registered the files
         result = self.collection.get(include=['metadatas'])
         files = set()
         for meta in result['metadatas']:
             if meta and 'filename' in meta:
                 files.add(meta['filename'])
-        return list(files)
+        return sorted(files)
+
+    def get_documents(self):
+        """
+        Registry entries: filename, chunk_count, pages, hash, indexed_at.
+        """
+        return self.manifest.documents()
 
     def reset(self):
+        """
+        Wipe the index. The manifest goes too, otherwise every file still looks indexed
+        and the next sync would not embed anything again.
+        """
         self.client.reset()
+        self.collection = self.client.get_or_create_collection(
+            name=self.collection.name,
+            embedding_function=self.embedding_fn
+        )
+        self.manifest.clear()
+        self.keyword_index.clear()
+        self.chapter_map.clear()
+        self._bump_generation()
@@ -1,14 +1,119 @@
-import time
 import os
+import threading
+import time
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from src.rag.ingestor import Ingestor
 from src.rag.vector_store import VectorStore
+from src.rag.pipeline import IngestionPipeline
+
+class DebouncedScheduler:
+    """
+    Coalesces file events per path.
+    A job runs once no new event arrived for quiet_period seconds and the file size
+    stopped changing. A newer event for the same path replaces the pending job
+    (e.g. a delete supersedes a pending ingest).
+    """
+    def __init__(self, on_ingest, on_delete, quiet_period=1.0):
+        self.on_ingest = on_ingest
+        self.on_delete = on_delete
+        self.quiet_period = quiet_period
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.stats = {
+            "events": 0,
+            "coalesced": 0,
+            "superseded": 0,
+            "size_waits": 0,
+            "executed": 0
+        }
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="watch-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return None
+
+    def schedule(self, path, kind):
+        """
+        kind: "ingest" or "delete"
+        """
+        size = self._size(path) if kind == "ingest" else None
+        with self._cond:
+            self.stats["events"] += 1
+            existing = self._pending.get(path)
+            if existing:
+                if existing["kind"] == kind:
+                    self.stats["coalesced"] += 1
+                else:
+                    self.stats["superseded"] += 1
+            self._pending[path] = {"kind": kind, "due": time.monotonic() + self.quiet_period, "size": size}
+            self._cond.notify_all()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                ready = [(path, job) for path, job in self._pending.items() if job["due"] <= now]
+                if not ready:
+                    next_due = min((job["due"] for job in self._pending.values()), default=None)
+                    self._cond.wait(timeout=None if next_due is None else next_due - now)
+                    continue
+
+                runnable = []
+                for path, job in ready:
+                    if job["kind"] == "ingest":
+                        size = self._size(path)
+                        if size is None:
+                            # gone before it settled, a delete event will follow
+                            del self._pending[path]
+                            continue
+                        if size != job["size"]:
+                            # still being written, check again after another quiet period
+                            self.stats["size_waits"] += 1
+                            job["size"] = size
+                            job["due"] = now + self.quiet_period
+                            continue
+                    del self._pending[path]
+                    runnable.append((path, job["kind"]))
+
+            for path, kind in runnable:
+                try:
+                    if kind == "ingest":
+                        self.on_ingest(path)
+                    else:
+                        self.on_delete(path)
+                except Exception as e:
+                    print(f"Error handling {kind} for {path}: {e}")
+                with self._cond:
+                    self.stats["executed"] += 1
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["pending"] = len(self._pending)
+            return stats
 
 class NotesHandler(FileSystemEventHandler):
-    def __init__(self, ingestor, vector_store):
-        self.ingestor = ingestor
-        self.vector_store = vector_store
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
 
     def on_created(self, event):
         if event.is_directory:
@@ -20,38 +125,80 @@ class NotesHandler(FileSystemEventHandler):
             return
         self.process(event.src_path)
 
-    def process(self, file_path):
+    def on_deleted(self, event):
+        if event.is_directory or self._ignored(event.src_path):
+            return
+        self.scheduler.schedule(event.src_path, "delete")
+
+    def on_moved(self, event):
+        if event.is_directory:
+            return
+        if not self._ignored(event.src_path):
+            self.scheduler.schedule(event.src_path, "delete")
+        # Editors often save via a temp file renamed over the original
+        self.process(event.dest_path)
+
+    @staticmethod
+    def _ignored(file_path):
         # Ignore temporary files
-        if os.path.basename(file_path).startswith('~') or file_path.endswith('.tmp'):
+        return os.path.basename(file_path).startswith('~') or file_path.endswith('.tmp')
+
+    def process(self, file_path):
+        if self._ignored(file_path):
             return
-            
-        # Wait a bit for file copy to complete
-        time.sleep(1)
-        try:
-            self.ingestor.process_and_embed(file_path, self.vector_store)
-        except Exception as e:
-            print(f"Error processing {file_path}: {e}")
+
+        # Only schedule here, the observer thread never blocks on ingestion.
+        # Bursts of events for one file (a large copy) collapse into one job.
+        self.scheduler.schedule(file_path, "ingest")
 
 class FileWatcher:
     def __init__(self, watch_dir, vector_store, status_manager=None):
         self.watch_dir = watch_dir
         self.vector_store = vector_store
         self.ingestor = Ingestor(status_manager=status_manager)
+        self.pipeline = IngestionPipeline(self.ingestor, vector_store)
+        self.scheduler = DebouncedScheduler(
+            on_ingest=self._ingest,
+            on_delete=self._delete
+        )
         self.observer = Observer()
 
+    def _ingest(self, file_path):
+        # moves can land outside the watched folder
+        if os.path.dirname(os.path.abspath(file_path)) == os.path.abspath(self.watch_dir):
+            self.pipeline.submit(file_path)
+
+    def _delete(self, file_path):
+        if os.path.exists(file_path):
+            # deleted and re-created within the quiet period
+            self.pipeline.submit(file_path)
+            return
+        self.ingestor.remove_file(file_path, self.vector_store)
+
     def start(self):
         if not os.path.exists(self.watch_dir):
             os.makedirs(self.watch_dir)
-            
+
+        self.pipeline.start()
+        self.scheduler.start()
+
         # Sync existing files on startup
         print("Performing initial file sync...")
-        self.ingestor.sync_existing_files(self.watch_dir, self.vector_store)
+        self.ingestor.sync_existing_files(self.watch_dir, self.vector_store, pipeline=self.pipeline)
 
-        event_handler = NotesHandler(self.ingestor, self.vector_store)
+        event_handler = NotesHandler(self.scheduler)
         self.observer.schedule(event_handler, self.watch_dir, recursive=False)
         self.observer.start()
         print(f"Started watching {self.watch_dir}")
 
+    def get_stats(self):
+        return {
+            "events": self.scheduler.get_stats(),
+            "ingestion": self.pipeline.get_stats()
+        }
+
     def stop(self):
         self.observer.stop()
         self.observer.join()
+        self.scheduler.stop()
+        self.pipeline.stop()
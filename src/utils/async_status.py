@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from collections import OrderedDict
+
+
+class AsyncStatusBroadcaster:
+    """
+    Status SSE for the ASGI server.
+
+    One thread subscribes to the StatusManager and hands updates to the event loop,
+    which fans them out to any number of SSE clients (no thread per client).
+    Like the StatusManager's own subscriptions, a client keeps only the newest pending
+    update per channel, new clients get the current state right away and idle
+    connections get a heartbeat comment so dead ones are noticed.
+    """
+    def __init__(self, status_manager, heartbeat=None):
+        self.status_manager = status_manager
+        self.heartbeat = heartbeat or status_manager.heartbeat
+        self._clients = set()
+        self._loop = None
+        self._subscription = None
+        self._closed = threading.Event()
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._subscription = self.status_manager.subscribe()
+        threading.Thread(target=self._forward, daemon=True, name="status-forward").start()
+
+    def _forward(self):
+        while not self._closed.is_set():
+            item = self._subscription.next_update(timeout=1)
+            if item is None:
+                if self._subscription.closed:
+                    break
+                continue
+            try:
+                self._loop.call_soon_threadsafe(self._publish, *item)
+            except RuntimeError:
+                # event loop already closed (shutdown)
+                break
+
+    def _publish(self, channel, data):
+        # runs on the event loop
+        for pending, wake in list(self._clients):
+            pending[channel] = data
+            pending.move_to_end(channel)
+            wake.set()
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    async def stream(self, request):
+        """
+        SSE body for one client, ends when the client goes away or the server stops.
+        """
+        client = (OrderedDict(), asyncio.Event())
+        pending, wake = client
+        self._clients.add(client)
+        try:
+            for data in self.status_manager.snapshot():
+                yield data
+            while not self._closed.is_set():
+                if not pending:
+                    try:
+                        await asyncio.wait_for(wake.wait(), timeout=self.heartbeat)
+                    except asyncio.TimeoutError:
+                        if await request.is_disconnected():
+                            break
+                        yield ": heartbeat\n\n"
+                        continue
+                    wake.clear()
+                while pending:
+                    yield pending.popitem(last=False)[1]
+        finally:
+            self._clients.discard(client)
+
+    def stop(self):
+        """
+        Stop forwarding and end every open stream (call on the event loop).
+        """
+        self._closed.set()
+        if self._subscription:
+            self.status_manager.unsubscribe(self._subscription)
+        for _, wake in list(self._clients):
+            wake.set()
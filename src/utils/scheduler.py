@@ -0,0 +1,116 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Set while the current code runs on behalf of a chat turn (also in the tool threads it starts,
+# see ToolExecutor), background work started from there must not wait for that same turn
+_in_interactive = contextvars.ContextVar("in_interactive", default=False)
+
+
+class ResourceScheduler:
+    """
+    Two priority classes for the CPU-heavy work of this process.
+
+    - interactive: a chat turn (query embedding, retrieval, rerank, the LLM call), never waits
+    - background: ingestion (parsing, embedding batches), stops at its yield points
+      (checkpoint()) while any interactive work is in flight and carries on once it is done
+
+    A background job waits at most max_wait seconds per yield point, so a long chat session
+    slows ingestion down but never stalls it completely.
+    Background work that a chat turn runs itself (the ingest_file tool) never waits, the
+    turn would only be waiting for itself.
+    Wait times per class are in get_stats().
+    """
+    def __init__(self, max_wait=30.0):
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._interactive = 0
+        self._background = 0
+        self.stats = {
+            INTERACTIVE: {"jobs": 0, "busy_ms": 0.0, "started_during_background": 0},
+            BACKGROUND: {"jobs": 0, "checkpoints": 0, "waits": 0, "wait_ms": 0.0, "max_wait_ms": 0.0, "timeouts": 0,
+                         "inline": 0}
+        }
+
+    @contextmanager
+    def interactive(self):
+        token = _in_interactive.set(True)
+        start = time.perf_counter()
+        with self._cond:
+            self._interactive += 1
+            self.stats[INTERACTIVE]["jobs"] += 1
+            # a background batch that is already running is not interrupted, it finishes first
+            if self._background:
+                self.stats[INTERACTIVE]["started_during_background"] += 1
+        try:
+            yield
+        finally:
+            _in_interactive.reset(token)
+            with self._cond:
+                self._interactive -= 1
+                self.stats[INTERACTIVE]["busy_ms"] += (time.perf_counter() - start) * 1000
+                self._cond.notify_all()
+
+    @property
+    def interactive_in_flight(self):
+        with self._cond:
+            return self._interactive
+
+    def checkpoint(self):
+        """
+        Yield point for background work: returns right away when nothing interactive is
+        running, otherwise waits until it is done (or max_wait passed).
+        Returns the time waited in ms.
+        """
+        start = time.perf_counter()
+        with self._cond:
+            stats = self.stats[BACKGROUND]
+            if _in_interactive.get():
+                # run by a chat turn itself, it is the interactive work
+                stats["inline"] += 1
+                return 0.0
+            stats["checkpoints"] += 1
+            if not self._interactive:
+                return 0.0
+            stats["waits"] += 1
+            if not self._cond.wait_for(lambda: self._interactive == 0, timeout=self.max_wait):
+                stats["timeouts"] += 1
+            waited = (time.perf_counter() - start) * 1000
+            stats["wait_ms"] += waited
+            stats["max_wait_ms"] = max(stats["max_wait_ms"], waited)
+        return waited
+
+    @contextmanager
+    def background(self):
+        """
+        One piece of background work, waits at the start like a checkpoint.
+        Inside a chat turn it runs right away and does not count as background.
+        """
+        if _in_interactive.get():
+            self.checkpoint()
+            yield
+            return
+        self.checkpoint()
+        with self._cond:
+            self._background += 1
+            self.stats[BACKGROUND]["jobs"] += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._background -= 1
+
+    def get_stats(self):
+        with self._cond:
+            stats = {cls: dict(values) for cls, values in self.stats.items()}
+            stats[INTERACTIVE]["in_flight"] = self._interactive
+            stats[BACKGROUND]["running"] = self._background
+        background = stats[BACKGROUND]
+        background["avg_wait_ms"] = background["wait_ms"] / background["waits"] if background["waits"] else 0.0
+        # interactive work never queues, it only shares the CPU with a batch that already started
+        stats[INTERACTIVE]["wait_ms"] = 0.0
+        return stats
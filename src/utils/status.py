@@ -1,49 +1,214 @@
-import queue
 import json
 import time
+import threading
+from collections import OrderedDict
 
-class StatusManager:
+DEFAULT_CHANNEL = "global"
+# A job channel in one of these modes is finished and dropped after its last message
+FINAL_MODES = ("idle", "complete", "error")
+
+
+def idle_state():
+    return {
+        "mode": "idle",
+        "message": "",
+        "progress": 0,
+        "step": ""
+    }
+
+
+class Subscription:
+    """
+    One status listener (an SSE client).
+    Holds at most one pending update per channel, a newer update replaces an unsent older one.
+    """
     def __init__(self):
-        self.state = {
-            "mode": "idle",
-            "message": "",
-            "progress": 0,
-            "step": ""
-        }
-        self.listeners = []
-
-    def update(self, mode=None, message=None, progress=None, step=None):
-        if mode is not None:
-            self.state["mode"] = mode
-        if message is not None:
-            self.state["message"] = message
-        if progress is not None:
-            self.state["progress"] = progress
-        if step is not None:
-            self.state["step"] = step
-        
-        self._notify_listeners()
-
-    def set_idle(self):
-        self.state = {
-            "mode": "idle",
-            "message": "",
-            "progress": 0,
-            "step": ""
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def offer(self, channel, data):
+        with self._cond:
+            self._pending[channel] = data
+            self._pending.move_to_end(channel)
+            self._cond.notify()
+
+    def next_update(self, timeout=None):
+        """
+        (channel, data) of the next pending update, or None after timeout or when closed.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or self.closed, timeout)
+            if self._pending:
+                return self._pending.popitem(last=False)
+            return None
+
+    def get(self, timeout=None):
+        """
+        Next pending update, or None after timeout (time for a heartbeat) or when closed.
+        """
+        item = self.next_update(timeout)
+        return item[1] if item else None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class StatusManager:
+    """
+    Thread-safe status bus behind the status bar.
+
+    - update() only records the new state of a channel and returns, a dispatcher thread
+      serializes each changed channel once and hands it to every subscriber
+    - bursts are coalesced: a channel updated many times between two dispatches is sent once,
+      with its latest state
+    - every job can have its own channel (e.g. "ingest:<file>") so concurrent jobs do not
+      overwrite each other; a channel is dropped once it reached a final mode (idle/complete/error)
+    - SSE streams send a heartbeat every `heartbeat` seconds so dead connections are noticed
+    """
+    def __init__(self, heartbeat=15, coalesce_interval=0.05):
+        self.heartbeat = heartbeat
+        self.coalesce_interval = coalesce_interval
+        self._channels = {DEFAULT_CHANNEL: idle_state()}
+        self._dirty = OrderedDict()
+        self._subscribers = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.stats = {
+            "updates": 0,
+            "dispatched": 0,
+            "coalesced": 0
         }
-        self._notify_listeners()
-
-    def _notify_listeners(self):
-        # Create a data packet
-        data = f"data: {json.dumps(self.state)}\n\n"
-        # Send to all active listeners
-        for q in self.listeners[:]:
-            try:
-                q.put_nowait(data)
-            except queue.Full:
-                self.listeners.remove(q)
-
-    def listen(self):
-        q = queue.Queue(maxsize=5)
-        self.listeners.append(q)
-        return q
+        self._thread = threading.Thread(target=self._dispatch_loop, daemon=True, name="status-dispatch")
+        self._thread.start()
+
+    @property
+    def state(self):
+        """
+        Current state of the default channel.
+        """
+        with self._cond:
+            return dict(self._channels.get(DEFAULT_CHANNEL, idle_state()))
+
+    def update(self, mode=None, message=None, progress=None, step=None, channel=DEFAULT_CHANNEL):
+        with self._cond:
+            state = self._channels.setdefault(channel, idle_state())
+            if mode is not None:
+                state["mode"] = mode
+            if message is not None:
+                state["message"] = message
+            if progress is not None:
+                state["progress"] = progress
+            if step is not None:
+                state["step"] = step
+            self._mark_dirty(channel)
+
+    def set_idle(self, channel=DEFAULT_CHANNEL):
+        with self._cond:
+            self._channels[channel] = idle_state()
+            self._mark_dirty(channel)
+
+    def close(self, channel):
+        """
+        Set a job channel idle if it is open, do nothing otherwise.
+        """
+        with self._cond:
+            if channel in self._channels and channel != DEFAULT_CHANNEL:
+                self._channels[channel] = idle_state()
+                self._mark_dirty(channel)
+
+    def _mark_dirty(self, channel):
+        # called with the lock held
+        self.stats["updates"] += 1
+        if channel in self._dirty:
+            self.stats["coalesced"] += 1
+        self._dirty[channel] = True
+        self._cond.notify()
+
+    @staticmethod
+    def _serialize(channel, state):
+        return f"data: {json.dumps(dict(state, channel=channel))}\n\n"
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._dirty or self._stopped)
+                if self._stopped:
+                    return
+            # let a burst of updates pile up, they go out as one
+            if self.coalesce_interval:
+                time.sleep(self.coalesce_interval)
+            with self._cond:
+                changed = [(channel, dict(self._channels.get(channel, idle_state()))) for channel in self._dirty]
+                self._dirty.clear()
+                for channel, state in changed:
+                    # finished job channels are forgotten after this last message
+                    if state["mode"] in FINAL_MODES and channel != DEFAULT_CHANNEL:
+                        self._channels.pop(channel, None)
+                subscribers = list(self._subscribers)
+                self.stats["dispatched"] += len(changed)
+
+            # serialize once per channel, outside the lock
+            for channel, state in changed:
+                data = self._serialize(channel, state)
+                for subscriber in subscribers:
+                    subscriber.offer(channel, data)
+
+    def snapshot(self):
+        """
+        Serialized state of every active channel (what a new subscriber should see first).
+        """
+        with self._cond:
+            states = [(channel, dict(state)) for channel, state in self._channels.items()
+                      if state["mode"] not in FINAL_MODES or channel == DEFAULT_CHANNEL]
+        return [self._serialize(channel, state) for channel, state in states]
+
+    def subscribe(self):
+        subscription = Subscription()
+        with self._cond:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._cond:
+            self._subscribers.discard(subscription)
+        subscription.close()
+
+    @property
+    def subscriber_count(self):
+        with self._cond:
+            return len(self._subscribers)
+
+    def stream(self):
+        """
+        SSE body for one client: current state, then updates, heartbeat comments when quiet.
+        The subscription is always removed when the client goes away (the generator is closed).
+        """
+        subscription = self.subscribe()
+        try:
+            for data in self.snapshot():
+                yield data
+            while True:
+                data = subscription.get(timeout=self.heartbeat)
+                if data is None and subscription.closed:
+                    break
+                yield data if data else ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            subscribers = list(self._subscribers)
+            self._cond.notify_all()
+        for subscription in subscribers:
+            subscription.close()
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["subscribers"] = len(self._subscribers)
+            stats["channels"] = len(self._channels)
+        return stats
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+
+READ_BLOCK = 64 * 1024
+
+
+class UploadError(Exception):
+    """
+    Upload request that cannot be served, status is the HTTP status to answer with.
+    """
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+class UploadManager:
+    """
+    Streaming, resumable uploads into the notes folder.
+
+    - an upload is written to data/uploads/<id>.part in blocks straight from the request
+      stream (nothing is buffered in memory) and hashed (sha256, like the manifest) on the way
+    - large files are sent as several parts (PUT with an offset), a part must start where the
+      last one ended, so after a dropped connection the client asks for the offset and goes on
+    - on completion a file whose content is already indexed is dropped (is_indexed(hash)
+      returns the indexed filename), anything else is moved into notes/ with os.replace,
+      so the watcher only ever sees complete files
+    - unfinished uploads are removed after `expiry` seconds
+    """
+    def __init__(self, upload_dir="data/uploads", target_dir="notes", max_size=512 * 1024 * 1024,
+                 part_size=8 * 1024 * 1024, is_indexed=None, expiry=24 * 3600):
+        self.upload_dir = upload_dir
+        self.target_dir = target_dir
+        self.max_size = max_size
+        self.part_size = part_size
+        self.is_indexed = is_indexed
+        self.expiry = expiry
+        os.makedirs(upload_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # upload id -> [running sha256, bytes hashed], lost on restart (complete() then hashes the file once)
+        self._hashers = {}
+        self._busy = set()
+        self.stats = {
+            "started": 0,
+            "completed": 0,
+            "duplicates": 0,
+            "rehashed": 0,
+            "bytes": 0
+        }
+
+    @staticmethod
+    def clean_filename(filename):
+        name = os.path.basename((filename or "").replace("\\", "/")).strip()
+        if not name or name.startswith(".") or name.startswith("~"):
+            raise UploadError("Invalid filename")
+        return name
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.json")
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.part")
+
+    def _load(self, upload_id):
+        if not upload_id or not upload_id.isalnum():
+            raise UploadError("Unknown upload", 404)
+        try:
+            with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Unknown upload", 404)
+
+    def _save(self, meta):
+        tmp = self._meta_path(meta["id"]) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path(meta["id"]))
+
+    def start(self, filename, size):
+        """
+        Register a new upload, returns its metadata (id, filename, size, received, part_size).
+        """
+        self.cleanup()
+        filename = self.clean_filename(filename)
+        if size is None or size < 0:
+            raise UploadError("Missing file size")
+        if size > self.max_size:
+            raise UploadError(f"File is larger than {self.max_size // (1024 * 1024)} MB", 413)
+        meta = {
+            "id": uuid.uuid4().hex,
+            "filename": filename,
+            "size": int(size),
+            "received": 0,
+            "created": time.time(),
+            "part_size": self.part_size
+        }
+        open(self._part_path(meta["id"]), "wb").close()
+        self._save(meta)
+        with self._lock:
+            self.stats["started"] += 1
+        return meta
+
+    def status(self, upload_id):
+        return self._load(upload_id)
+
+    def write(self, upload_id, offset, stream, length=None):
+        """
+        Append one part read from stream (a file-like object) at offset.
+        offset must be what the server has received so far, otherwise a 409 tells the
+        client where to continue. Returns the updated metadata.
+        """
+        with self._lock:
+            if upload_id in self._busy:
+                raise UploadError("A part of this upload is already being written", 409)
+            self._busy.add(upload_id)
+        try:
+            meta = self._load(upload_id)
+            if offset != meta["received"]:
+                raise UploadError("Wrong offset", 409, received=meta["received"])
+            limit = min(self.part_size, meta["size"] - meta["received"])
+            if length is not None and length > limit:
+                raise UploadError("Part too large", 413, received=meta["received"])
+
+            with self._lock:
+                # the running hash is only usable if it covers exactly the bytes before offset
+                # (not after a restart or a part that broke off half way), else complete() rehashes
+                entry = self._hashers.pop(upload_id, None)
+                if offset == 0:
+                    entry = [hashlib.sha256(), 0]
+                elif entry is not None and entry[1] != offset:
+                    entry = None
+
+            written = 0
+            with open(self._part_path(upload_id), "r+b") as f:
+                f.seek(offset)
+                while written < limit:
+                    block = stream.read(min(READ_BLOCK, limit - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    if entry is not None:
+                        entry[0].update(block)
+                        entry[1] += len(block)
+                    written += len(block)
+                if stream.read(1):
+                    raise UploadError("Part too large", 413, received=meta["received"])
+                f.truncate(offset + written)
+
+            meta["received"] = offset + written
+            self._save(meta)
+            with self._lock:
+                if entry is not None:
+                    self._hashers[upload_id] = entry
+                self.stats["bytes"] += written
+            return meta
+        finally:
+            with self._lock:
+                self._busy.discard(upload_id)
+
+    def complete(self, upload_id):
+        """
+        Finish an upload: {"filename", "hash", "duplicate_of"}. duplicate_of is the indexed
+        filename with the same content, the upload is then dropped instead of moved into notes/.
+        """
+        meta = self._load(upload_id)
+        if meta["received"] != meta["size"]:
+            raise UploadError("Upload is not complete", 409, received=meta["received"])
+        part_path = self._part_path(upload_id)
+        with self._lock:
+            entry = self._hashers.pop(upload_id, None)
+        if entry is not None and entry[1] == meta["size"]:
+            hasher = entry[0]
+        else:
+            hasher = hashlib.sha256()
+            with self._lock:
+                self.stats["rehashed"] += 1
+            with open(part_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    hasher.update(block)
+        file_hash = hasher.hexdigest()
+
+        duplicate_of = self.is_indexed(file_hash) if self.is_indexed else None
+        if duplicate_of:
+            os.remove(part_path)
+            with self._lock:
+                self.stats["duplicates"] += 1
+        else:
+            os.makedirs(self.target_dir, exist_ok=True)
+            with open(part_path, "rb+") as f:
+                os.fsync(f.fileno())
+            # atomic on the same filesystem, the watcher sees one complete file appear
+            os.replace(part_path, os.path.join(self.target_dir, meta["filename"]))
+            with self._lock:
+                self.stats["completed"] += 1
+        os.remove(self._meta_path(upload_id))
+        return {"filename": meta["filename"], "hash": file_hash, "duplicate_of": duplicate_of}
+
+    def save_stream(self, filename, stream):
+        """
+        One-shot upload (a raw request body): the whole stream goes into a temp file, up to
+        max_size, then the same complete() as a chunked upload.
+        """
+        meta = self.start(filename, 0)
+        try:
+            hasher = hashlib.sha256()
+            received = 0
+            with open(self._part_path(meta["id"]), "wb") as f:
+                for block in iter(lambda: stream.read(READ_BLOCK), b""):
+                    received += len(block)
+                    if received > self.max_size:
+                        raise UploadError(f"File is larger than {self.max_size // (1024 * 1024)} MB", 413)
+                    f.write(block)
+                    hasher.update(block)
+            meta["size"] = meta["received"] = received
+            self._save(meta)
+            with self._lock:
+                self._hashers[meta["id"]] = [hasher, received]
+                self.stats["bytes"] += received
+            return self.complete(meta["id"])
+        except Exception:
+            self.abort(meta["id"])
+            raise
+
+    def abort(self, upload_id):
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cleanup(self):
+        """
+        Drop uploads nobody touched for `expiry` seconds.
+        """
+        cutoff = time.time() - self.expiry
+        for name in os.listdir(self.upload_dir):
+            path = os.path.join(self.upload_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            for upload_id in list(self._hashers):
+                if not os.path.exists(self._meta_path(upload_id)):
+                    del self._hashers[upload_id]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["active"] = len(self._hashers)
+        return stats